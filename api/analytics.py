@@ -0,0 +1,179 @@
+"""
+Time-bucketed emissions analytics
+
+Grouping and summing happen in SQL: each source is reduced with
+``values(...).annotate(Sum(...))`` over a ``Trunc`` of its date column, so
+only one row per bucket and group leaves the database.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db.models import CharField, Count, DateField, F, Sum, Value
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from core.models import EmissionEntry
+from ml_services.models import SpendBasedEstimate
+
+BUCKETS = ('day', 'week', 'month', 'quarter', 'year')
+SOURCES = ('emissions', 'spend', 'combined')
+
+# Output name -> lookup; supplier also reports the supplier name
+DIMENSIONS = {
+    'supplier': 'supplier',
+    'region': 'supplier__region',
+    'industry': 'supplier__industry',
+    'data_source': 'data_source',
+}
+
+TWO_PLACES = Decimal('0.01')
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def parse_analytics_params(params):
+    """Validate analytics query parameters into a plain dict"""
+    errors = {}
+
+    source = params.get('source', 'emissions')
+    if source not in SOURCES:
+        errors['source'] = [f"Must be one of {', '.join(SOURCES)}."]
+
+    bucket = params.get('bucket') or None
+    if bucket is not None and bucket not in BUCKETS:
+        errors['bucket'] = [f"Must be one of {', '.join(BUCKETS)}."]
+
+    group_by = _split(params.get('group_by', ''))
+    unknown = [name for name in group_by if name not in DIMENSIONS]
+    if unknown:
+        errors['group_by'] = [f"Unknown dimension(s): {', '.join(unknown)}."]
+
+    dates = {}
+    for name in ('start', 'end'):
+        value = params.get(name)
+        if value:
+            dates[name] = parse_date(value)
+            if dates[name] is None:
+                errors[name] = ['Expected a date in YYYY-MM-DD format.']
+
+    suppliers = _split(params.get('supplier', ''))
+    if not all(value.isdigit() for value in suppliers):
+        errors['supplier'] = ['Expected comma-separated supplier ids.']
+
+    if errors:
+        raise ValidationError(errors)
+    return {
+        'source': source,
+        'bucket': bucket,
+        'group_by': list(dict.fromkeys(group_by)),
+        'start': dates.get('start'),
+        'end': dates.get('end'),
+        'supplier': [int(value) for value in suppliers],
+        'region': _split(params.get('region', '')),
+        'industry': _split(params.get('industry', '')),
+        'data_source': _split(params.get('data_source', '')),
+    }
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _filter_common(queryset, tenant, options):
+    if tenant is not None:
+        queryset = queryset.filter(supplier__tenant=tenant)
+    if options['supplier']:
+        queryset = queryset.filter(supplier_id__in=options['supplier'])
+    if options['region']:
+        queryset = queryset.filter(supplier__region__in=options['region'])
+    if options['industry']:
+        queryset = queryset.filter(supplier__industry__in=options['industry'])
+    return queryset
+
+
+def _entry_rows(tenant, options):
+    queryset = _filter_common(EmissionEntry.objects.all(), tenant, options)
+    if options['data_source']:
+        queryset = queryset.filter(data_source__in=options['data_source'])
+    if options['start']:
+        queryset = queryset.filter(date_reported__gte=_day_start(options['start']))
+    if options['end']:
+        queryset = queryset.filter(date_reported__lt=_day_start(options['end'] + datetime.timedelta(days=1)))
+    return _aggregate(queryset, 'date_reported', 'scope3_emissions', options)
+
+
+def _estimate_rows(tenant, options, exclude_validated):
+    if options['data_source'] and 'spend_based' not in options['data_source']:
+        return []
+    queryset = _filter_common(SpendBasedEstimate.objects.all(), tenant, options)
+    if exclude_validated:
+        # A validated estimate is already counted through its emission entry
+        queryset = queryset.filter(validated_entry__isnull=True)
+    if options['start']:
+        queryset = queryset.filter(period_start__gte=options['start'])
+    if options['end']:
+        queryset = queryset.filter(period_start__lte=options['end'])
+    queryset = queryset.annotate(data_source=Value('spend_based', output_field=CharField()))
+    return _aggregate(queryset, 'period_start', 'estimated_emissions', options)
+
+
+def _aggregate(queryset, date_field, value_field, options):
+    columns, expressions = [], {}
+    if options['bucket']:
+        expressions['period'] = Trunc(date_field, options['bucket'], output_field=DateField())
+    for name in options['group_by']:
+        lookup = DIMENSIONS[name]
+        if lookup == name:
+            columns.append(name)
+        else:
+            expressions[name] = F(lookup)
+        if name == 'supplier':
+            expressions['supplier_name'] = F('supplier__name')
+
+    totals = {'total_emissions': Sum(value_field), 'count': Count('id')}
+    if not columns and not expressions:
+        return [queryset.aggregate(**totals)]
+    # order_by() clears Meta.ordering, which would otherwise leak into GROUP BY
+    return list(
+        queryset.order_by()
+        .values(*columns, **expressions)
+        .annotate(**totals)
+    )
+
+
+def emissions_analytics(tenant, options):
+    """Return the aggregated rows for already-validated options"""
+    source = options['source']
+    rows = []
+    if source in ('emissions', 'combined'):
+        rows += _entry_rows(tenant, options)
+    if source in ('spend', 'combined'):
+        rows += _estimate_rows(tenant, options, exclude_validated=source == 'combined')
+
+    keys = (['period'] if options['bucket'] else []) + [
+        key for name in options['group_by'] for key in (['supplier', 'supplier_name'] if name == 'supplier' else [name])
+    ]
+    merged = {}
+    for row in rows:
+        key = tuple(row[name] for name in keys)
+        total = row['total_emissions'] or Decimal(0)
+        if key in merged:
+            merged[key]['total_emissions'] += total
+            merged[key]['count'] += row['count']
+        else:
+            merged[key] = dict(row, total_emissions=total)
+
+    results = []
+    for key in sorted(merged, key=lambda key: tuple((value is None, value) for value in key)):
+        row = merged[key]
+        result = {name: row[name] for name in keys}
+        if 'period' in result:
+            result['period'] = result['period'].isoformat()
+        result['total_emissions'] = f"{Decimal(row['total_emissions']).quantize(TWO_PLACES):f}"
+        result['count'] = row['count']
+        results.append(result)
+    return results
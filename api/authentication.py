@@ -1,14 +1,50 @@
 """
 Custom API key authentication
 """
-from rest_framework.authentication import BaseAuthentication
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from saas.models import APIKey
-from django.utils import timezone
+from saas.api_keys import get_api_key, record_use
+from saas.auth import get_cached_token, get_cached_user
+
+
+class APIKeyUser:
+    """request.user for API key requests; the key acts on behalf of its tenant"""
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+    is_staff = False
+    is_superuser = False
+    pk = id = None
+    
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.tenant = api_key.tenant
+    
+    def __str__(self):
+        return f"API key {self.api_key.id} ({self.tenant.name})"
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication with the token and its user served from the cache"""
+    
+    def authenticate_credentials(self, key):
+        token = get_cached_token(key, self.get_model())
+        if token is None:
+            raise AuthenticationFailed('Invalid token.')
+        
+        user = get_cached_user(token.user_id)
+        if user is None or not user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        
+        return (user, token)
 
 
 class APIKeyAuthentication(BaseAuthentication):
-    """Authenticate using API key"""
+    """Authenticate using API key.
+
+    Verified keys come from an in-process cache and last_used is written in
+    periodic batches, so hot keys cost no queries per request.
+    """
     
     def authenticate(self, request):
         api_key = request.META.get('HTTP_X_API_KEY') or request.GET.get('api_key')
@@ -16,21 +52,14 @@ class APIKeyAuthentication(BaseAuthentication):
         if not api_key:
             return None
         
-        try:
-            key_obj = APIKey.objects.get(key=api_key, is_active=True)
-            
-            # Check if expired
-            if key_obj.is_expired():
-                raise AuthenticationFailed('API key has expired')
-            
-            # Update last used
-            key_obj.last_used = timezone.now()
-            key_obj.save()
-            
-            # Return user and tenant
-            return (key_obj.tenant, key_obj)
-        except APIKey.DoesNotExist:
+        key_obj = get_api_key(api_key)
+        if key_obj is None:
             raise AuthenticationFailed('Invalid API key')
-
-
-
+        
+        # Check if expired
+        if key_obj.is_expired():
+            raise AuthenticationFailed('API key has expired')
+        
+        record_use(key_obj)
+        
+        return (APIKeyUser(key_obj), key_obj)
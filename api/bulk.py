@@ -0,0 +1,235 @@
+"""
+Bulk create/update/upsert for suppliers and emission entries
+
+Each item is validated on its own, but uniqueness and ownership checks run
+against sets preloaded with one query per batch, and rows are written with
+``bulk_create``/``bulk_update``. Two modes are supported:
+
+* ``atomic``: any invalid item rejects the whole batch and nothing is written
+* ``partial``: valid items are written, invalid ones are reported
+"""
+from django.conf import settings
+from django.db import transaction
+from rest_framework import status
+
+from core.models import Supplier, EmissionEntry
+from ml_services.features import SUPPLIER_FEATURE_FIELDS, refresh_supplier_features
+from saas.versioning import bump_data_version
+from .serializers import SupplierBulkItemSerializer, EmissionEntryBulkItemSerializer
+
+MODES = ('atomic', 'partial')
+DEFAULT_MAX_ITEMS = 5000
+WRITE_BATCH_SIZE = 500
+
+
+class BulkRequestError(Exception):
+    """Raised for malformed bulk payloads"""
+
+
+def parse_bulk_request(request):
+    """Return (items, mode) from a bulk request body.
+
+    Accepts either a bare JSON array or ``{"items": [...], "mode": "..."}``;
+    ``?mode=`` in the query string takes precedence.
+    """
+    data = request.data
+    items = data if isinstance(data, list) else data.get('items')
+    if not isinstance(items, list) or not items:
+        raise BulkRequestError('Expected a non-empty array of items')
+
+    max_items = getattr(settings, 'API_BULK_MAX_ITEMS', DEFAULT_MAX_ITEMS)
+    if len(items) > max_items:
+        raise BulkRequestError(f'At most {max_items} items per request')
+    if not all(isinstance(item, dict) for item in items):
+        raise BulkRequestError('Every item must be an object')
+
+    mode = request.query_params.get('mode') or (data.get('mode') if isinstance(data, dict) else None) or 'atomic'
+    if mode not in MODES:
+        raise BulkRequestError(f"mode must be one of {', '.join(MODES)}")
+    return items, mode
+
+
+class BulkResult:
+    """Per-item outcome of a bulk operation"""
+
+    def __init__(self, size, atomic):
+        self.atomic = atomic
+        self.results = [{'index': index, 'status': None} for index in range(size)]
+
+    def error(self, index, errors):
+        self.results[index].update(status='error', errors=errors)
+
+    def has_errors(self):
+        return any(result['status'] == 'error' for result in self.results)
+
+    def mark_written(self, index, status_label, instance):
+        self.results[index].update(status=status_label, id=instance.pk)
+
+    def mark_skipped(self):
+        # Atomic batch rejected: valid items were not written either
+        for result in self.results:
+            if result['status'] is None:
+                result['status'] = 'skipped'
+
+    @property
+    def status_code(self):
+        if not self.has_errors():
+            return status.HTTP_200_OK
+        if self.atomic or all(result['status'] == 'error' for result in self.results):
+            return status.HTTP_400_BAD_REQUEST
+        return status.HTTP_207_MULTI_STATUS
+
+    def as_dict(self):
+        counts = {'created': 0, 'updated': 0, 'error': 0, 'skipped': 0}
+        for result in self.results:
+            counts[result['status']] += 1
+        return {
+            'mode': 'atomic' if self.atomic else 'partial',
+            'created': counts['created'],
+            'updated': counts['updated'],
+            'errors': counts['error'],
+            'skipped': counts['skipped'],
+            'results': self.results,
+        }
+
+
+def _write(model, result, creates, updates, update_fields, refresh_features=()):
+    """Persist validated rows; creates/updates are lists of (index, instance)
+
+    ``refresh_features`` names suppliers whose stored ML features depend on
+    the written rows; they are recomputed in the same transaction.
+    """
+    with transaction.atomic():
+        model.objects.bulk_create([instance for _, instance in creates], batch_size=WRITE_BATCH_SIZE)
+        if updates and update_fields:
+            model.objects.bulk_update([instance for _, instance in updates], sorted(update_fields), batch_size=WRITE_BATCH_SIZE)
+        refresh_supplier_features(refresh_features)
+    for index, instance in creates:
+        result.mark_written(index, 'created', instance)
+    for index, instance in updates:
+        result.mark_written(index, 'updated', instance)
+
+
+def bulk_upsert_suppliers(items, tenant, atomic=True):
+    """Create or update suppliers, matching existing rows by supplier_code"""
+    result = BulkResult(len(items), atomic)
+    codes = [item.get('supplier_code') for item in items]
+    emails = [item.get('contact_email') for item in items if item.get('contact_email')]
+
+    # One query each for the rows we may update and the emails already taken
+    existing = {s.supplier_code: s for s in Supplier.objects.filter(supplier_code__in=[c for c in codes if c])}
+    email_owners = dict(Supplier.objects.filter(contact_email__in=emails).values_list('contact_email', 'supplier_code'))
+
+    seen_codes, seen_emails = set(), set()
+    creates, updates, update_fields = [], [], set()
+    for index, item in enumerate(items):
+        code = codes[index]
+        if not code:
+            result.error(index, {'supplier_code': ['This field is required for bulk upsert.']})
+            continue
+        if code in seen_codes:
+            result.error(index, {'supplier_code': ['Duplicate supplier_code in this batch.']})
+            continue
+        seen_codes.add(code)
+
+        instance = existing.get(code)
+        if instance is not None and tenant is not None and instance.tenant_id != tenant.pk:
+            result.error(index, {'supplier_code': ['supplier with this supplier code already exists.']})
+            continue
+
+        serializer = SupplierBulkItemSerializer(instance, data=item, partial=instance is not None)
+        if not serializer.is_valid():
+            result.error(index, serializer.errors)
+            continue
+        data = serializer.validated_data
+
+        email = data.get('contact_email')
+        if email is not None:
+            if email in seen_emails or email_owners.get(email, code) != code:
+                result.error(index, {'contact_email': ['supplier with this contact email already exists.']})
+                continue
+            seen_emails.add(email)
+
+        if instance is None:
+            creates.append((index, Supplier(tenant=tenant, **data)))
+        else:
+            for field, value in data.items():
+                setattr(instance, field, value)
+            update_fields.update(data.keys())
+            updates.append((index, instance))
+
+    if atomic and result.has_errors():
+        result.mark_skipped()
+        return result
+
+    # bulk_create/bulk_update bypass post_save, so refresh features and invalidate caches here
+    refresh = [instance.pk for _, instance in updates] if update_fields & SUPPLIER_FEATURE_FIELDS else []
+    _write(Supplier, result, creates, updates, update_fields, refresh)
+    if creates or updates:
+        bump_data_version(tenant.pk if tenant else None)
+    return result
+
+
+def bulk_upsert_emission_entries(items, tenant, atomic=True):
+    """Create entries, or update them when an item carries the id of an existing entry"""
+    result = BulkResult(len(items), atomic)
+    entries = EmissionEntry.objects.all()
+    suppliers = Supplier.objects.all()
+    if tenant is not None:
+        entries = entries.filter(supplier__tenant=tenant)
+        suppliers = suppliers.filter(tenant=tenant)
+
+    entry_ids = [item['id'] for item in items if isinstance(item.get('id'), int)]
+    supplier_ids = [item['supplier'] for item in items if isinstance(item.get('supplier'), int)]
+    existing = entries.in_bulk(entry_ids)
+    # Suppliers the updated entries belonged to before this batch
+    previous_suppliers = {entry.supplier_id for entry in existing.values()}
+    allowed_suppliers = set(suppliers.filter(pk__in=supplier_ids).values_list('id', flat=True))
+
+    seen_ids = set()
+    creates, updates, update_fields = [], [], set()
+    for index, item in enumerate(items):
+        entry_id = item.get('id')
+        instance = None
+        if entry_id is not None:
+            instance = existing.get(entry_id)
+            if instance is None:
+                result.error(index, {'id': ['Emission entry not found.']})
+                continue
+            if entry_id in seen_ids:
+                result.error(index, {'id': ['Duplicate id in this batch.']})
+                continue
+            seen_ids.add(entry_id)
+
+        serializer = EmissionEntryBulkItemSerializer(instance, data=item, partial=instance is not None)
+        if not serializer.is_valid():
+            result.error(index, serializer.errors)
+            continue
+        data = dict(serializer.validated_data)
+
+        if 'supplier' in data:
+            supplier_id = data.pop('supplier')
+            if supplier_id not in allowed_suppliers:
+                result.error(index, {'supplier': [f'Invalid pk "{supplier_id}" - object does not exist.']})
+                continue
+            data['supplier_id'] = supplier_id
+
+        if instance is None:
+            creates.append((index, EmissionEntry(**data)))
+        else:
+            for field, value in data.items():
+                setattr(instance, field, value)
+            update_fields.update('supplier' if field == 'supplier_id' else field for field in data)
+            updates.append((index, instance))
+
+    if atomic and result.has_errors():
+        result.mark_skipped()
+        return result
+
+    written_suppliers = {instance.supplier_id for _, instance in creates + updates}
+    if updates:
+        written_suppliers |= previous_suppliers
+    _write(EmissionEntry, result, creates, updates, update_fields, written_suppliers)
+    if creates or updates:
+        bump_data_version(tenant.pk if tenant else None)
+    return result
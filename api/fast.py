@@ -0,0 +1,166 @@
+"""
+Fast read path for list endpoints
+
+Builds response rows straight from ``QuerySet.values()`` using converters
+compiled once per serializer class, instead of instantiating a
+``ModelSerializer`` field tree per row. The converters reproduce the
+serializer's ``to_representation`` output exactly, so the rendered JSON is
+byte-for-byte identical; with only primitive values left to encode the JSON
+renderer stays entirely in the C-accelerated path of the stdlib encoder.
+"""
+import datetime
+import decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.settings import api_settings
+
+
+class FastPathUnsupported(Exception):
+    """Raised when a serializer declares a field the fast path cannot reproduce"""
+
+
+def _passthrough(value, context):
+    return value
+
+
+def _to_str(value, context):
+    return str(value)
+
+
+def _to_int(value, context):
+    return int(value)
+
+
+def _date(value, context):
+    return value.isoformat()
+
+
+def _datetime(value, context):
+    field_timezone = context['timezone']
+    if field_timezone is not None:
+        value = value.astimezone(field_timezone) if timezone.is_aware(value) else timezone.make_aware(value, field_timezone)
+    elif timezone.is_aware(value):
+        value = timezone.make_naive(value, datetime.timezone.utc)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _decimal_converter(field):
+    if field.localize or field.normalize_output or not getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING):
+        raise FastPathUnsupported(f'Unsupported DecimalField options on {field.field_name}')
+    if field.decimal_places is None:
+        return lambda value, context: f'{value:f}'
+
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    quantize_context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        quantize_context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value, context):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return f'{value.quantize(exponent, rounding=rounding, context=quantize_context):f}'
+    return convert
+
+
+def _file_converter(model_field):
+    storage = model_field.storage
+
+    def convert(value, context):
+        if not value:
+            return None
+        url = storage.url(value)
+        request = context['request']
+        return request.build_absolute_uri(url) if request is not None else url
+    return convert
+
+
+def _compile_field(field, model):
+    """Return (values lookup, converter) for a serializer field"""
+    lookup = field.source.replace('.', '__')
+
+    if isinstance(field, PrimaryKeyRelatedField) and field.pk_field is None:
+        return lookup, _passthrough
+    if isinstance(field, serializers.DecimalField):
+        return lookup, _decimal_converter(field)
+    if isinstance(field, serializers.DateTimeField):
+        if getattr(field, 'format', api_settings.DATETIME_FORMAT) != ISO_8601 or hasattr(field, 'timezone'):
+            raise FastPathUnsupported(f'Unsupported DateTimeField format on {field.field_name}')
+        return lookup, _datetime
+    if isinstance(field, serializers.DateField):
+        if getattr(field, 'format', api_settings.DATE_FORMAT) != ISO_8601:
+            raise FastPathUnsupported(f'Unsupported DateField format on {field.field_name}')
+        return lookup, _date
+    if isinstance(field, serializers.FileField):
+        if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            return lookup, _passthrough
+        return lookup, _file_converter(model._meta.get_field(field.source))
+    if isinstance(field, serializers.ChoiceField):
+        if any(str(key) != key for key in field.choice_strings_to_values.values()):
+            raise FastPathUnsupported(f'Non-string choices on {field.field_name}')
+        return lookup, _passthrough
+    if isinstance(field, serializers.BooleanField):
+        return lookup, _passthrough
+    # BigIntegerField and COERCE_BIGINT_TO_STRING are missing from older DRF releases
+    big_integer_field = getattr(serializers, 'BigIntegerField', None)
+    if big_integer_field is not None and isinstance(field, big_integer_field) and getattr(
+        field, 'coerce_to_string', getattr(api_settings, 'COERCE_BIGINT_TO_STRING', False),
+    ):
+        return lookup, _to_str
+    if isinstance(field, serializers.IntegerField):
+        return lookup, _to_int
+    if isinstance(field, serializers.CharField):
+        return lookup, _to_str
+    if isinstance(field, serializers.JSONField) and not field.binary:
+        return lookup, _passthrough
+    raise FastPathUnsupported(f'{type(field).__name__} {field.field_name} has no fast converter')
+
+
+class FastRowSerializer:
+    """Precompiled, read-only equivalent of a ModelSerializer's output"""
+
+    def __init__(self, serializer_class, fields=None):
+        serializer = serializer_class(fields=fields) if fields is not None else serializer_class()
+        model = serializer.Meta.model
+        self.columns = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            lookup, converter = _compile_field(field, model)
+            self.columns.append((name, lookup, converter))
+        self.lookups = list(dict.fromkeys(lookup for _, lookup, _ in self.columns))
+
+    def values(self, queryset):
+        """Reduce a queryset to exactly the columns the serializer renders"""
+        return queryset.values(*self.lookups)
+
+    def to_representation(self, rows, request=None):
+        context = {
+            'request': request,
+            'timezone': timezone.get_current_timezone() if settings.USE_TZ else None,
+        }
+        columns = self.columns
+        return [
+            {
+                name: None if row[lookup] is None else convert(row[lookup], context)
+                for name, lookup, convert in columns
+            }
+            for row in rows
+        ]
+
+
+# Bounded: sparse fieldsets come from the query string
+@lru_cache(maxsize=512)
+def get_fast_serializer(serializer_class, fields=None):
+    """Return the compiled fast serializer for a class (and optional sparse fieldset), or None if unsupported"""
+    try:
+        return FastRowSerializer(serializer_class, fields)
+    except FastPathUnsupported:
+        return None
@@ -0,0 +1,48 @@
+"""
+Background job handlers for long-running API actions
+
+Each handler returns what the synchronous endpoint used to respond with, so
+the job result is a drop-in replacement for the old response body.
+"""
+from blockchain.services import BlockchainService
+from core.models import Supplier, EmissionEntry
+from jobs.services import register, report_progress
+from ml_services.services import MLPredictionService
+from scenarios.models import Scenario
+from scenarios.services import ScenarioService
+from .serializers import MLPredictionSerializer
+
+
+@register('supplier.predict_hotspot')
+def predict_hotspot(job, supplier_id):
+    supplier = Supplier.objects.get(pk=supplier_id)
+    report_progress(job, 0.1, 'Scoring supplier')
+    prediction = MLPredictionService.create_prediction(supplier, model_type='hotspot')
+    return MLPredictionSerializer(prediction).data
+
+
+@register('supplier.score_hotspots')
+def score_hotspots(job):
+    # Scoped by the job's tenant; jobs without one (users without a tenant) score all suppliers
+    suppliers = Supplier.objects.all() if job.tenant_id is None else Supplier.objects.filter(tenant_id=job.tenant_id)
+    report_progress(job, 0.1, 'Scoring suppliers')
+    predictions = MLPredictionService.score_suppliers(suppliers)
+    return {'scored': len(predictions), 'hotspots': sum(p.is_hotspot for p in predictions)}
+
+
+@register('scenario.calculate')
+def calculate_scenario(job, scenario_id):
+    scenario = Scenario.objects.get(pk=scenario_id)
+    report_progress(job, 0.1, 'Calculating baseline and projection')
+    return ScenarioService.calculate_scenario(scenario)
+
+
+@register('emission.verify_blockchain')
+def verify_blockchain(job, entry_id):
+    entry = EmissionEntry.objects.get(pk=entry_id)
+    report_progress(job, 0.1, 'Submitting verification')
+    verification = BlockchainService().verify_emission_entry(entry)
+    return {
+        'transaction_hash': verification.transaction_hash,
+        'status': verification.verification_status,
+    }
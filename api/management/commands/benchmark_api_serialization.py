@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from datetime import timedelta
+from decimal import Decimal
+import random
+import time
+from core.models import Supplier, EmissionEntry
+from iot.models import IoTDevice, IoTReading
+from api.fast import get_fast_serializer
+from api.optimization import optimize_queryset
+from api.serializers import EmissionEntrySerializer, IoTReadingSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare ModelSerializer and fast read path rendering on synthetic data (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Rows per endpoint')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per path (best is reported)')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        request = Request(RequestFactory().get('/api/emissions/'))
+        renderer = JSONRenderer()
+
+        with transaction.atomic():
+            entries, readings = self.create_data(rows)
+            for label, queryset, serializer_class in [
+                ('/api/emissions/', entries, EmissionEntrySerializer),
+                ('/api/iot/devices/{id}/recent_readings/', readings, IoTReadingSerializer),
+            ]:
+                fast = get_fast_serializer(serializer_class)
+
+                def slow_render():
+                    data = serializer_class(optimize_queryset(queryset, serializer_class), many=True, context={'request': request}).data
+                    return renderer.render(data)
+
+                def fast_render():
+                    return renderer.render(fast.to_representation(fast.values(queryset), request))
+
+                slow_time, slow_body = self.best_of(slow_render, repeat)
+                fast_time, fast_body = self.best_of(fast_render, repeat)
+                if slow_body != fast_body:
+                    self.stdout.write(self.style.ERROR(f'{label}: output differs between paths'))
+
+                self.stdout.write(
+                    f'{label} ({rows} rows): ModelSerializer {slow_time * 1000:.1f} ms, '
+                    f'fast path {fast_time * 1000:.1f} ms, speedup {slow_time / fast_time:.1f}x'
+                )
+            transaction.set_rollback(True)
+
+    def best_of(self, func, repeat):
+        best, body = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, body
+
+    def create_data(self, rows):
+        supplier = Supplier.objects.create(name='Benchmark Supplier', supplier_code='BENCH-API', contact_email='bench-api@example.com')
+        device = IoTDevice.objects.create(device_id='bench-api', supplier=supplier, device_name='Bench Meter', device_type='Smart Meter')
+        now = timezone.now()
+        EmissionEntry.objects.bulk_create([
+            EmissionEntry(
+                supplier=supplier,
+                date_reported=now - timedelta(hours=i),
+                scope3_emissions=Decimal(str(round(random.uniform(10, 1000), 2))),
+                notes=f'Benchmark entry {i}',
+                ml_confidence=Decimal('0.8500'),
+            )
+            for i in range(rows)
+        ])
+        IoTReading.objects.bulk_create([
+            IoTReading(
+                device=device,
+                energy_kwh=Decimal(str(round(random.uniform(1, 50), 4))),
+                power_kw=Decimal('2.5000'),
+                voltage=Decimal('230.00'),
+                metadata={'sequence': i},
+            )
+            for i in range(rows)
+        ])
+        return EmissionEntry.objects.filter(supplier=supplier), IoTReading.objects.filter(device=device)
@@ -0,0 +1,179 @@
+"""
+Reusable viewset behaviour for the REST API
+"""
+import hashlib
+from functools import lru_cache
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from monitoring.timing import span
+from saas.auth import get_user_tenant
+from saas.versioning import get_data_version
+from .fast import get_fast_serializer
+from .optimization import optimize_queryset
+from .serializers import DynamicFieldsModelSerializer
+
+
+class TenantScopedMixin:
+    """Set ``request.tenant`` once DRF has authenticated the request.
+
+    The tenant follows whichever authenticator accepted the request: a
+    session or token user's membership, or an API key's tenant.
+    """
+
+    def perform_authentication(self, request):
+        super().perform_authentication(request)
+        request.tenant = request._request.tenant = get_user_tenant(request.user)
+
+
+@lru_cache(maxsize=None)
+def _field_names(serializer_class):
+    return tuple(serializer_class().fields)
+
+
+def _split_param(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class SparseFieldsetMixin:
+    """``?fields=`` and ``?exclude=`` support for read requests.
+
+    Both take comma-separated serializer field names. The selection narrows
+    the serializer returned by ``get_serializer`` and is passed on to query
+    optimisation and the fast path, so unused columns and joins are skipped
+    as well. Writes always use the full serializer.
+
+    ``sparse_actions`` lists the actions rendering the viewset's own
+    serializer; actions rendering another serializer pass it explicitly.
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def get_sparse_fields(self, serializer_class=None):
+        """Return the selected field names in declaration order, or None for all fields"""
+        request = self.request
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None
+        if serializer_class is None and self.action not in self.sparse_actions:
+            return None
+        selected = _split_param(request.query_params.get('fields', ''))
+        excluded = _split_param(request.query_params.get('exclude', ''))
+        if not selected and not excluded:
+            return None
+
+        serializer_class = serializer_class or self.get_serializer_class()
+        if not issubclass(serializer_class, DynamicFieldsModelSerializer):
+            return None
+        names = _field_names(serializer_class)
+        unknown = sorted(set(selected + excluded) - set(names))
+        if unknown:
+            raise ValidationError({'fields': [f"Unknown field(s): {', '.join(unknown)}"]})
+        return tuple(name for name in names if (not selected or name in selected) and name not in excluded)
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+
+class QueryOptimizationMixin(SparseFieldsetMixin):
+    """Derive select_related/prefetch_related from the viewset's serializer.
+
+    Applied in ``filter_queryset`` so list, retrieve and any action that calls
+    ``self.filter_queryset(self.get_queryset())`` run a fixed number of
+    queries whatever the page size.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return optimize_queryset(queryset, self.get_serializer_class(), self.get_sparse_fields())
+
+
+class FastListMixin(SparseFieldsetMixin):
+    """Opt-in fast serialization for read-only list responses.
+
+    Viewsets set ``fast_list = True`` to render ``list`` from ``.values()``
+    rows via :mod:`api.fast`. The JSON output is identical to the
+    ModelSerializer path, which is still used for other renderers (such as
+    the browsable API) and for serializers the fast path cannot reproduce.
+    """
+    fast_list = False
+
+    def get_fast_serializer(self, serializer_class=None):
+        if not isinstance(self.request.accepted_renderer, JSONRenderer):
+            return None
+        serializer_class = serializer_class or self.get_serializer_class()
+        return get_fast_serializer(serializer_class, self.get_sparse_fields(serializer_class))
+
+    def list(self, request, *args, **kwargs):
+        fast = self.get_fast_serializer() if self.fast_list else None
+        if fast is None:
+            return super().list(request, *args, **kwargs)
+        return self.fast_list_response(self.filter_queryset(self.get_queryset()), fast)
+
+    def fast_list_response(self, queryset, fast, paginate=True):
+        rows = fast.values(queryset)
+        page = self.paginate_queryset(rows) if paginate else None
+        with span('serialize'):
+            data = fast.to_representation(rows if page is None else page, self.request)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class CachedResponseMixin:
+    """Conditional GET and per-tenant response caching for read endpoints.
+
+    The ETag is derived from the endpoint, tenant, data version, renderer and
+    query string, so a matching ``If-None-Match`` is answered with 304 before
+    any queryset is evaluated. Rendered JSON bodies are cached under the same
+    key; a write to the tenant's data bumps the version and orphans them.
+    """
+    response_cache_timeout = None
+
+    def get_cache_tenant_id(self):
+        tenant = self.request.tenant
+        return tenant.pk if tenant is not None else None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def cached_response(self, request, build):
+        tenant_id = self.get_cache_tenant_id()
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        renderer = request.accepted_renderer.format
+        key_source = f'{self.basename}:{self.action}:{tenant_id}:{get_data_version(tenant_id)}:{renderer}:{query}'
+        digest = hashlib.sha256(key_source.encode()).hexdigest()
+        etag = f'"{digest[:32]}"'
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=304)
+            response['ETag'] = etag
+            return response
+
+        # Only JSON is cached; the browsable API embeds per-user content
+        cacheable = isinstance(request.accepted_renderer, JSONRenderer)
+        cache_key = f'api-response:{digest}'
+        cached = cache.get(cache_key) if cacheable else None
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            response = build()
+            if cacheable and response.status_code == 200:
+                timeout = self.response_cache_timeout or getattr(settings, 'API_RESPONSE_CACHE_TIMEOUT', 300)
+                response.add_post_render_callback(
+                    lambda rendered: cache.set(cache_key, (rendered.content, rendered['Content-Type']), timeout)
+                )
+
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
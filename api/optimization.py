@@ -0,0 +1,115 @@
+"""
+Query optimisation derived from serializer declarations
+"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.relations import ManyRelatedField, RelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+def _collect_lookups(fields, model, prefix, to_many, select, prefetch):
+    for field in fields.values():
+        if field.source == '*':
+            continue
+
+        nested = isinstance(field, BaseSerializer)
+        needs_object = nested or isinstance(field, ManyRelatedField) or (
+            isinstance(field, RelatedField) and not field.use_pk_only_optimization()
+        )
+        # 'supplier.name' needs the supplier row; a plain 'supplier' pk field does not
+        attrs = field.source.split('.')
+        walk = attrs if needs_object else attrs[:-1]
+
+        current_model, lookup, many = model, prefix, to_many
+        for attr in walk:
+            try:
+                model_field = current_model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                # Properties and methods cannot be optimised
+                break
+            if not model_field.is_relation:
+                break
+            lookup = f'{lookup}__{attr}' if lookup else attr
+            many = many or model_field.many_to_many or model_field.one_to_many
+            (prefetch if many else select).add(lookup)
+            current_model = model_field.related_model
+        else:
+            if nested and walk:
+                child = field.child if isinstance(field, ListSerializer) else field
+                _collect_lookups(child.fields, current_model, lookup, many, select, prefetch)
+
+
+def _collect_columns(fields, model):
+    """Return the column lookups a serializer reads, or None if they cannot be known"""
+    columns = {model._meta.pk.name}
+    for field in fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*' or isinstance(field, BaseSerializer):
+            return None
+
+        current_model, path = model, []
+        for attr in field.source.split('.'):
+            try:
+                model_field = current_model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                # A property or method may read any column
+                return None
+            path.append(attr)
+            if not model_field.concrete:
+                # Reverse and many-to-many relations are prefetched by primary key
+                break
+            columns.add('__'.join(path))
+            if not model_field.is_relation:
+                break
+            current_model = model_field.related_model
+    return sorted(columns)
+
+
+def get_related_lookups(serializer, fields=None):
+    """Return (select_related, prefetch_related) lookups needed to render a serializer.
+
+    Accepts a serializer class or instance; the serializer must declare
+    ``Meta.model``. Forward foreign keys become ``select_related`` joins while
+    reverse and many-to-many relations become ``prefetch_related`` lookups.
+    ``fields`` narrows a serializer class to a sparse fieldset.
+    """
+    if isinstance(serializer, type):
+        return _describe_class(serializer, fields)[:2]
+    select, prefetch = set(), set()
+    _collect_lookups(serializer.fields, serializer.Meta.model, '', False, select, prefetch)
+    return sorted(select), sorted(prefetch)
+
+
+def get_only_fields(serializer, fields=None):
+    """Return the lookups to pass to ``QuerySet.only()`` for a serializer, or None"""
+    if isinstance(serializer, type):
+        return _describe_class(serializer, fields)[2]
+    return _collect_columns(serializer.fields, serializer.Meta.model)
+
+
+# Bounded: sparse fieldsets come from the query string
+@lru_cache(maxsize=512)
+def _describe_class(serializer_class, fields):
+    serializer = serializer_class(fields=fields) if fields is not None else serializer_class()
+    select, prefetch = get_related_lookups(serializer)
+    return select, prefetch, get_only_fields(serializer)
+
+
+def optimize_queryset(queryset, serializer, fields=None):
+    """Apply the joins and prefetches a serializer needs, avoiding one query per row.
+
+    With a sparse fieldset the query is also limited to the columns the
+    selected fields read.
+    """
+    select, prefetch = get_related_lookups(serializer, fields)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if fields is not None:
+        only = get_only_fields(serializer, fields)
+        if only:
+            queryset = queryset.only(*only)
+    return queryset
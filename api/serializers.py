@@ -7,15 +7,36 @@ from iot.models import IoTDevice, IoTReading
 from ml_services.models import MLPrediction, SpendBasedEstimate
 from scenarios.models import Scenario, ScenarioSupplier
 from saas.models import Tenant, APIKey
+from jobs.models import Job
+from monitoring.timing import get_current
 
 
-class SupplierSerializer(serializers.ModelSerializer):
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer that can be narrowed with ``fields`` and ``exclude`` arguments"""
+
+    def __init__(self, *args, fields=None, exclude=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in exclude or ():
+            self.fields.pop(name, None)
+
+    def to_representation(self, instance):
+        timings = get_current()
+        if timings is None:
+            return super().to_representation(instance)
+        with timings.span('serialize'):
+            return super().to_representation(instance)
+
+
+class SupplierSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Supplier
         fields = '__all__'
 
 
-class EmissionEntrySerializer(serializers.ModelSerializer):
+class EmissionEntrySerializer(DynamicFieldsModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     
     class Meta:
@@ -23,7 +44,7 @@ class EmissionEntrySerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class IoTDeviceSerializer(serializers.ModelSerializer):
+class IoTDeviceSerializer(DynamicFieldsModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     
     class Meta:
@@ -32,7 +53,7 @@ class IoTDeviceSerializer(serializers.ModelSerializer):
         extra_kwargs = {'api_key': {'read_only': True}}
 
 
-class IoTReadingSerializer(serializers.ModelSerializer):
+class IoTReadingSerializer(DynamicFieldsModelSerializer):
     device_name = serializers.CharField(source='device.device_name', read_only=True)
     
     class Meta:
@@ -40,7 +61,7 @@ class IoTReadingSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class MLPredictionSerializer(serializers.ModelSerializer):
+class MLPredictionSerializer(DynamicFieldsModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     
     class Meta:
@@ -48,7 +69,7 @@ class MLPredictionSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class SpendBasedEstimateSerializer(serializers.ModelSerializer):
+class SpendBasedEstimateSerializer(DynamicFieldsModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     
     class Meta:
@@ -56,13 +77,13 @@ class SpendBasedEstimateSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class ScenarioSerializer(serializers.ModelSerializer):
+class ScenarioSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Scenario
         fields = '__all__'
 
 
-class ScenarioSupplierSerializer(serializers.ModelSerializer):
+class ScenarioSupplierSerializer(DynamicFieldsModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     scenario_name = serializers.CharField(source='scenario.name', read_only=True)
     
@@ -71,4 +92,35 @@ class ScenarioSupplierSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'status', 'progress', 'progress_message', 'result', 'error',
+            'cancel_requested', 'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+
+class SupplierBulkItemSerializer(serializers.ModelSerializer):
+    """Validates one item of a bulk supplier upsert.
 
+    Uniqueness is checked by :mod:`api.bulk` against preloaded sets, so the
+    per-item UniqueValidator queries are dropped here.
+    """
+    class Meta:
+        model = Supplier
+        exclude = ['tenant']
+        extra_kwargs = {
+            'supplier_code': {'validators': [], 'required': True},
+            'contact_email': {'validators': []},
+        }
+
+
+class EmissionEntryBulkItemSerializer(serializers.ModelSerializer):
+    """Validates one item of a bulk emission entry write; suppliers are resolved in bulk"""
+    supplier = serializers.IntegerField()
+
+    class Meta:
+        model = EmissionEntry
+        exclude = ['evidence_file', 'evidence_sha256', 'evidence_document', 'blockchain_hash', 'blockchain_verified']
@@ -0,0 +1,503 @@
+import importlib
+import os
+import sys
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.settings import DEFAULTS, APISettings
+from rest_framework.test import APITestCase
+
+from api.fast import get_fast_serializer
+from api.serializers import EmissionEntrySerializer
+from api.views import EmissionEntryViewSet
+
+from core.models import Supplier, EmissionEntry
+from iot.models import IoTDevice, IoTReading
+from monitoring import profiling
+from ml_services.models import MLModel, MLPrediction, SpendBasedEstimate
+from saas import ratelimit
+from saas.auth import get_cached_user
+from saas.models import Tenant, TenantUser
+from scenarios.models import Scenario
+
+
+class QueryBudgetTestCase(APITestCase):
+    """Base test case asserting an endpoint runs a fixed number of queries.
+
+    ``assertQueryBudget`` grows the data set with ``add_rows`` and requests
+    the URL, twice; both requests must run exactly ``budget`` queries, so an
+    N+1 regression fails regardless of page size.
+    """
+
+    def setUp(self):
+        cache.clear()
+        ratelimit.reset()
+
+    def authenticate(self):
+        # Fresh user instance per request so relation caches never hide queries
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+
+    def count_queries(self, url, status=200, **headers):
+        self.authenticate()
+        # Measure steady state: the user and tenant come from the auth cache
+        # and profiling rules from the per-process copy
+        get_cached_user(self.user.pk)
+        profiling.match_rule(url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, status, response.content)
+        return len(context.captured_queries), context
+
+    def assertQueryBudget(self, url, budget, add_rows):
+        for _ in range(2):
+            add_rows()
+            executed, context = self.count_queries(url)
+            queries = '\n'.join(q['sql'] for q in context.captured_queries)
+            self.assertEqual(executed, budget, f"{url} ran {executed} queries, budget is {budget}:\n{queries}")
+
+
+class APIQueryBudgetTests(QueryBudgetTestCase):
+    # Page count, page rows
+    LIST_BUDGET = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Acme', slug='acme')
+        cls.user = User.objects.create_user('analyst', password='secret')
+        TenantUser.objects.create(tenant=cls.tenant, user=cls.user, role='admin')
+        cls.model = MLModel.objects.create(name='Hotspot Model', model_type='hotspot')
+        cls.supplier = Supplier.objects.create(
+            name='Steel Co', supplier_code='SUP-0', contact_email='s0@example.com', tenant=cls.tenant,
+        )
+        cls.device = IoTDevice.objects.create(
+            device_id='dev-0', supplier=cls.supplier, device_name='Meter 0', device_type='Smart Meter',
+        )
+        cls.counter = 0
+
+    def add_suppliers(self, count=5):
+        for _ in range(count):
+            APIQueryBudgetTests.counter += 1
+            n = self.counter
+            supplier = Supplier.objects.create(
+                name=f'Supplier {n}', supplier_code=f'SUP-{n}', contact_email=f's{n}@example.com', tenant=self.tenant,
+            )
+            EmissionEntry.objects.create(
+                supplier=supplier, date_reported=timezone.now(), scope3_emissions=Decimal('10.50'),
+            )
+            IoTDevice.objects.create(
+                device_id=f'dev-{n}', supplier=supplier, device_name=f'Meter {n}', device_type='Smart Meter',
+            )
+            MLPrediction.objects.create(
+                supplier=supplier, model=self.model, predicted_emissions=Decimal('12.00'),
+                confidence_score=Decimal('0.5'), is_hotspot=True,
+                period_start=date.today(), period_end=date.today() + timedelta(days=365),
+            )
+            Scenario.objects.create(
+                name=f'Scenario {n}', scenario_type='efficiency', tenant=self.tenant,
+                baseline_emissions=Decimal('100'), projected_emissions=Decimal('80'),
+                reduction_percentage=Decimal('20'), reduction_amount=Decimal('20'),
+            )
+
+    def add_supplier_rows(self, count=5):
+        for _ in range(count):
+            EmissionEntry.objects.create(
+                supplier=self.supplier, date_reported=timezone.now(), scope3_emissions=Decimal('3.25'),
+            )
+            IoTReading.objects.create(device=self.device, energy_kwh=Decimal('1.5'))
+
+    def test_supplier_list(self):
+        self.assertQueryBudget('/api/suppliers/', self.LIST_BUDGET, self.add_suppliers)
+
+    def test_emission_list(self):
+        self.assertQueryBudget('/api/emissions/', self.LIST_BUDGET, self.add_suppliers)
+
+    def test_iot_device_list(self):
+        self.assertQueryBudget('/api/iot/devices/', self.LIST_BUDGET, self.add_suppliers)
+
+    def test_prediction_list(self):
+        self.assertQueryBudget('/api/ml/predictions/', self.LIST_BUDGET, self.add_suppliers)
+
+    def test_hotspot_predictions(self):
+        # Unpaginated: rows only
+        self.assertQueryBudget('/api/ml/predictions/hotspots/', 1, self.add_suppliers)
+
+    def test_scenario_list(self):
+        self.assertQueryBudget('/api/scenarios/', self.LIST_BUDGET, self.add_suppliers)
+
+    def test_supplier_emissions(self):
+        # Supplier, entries
+        self.assertQueryBudget(f'/api/suppliers/{self.supplier.pk}/emissions/', 2, self.add_supplier_rows)
+
+    def test_device_recent_readings(self):
+        # Device, readings
+        self.assertQueryBudget(f'/api/iot/devices/{self.device.pk}/recent_readings/', 2, self.add_supplier_rows)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class FastListTests(APITestCase):
+    """The fast read path must render exactly the bytes ModelSerializer does"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Acme', slug='acme')
+        cls.user = User.objects.create_user('analyst', password='secret')
+        TenantUser.objects.create(tenant=cls.tenant, user=cls.user, role='admin')
+        cls.supplier = Supplier.objects.create(
+            name='Zürich Stahl \u2028 AG', supplier_code='SUP-1', contact_email='z@example.com', tenant=cls.tenant,
+        )
+        cls.device = IoTDevice.objects.create(
+            device_id='dev-1', supplier=cls.supplier, device_name='Méter "1"', device_type='Smart Meter',
+        )
+        for i in range(25):
+            EmissionEntry.objects.create(
+                supplier=cls.supplier, date_reported=timezone.now() - timedelta(days=i, microseconds=i),
+                scope3_emissions=Decimal('1234.5') + i, notes='CO₂ \u2029 note' if i % 2 else '',
+                evidence_file='evidence/legacy.pdf' if i % 3 == 0 else None,
+                ml_confidence=Decimal('0.9') if i % 4 == 0 else None, verified=bool(i % 2),
+            )
+            IoTReading.objects.create(
+                device=cls.device, energy_kwh=Decimal('12.3456'), power_kw=Decimal('1.5') if i % 2 else None,
+                metadata={'phase': i, 'ratio': 0.1 * i, 'tags': ['a', None, True]},
+            )
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def assertSameBytes(self, url, disable_fast):
+        fast = self.client.get(url)
+        with disable_fast:
+            slow = self.client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_emission_list_matches_model_serializer(self):
+        for url in ['/api/emissions/', '/api/emissions/?page=2', '/api/emissions/?format=json']:
+            self.assertSameBytes(url, mock.patch.object(EmissionEntryViewSet, 'fast_list', False))
+
+    def test_recent_readings_match_model_serializer(self):
+        url = f'/api/iot/devices/{self.device.pk}/recent_readings/'
+        self.assertSameBytes(url, mock.patch('api.mixins.get_fast_serializer', return_value=None))
+
+    def test_drf_without_bigint_support(self):
+        # Older DRF releases have neither BigIntegerField nor COERCE_BIGINT_TO_STRING
+        big_integer_field = serializers.BigIntegerField
+        del serializers.BigIntegerField
+        self.addCleanup(setattr, serializers, 'BigIntegerField', big_integer_field)
+        legacy_settings = APISettings(defaults={k: v for k, v in DEFAULTS.items() if k != 'COERCE_BIGINT_TO_STRING'})
+        get_fast_serializer.cache_clear()
+        self.addCleanup(get_fast_serializer.cache_clear)
+        with mock.patch('api.fast.api_settings', legacy_settings):
+            self.assertIsNotNone(get_fast_serializer(EmissionEntrySerializer))
+            self.assertSameBytes('/api/emissions/', mock.patch.object(EmissionEntryViewSet, 'fast_list', False))
+
+    def test_browsable_api_uses_model_serializer(self):
+        response = self.client.get('/api/emissions/', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200)
+
+
+class CachedResponseTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Acme', slug='acme')
+        cls.other_tenant = Tenant.objects.create(name='Other', slug='other')
+        cls.user = User.objects.create_user('analyst', password='secret')
+        TenantUser.objects.create(tenant=cls.tenant, user=cls.user, role='admin')
+        cls.supplier = Supplier.objects.create(
+            name='Steel Co', supplier_code='SUP-0', contact_email='s0@example.com', tenant=cls.tenant,
+        )
+
+    def test_if_none_match_returns_304_without_list_query(self):
+        self.authenticate()
+        etag = self.client.get('/api/suppliers/')['ETag']
+        executed, context = self.count_queries('/api/suppliers/', HTTP_IF_NONE_MATCH=etag, status=304)
+        self.assertEqual(executed, 0)
+
+    def test_cached_body_is_reused_until_tenant_data_changes(self):
+        self.authenticate()
+        first = self.client.get('/api/suppliers/')
+        executed, context = self.count_queries('/api/suppliers/')
+        self.assertEqual(executed, 0)
+
+        Supplier.objects.create(name='New Co', supplier_code='SUP-1', contact_email='s1@example.com', tenant=self.tenant)
+        changed = self.client.get('/api/suppliers/')
+        self.assertNotEqual(first['ETag'], changed['ETag'])
+        self.assertEqual(changed.json()['count'], 2)
+
+    def test_other_tenant_writes_keep_etag(self):
+        self.authenticate()
+        etag = self.client.get('/api/suppliers/')['ETag']
+        Supplier.objects.create(name='Else', supplier_code='SUP-9', contact_email='s9@example.com', tenant=self.other_tenant)
+        self.authenticate()
+        self.assertEqual(self.client.get('/api/suppliers/')['ETag'], etag)
+
+    def test_query_string_is_part_of_the_key(self):
+        self.authenticate()
+        self.assertNotEqual(self.client.get('/api/suppliers/')['ETag'], self.client.get('/api/suppliers/?page=1')['ETag'])
+
+
+class ProductionSettingsTests(SimpleTestCase):
+    def load(self, **environ):
+        self.addCleanup(sys.modules.pop, 'scope3_tracker.settings_prod', None)
+        with mock.patch.dict(os.environ, environ):
+            for name in ['REDIS_URL', 'METRICS_TOKEN']:
+                if name not in environ:
+                    os.environ.pop(name, None)
+            sys.modules.pop('scope3_tracker.settings_prod', None)
+            return importlib.import_module('scope3_tracker.settings_prod')
+
+    def test_shared_cache_is_required(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'REDIS_URL'):
+            self.load()
+        settings_prod = self.load(REDIS_URL='redis://cache:6379/0')
+        self.assertEqual(settings_prod.CACHES['default']['LOCATION'], 'redis://cache:6379/0')
+
+    def test_monitoring_defaults(self):
+        settings_prod = self.load(REDIS_URL='redis://cache:6379/0')
+        self.assertEqual(settings_prod.CACHES['default']['BACKEND'], 'monitoring.cache.RedisCache')
+        self.assertLessEqual(settings_prod.REQUEST_TIMING_SAMPLE_RATE, 0.01)
+        self.assertFalse(settings_prod.REQUEST_TIMING_HEADER)
+        self.assertEqual(settings_prod.METRICS_TOKEN, '')
+        settings_prod = self.load(REDIS_URL='redis://cache:6379/0', METRICS_TOKEN='scrape-secret')
+        self.assertEqual(settings_prod.METRICS_TOKEN, 'scrape-secret')
+
+
+class BulkUpsertTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Acme', slug='acme')
+        cls.other_tenant = Tenant.objects.create(name='Other', slug='other')
+        cls.user = User.objects.create_user('analyst', password='secret')
+        TenantUser.objects.create(tenant=cls.tenant, user=cls.user, role='admin')
+        cls.supplier = Supplier.objects.create(
+            name='Steel Co', supplier_code='SUP-0', contact_email='s0@example.com', tenant=cls.tenant,
+        )
+        cls.foreign = Supplier.objects.create(
+            name='Else', supplier_code='EXT-0', contact_email='e0@example.com', tenant=cls.other_tenant,
+        )
+
+    def post(self, url, data):
+        self.authenticate()
+        return self.client.post(url, data, format='json')
+
+    def supplier_items(self, count):
+        return [
+            {'supplier_code': f'ERP-{i}', 'name': f'ERP Supplier {i}', 'contact_email': f'erp{i}@example.com'}
+            for i in range(count)
+        ]
+
+    def test_upsert_suppliers_with_fixed_queries(self):
+        items = self.supplier_items(50) + [{'supplier_code': 'SUP-0', 'name': 'Steel Co Renamed'}]
+        self.authenticate()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/suppliers/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        self.assertEqual((body['created'], body['updated'], body['errors']), (50, 1, 0))
+        self.assertEqual(body['results'][50]['id'], self.supplier.pk)
+        self.assertEqual(Supplier.objects.filter(tenant=self.tenant).count(), 51)
+        self.assertEqual(Supplier.objects.get(pk=self.supplier.pk).name, 'Steel Co Renamed')
+        # Auth + preloads + one insert + one update, however many items are sent
+        self.assertLessEqual(len(context.captured_queries), 12)
+
+    def test_atomic_mode_writes_nothing_on_error(self):
+        items = self.supplier_items(3) + [
+            {'supplier_code': 'ERP-0', 'name': 'Duplicate', 'contact_email': 'dup@example.com'},
+            {'supplier_code': 'EXT-0', 'name': 'Other tenant', 'contact_email': 'x@example.com'},
+            {'supplier_code': 'ERP-9', 'name': 'Taken email', 'contact_email': 's0@example.com'},
+        ]
+        response = self.post('/api/suppliers/bulk/', items)
+        self.assertEqual(response.status_code, 400)
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, ['skipped'] * 3 + ['error'] * 3)
+        self.assertFalse(Supplier.objects.filter(supplier_code__startswith='ERP-').exists())
+
+    def test_partial_mode_writes_valid_items(self):
+        items = self.supplier_items(2) + [{'supplier_code': 'ERP-2', 'name': 'No email'}]
+        response = self.post('/api/suppliers/bulk/?mode=partial', items)
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([r['status'] for r in response.json()['results']], ['created', 'created', 'error'])
+        self.assertIn('contact_email', response.json()['results'][2]['errors'])
+        self.assertEqual(Supplier.objects.filter(supplier_code__startswith='ERP-').count(), 2)
+
+    def test_bulk_write_invalidates_cached_lists(self):
+        self.authenticate()
+        etag = self.client.get('/api/suppliers/')['ETag']
+        self.post('/api/suppliers/bulk/', self.supplier_items(1))
+        self.authenticate()
+        self.assertNotEqual(self.client.get('/api/suppliers/')['ETag'], etag)
+
+    def test_emission_entries_create_and_update(self):
+        entry = EmissionEntry.objects.create(
+            supplier=self.supplier, date_reported=timezone.now(), scope3_emissions=Decimal('1.00'),
+        )
+        items = [
+            {'supplier': self.supplier.pk, 'date_reported': '2024-01-01T00:00:00Z', 'scope3_emissions': '5.50'},
+            {'id': entry.pk, 'scope3_emissions': '2.00'},
+            {'supplier': self.foreign.pk, 'date_reported': '2024-01-01T00:00:00Z', 'scope3_emissions': '1.00'},
+        ]
+        response = self.post('/api/emissions/bulk/', {'items': items, 'mode': 'partial'})
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([r['status'] for r in response.json()['results']], ['created', 'updated', 'error'])
+        entry.refresh_from_db()
+        self.assertEqual(entry.scope3_emissions, Decimal('2.00'))
+        self.assertFalse(EmissionEntry.objects.filter(supplier=self.foreign).exists())
+
+    def test_rejects_malformed_payloads(self):
+        self.assertEqual(self.post('/api/suppliers/bulk/', {'name': 'single'}).status_code, 400)
+        self.assertEqual(self.post('/api/suppliers/bulk/?mode=eventual', self.supplier_items(1)).status_code, 400)
+        with override_settings(API_BULK_MAX_ITEMS=2):
+            self.assertEqual(self.post('/api/suppliers/bulk/', self.supplier_items(3)).status_code, 400)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class SparseFieldsetTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Acme', slug='acme')
+        cls.user = User.objects.create_user('analyst', password='secret')
+        TenantUser.objects.create(tenant=cls.tenant, user=cls.user, role='admin')
+        cls.supplier = Supplier.objects.create(
+            name='Steel Co', supplier_code='SUP-0', contact_email='s0@example.com', tenant=cls.tenant,
+        )
+        for i in range(3):
+            EmissionEntry.objects.create(
+                supplier=cls.supplier, date_reported=timezone.now(), scope3_emissions=Decimal('2.50') + i, notes='long note',
+            )
+
+    def get(self, url):
+        self.authenticate()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_fields_and_exclude_narrow_the_payload(self):
+        row = self.get('/api/suppliers/?fields=id,name').json()['results'][0]
+        self.assertEqual(list(row), ['id', 'name'])
+        row = self.get('/api/suppliers/?exclude=tenant,contact_email').json()['results'][0]
+        self.assertNotIn('tenant', row)
+        self.assertNotIn('contact_email', row)
+        self.assertIn('supplier_code', row)
+
+    def test_unknown_fields_are_rejected(self):
+        self.authenticate()
+        response = self.client.get('/api/suppliers/?fields=id,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['fields'][0])
+
+    def test_selected_columns_are_pushed_down(self):
+        for fast in (True, False):
+            with mock.patch.object(EmissionEntryViewSet, 'fast_list', fast):
+                executed, context = self.count_queries('/api/emissions/?fields=id,scope3_emissions')
+            rows_sql = context.captured_queries[-1]['sql']
+            self.assertIn('scope3_emissions', rows_sql)
+            self.assertNotIn('notes', rows_sql)
+            self.assertNotIn('"core_supplier"."name"', rows_sql)
+
+    def test_fast_path_matches_model_serializer(self):
+        url = '/api/emissions/?fields=id,supplier_name,scope3_emissions'
+        fast = self.get(url).content
+        with mock.patch.object(EmissionEntryViewSet, 'fast_list', False):
+            self.assertEqual(self.get(url).content, fast)
+
+    def test_nested_action_honours_fields(self):
+        rows = self.get(f'/api/suppliers/{self.supplier.pk}/emissions/?fields=id,scope3_emissions').json()
+        self.assertEqual([list(row) for row in rows], [['id', 'scope3_emissions']] * 3)
+
+    def test_writes_use_the_full_serializer(self):
+        self.authenticate()
+        response = self.client.post('/api/suppliers/?fields=id', {
+            'name': 'New Co', 'supplier_code': 'SUP-1', 'contact_email': 's1@example.com',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['name'], 'New Co')
+
+
+class EmissionAnalyticsTests(QueryBudgetTestCase):
+    url = '/api/analytics/emissions/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Acme', slug='acme')
+        other_tenant = Tenant.objects.create(name='Other', slug='other')
+        cls.user = User.objects.create_user('analyst', password='secret')
+        TenantUser.objects.create(tenant=cls.tenant, user=cls.user, role='admin')
+        cls.steel = Supplier.objects.create(
+            name='Steel Co', supplier_code='SUP-0', contact_email='s0@example.com', tenant=cls.tenant, region='Europe',
+        )
+        cls.freight = Supplier.objects.create(
+            name='Freight Co', supplier_code='SUP-1', contact_email='s1@example.com', tenant=cls.tenant, region='Asia',
+        )
+        foreign = Supplier.objects.create(
+            name='Else', supplier_code='EXT-0', contact_email='e0@example.com', tenant=other_tenant, region='Europe',
+        )
+        for supplier, day, amount, source in [
+            (cls.steel, date(2024, 1, 5), '10.00', 'manual'),
+            (cls.steel, date(2024, 1, 20), '5.50', 'iot'),
+            (cls.steel, date(2024, 2, 1), '7.25', 'manual'),
+            (cls.freight, date(2024, 1, 9), '3.00', 'manual'),
+            (foreign, date(2024, 1, 9), '999.00', 'manual'),
+        ]:
+            EmissionEntry.objects.create(
+                supplier=supplier, scope3_emissions=Decimal(amount), data_source=source,
+                date_reported=timezone.make_aware(datetime(day.year, day.month, day.day, 12)),
+            )
+        validated = EmissionEntry.objects.filter(supplier=cls.freight).first()
+        for entry in (None, validated):
+            SpendBasedEstimate.objects.create(
+                supplier=cls.freight, period_start=date(2024, 1, 1), period_end=date(2024, 12, 31),
+                spend_amount=Decimal('1000'), emission_factor=Decimal('0.002'), estimated_emissions=Decimal('2.00'),
+                validated_entry=entry,
+            )
+
+    def get(self, query=''):
+        self.authenticate()
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['results']
+
+    def test_totals_are_tenant_scoped(self):
+        self.assertEqual(self.get(), [{'total_emissions': '25.75', 'count': 4}])
+
+    def test_monthly_buckets_by_supplier(self):
+        rows = self.get('?bucket=month&group_by=supplier')
+        self.assertEqual([(r['period'], r['supplier_name'], r['total_emissions']) for r in rows], [
+            ('2024-01-01', 'Steel Co', '15.50'),
+            ('2024-01-01', 'Freight Co', '3.00'),
+            ('2024-02-01', 'Steel Co', '7.25'),
+        ])
+
+    def test_filters_and_dimensions(self):
+        rows = self.get('?group_by=data_source&start=2024-01-01&end=2024-01-31&region=Europe')
+        self.assertEqual(rows, [
+            {'data_source': 'iot', 'total_emissions': '5.50', 'count': 1},
+            {'data_source': 'manual', 'total_emissions': '10.00', 'count': 1},
+        ])
+
+    def test_combined_source_skips_validated_estimates(self):
+        self.assertEqual(self.get('?source=spend'), [{'total_emissions': '4.00', 'count': 2}])
+        self.assertEqual(self.get('?source=combined&group_by=region'), [
+            {'region': 'Asia', 'total_emissions': '5.00', 'count': 2},
+            {'region': 'Europe', 'total_emissions': '22.75', 'count': 3},
+        ])
+
+    def test_results_are_cached_per_data_version(self):
+        self.get('?bucket=year')
+        executed, context = self.count_queries(self.url + '?bucket=year')
+        self.assertEqual(executed, 0)
+        EmissionEntry.objects.create(supplier=self.steel, date_reported=timezone.now(), scope3_emissions=Decimal('1.00'))
+        self.assertEqual(len(self.get('?bucket=year')), 2)
+
+    def test_invalid_parameters(self):
+        self.authenticate()
+        response = self.client.get(self.url + '?bucket=hour&group_by=colour&start=yesterday')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'bucket', 'group_by', 'start'})
@@ -0,0 +1,41 @@
+"""
+Tenant and device throttles backed by the token-bucket limiter
+"""
+from rest_framework.throttling import BaseThrottle
+
+from saas.ratelimit import check_rate_limit
+
+
+class TenantRateThrottle(BaseThrottle):
+    """Limit requests per tenant according to its subscription tier.
+
+    Views choose the bucket with ``rate_limit_scope`` (default "api").
+    """
+    scope = None
+    
+    def get_scope(self, view):
+        return self.scope or getattr(view, 'rate_limit_scope', 'api')
+    
+    def get_key(self, request, view):
+        return None
+    
+    def allow_request(self, request, view):
+        tenant = getattr(request, 'tenant', None)
+        self.retry_after = check_rate_limit(tenant, self.get_scope(view), self.get_key(request, view))
+        return not self.retry_after
+    
+    def wait(self):
+        return self.retry_after
+
+
+class IngestRateThrottle(TenantRateThrottle):
+    """Limit IoT readings per tenant"""
+    scope = 'ingest'
+
+
+class DeviceRateThrottle(TenantRateThrottle):
+    """Limit IoT readings per device, keyed by the device in the URL"""
+    scope = 'device'
+    
+    def get_key(self, request, view):
+        return view.kwargs.get(view.lookup_url_kwarg or view.lookup_field)
@@ -7,7 +7,8 @@ from rest_framework.authtoken.views import obtain_auth_token
 from .views import (
     SupplierViewSet, EmissionEntryViewSet,
     IoTDeviceViewSet, MLPredictionViewSet,
-    ScenarioViewSet,
+    ScenarioViewSet, EmissionAnalyticsViewSet,
+    JobViewSet,
 )
 
 router = DefaultRouter()
@@ -16,6 +17,8 @@ router.register(r'emissions', EmissionEntryViewSet, basename='emission')
 router.register(r'iot/devices', IoTDeviceViewSet, basename='iot-device')
 router.register(r'ml/predictions', MLPredictionViewSet, basename='ml-prediction')
 router.register(r'scenarios', ScenarioViewSet, basename='scenario')
+router.register(r'jobs', JobViewSet, basename='job')
+router.register(r'analytics/emissions', EmissionAnalyticsViewSet, basename='emission-analytics')
 
 urlpatterns = [
     path('', include(router.urls)),
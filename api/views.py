@@ -5,52 +5,160 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.reverse import reverse
 from django.db.models import Sum, Avg, Count
 from django.utils import timezone
 from datetime import timedelta
+import time
 
 from core.models import Supplier, EmissionEntry
 from iot.models import IoTDevice, IoTReading
 from iot.services import IoTDataProcessor
+from ml_services.features import FEATURE_NAMES, FEATURE_VERSION, load_feature_matrix
+from ml_services.forecasting import DEFAULT_FORECAST_PERIODS, MAX_FORECAST_PERIODS
 from ml_services.models import MLPrediction, SpendBasedEstimate
-from ml_services.services import MLPredictionService, SpendBasedEstimator, HotspotPredictor
-from blockchain.services import BlockchainService
+from ml_services.registry import ModelUnavailable
+from ml_services.services import SpendBasedEstimator, EmissionForecastService
 from scenarios.models import Scenario, ScenarioSupplier
+from jobs.models import Job
+from jobs.services import JobService
+from monitoring.metrics import iot_ingest_duration, iot_readings_ingested
 from .serializers import (
     SupplierSerializer, EmissionEntrySerializer,
     IoTDeviceSerializer, IoTReadingSerializer,
     MLPredictionSerializer, SpendBasedEstimateSerializer,
     ScenarioSerializer, ScenarioSupplierSerializer,
+    JobSerializer,
 )
+from .analytics import emissions_analytics, parse_analytics_params
+from .bulk import BulkRequestError, parse_bulk_request, bulk_upsert_suppliers, bulk_upsert_emission_entries
+from .mixins import CachedResponseMixin, FastListMixin, QueryOptimizationMixin, TenantScopedMixin
+from .optimization import optimize_queryset
+from .throttling import DeviceRateThrottle, IngestRateThrottle
 
+FEATURE_PAGE_SIZE = 1000
+MAX_FEATURE_PAGE_SIZE = 5000
 
-class SupplierViewSet(viewsets.ModelViewSet):
+
+def _bulk_response(request, upsert):
+    """Run a bulk upsert and report per-item results"""
+    try:
+        items, mode = parse_bulk_request(request)
+    except BulkRequestError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    result = upsert(items, request.tenant, atomic=mode == 'atomic')
+    return Response(result.as_dict(), status=result.status_code)
+
+
+def _forecast_response(request, suppliers):
+    """Forecast the given suppliers for the requested number of months"""
+    try:
+        periods = int(request.data.get('periods', DEFAULT_FORECAST_PERIODS))
+    except (TypeError, ValueError):
+        return Response({'error': 'periods must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= periods <= MAX_FORECAST_PERIODS:
+        return Response(
+            {'error': f'periods must be between 1 and {MAX_FORECAST_PERIODS}'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    tenant_id = request.tenant.pk if request.tenant is not None else None
+    try:
+        result = EmissionForecastService.forecast_suppliers(suppliers, periods, tenant_id=tenant_id)
+    except ModelUnavailable as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return Response(result)
+
+
+def _enqueue_job(request, kind, **params):
+    """Queue a background job and answer 202 with its status URL"""
+    # API key requests have no user to record
+    user = request.user if request.user.pk is not None else None
+    job, _ = JobService.enqueue(kind, params, tenant=request.tenant, user=user)
+    status_url = reverse('job-detail', args=[job.pk], request=request)
+    return Response(
+        {'job_id': str(job.pk), 'status': job.status, 'status_url': status_url},
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': status_url},
+    )
+
+
+class SupplierViewSet(TenantScopedMixin, CachedResponseMixin, QueryOptimizationMixin, viewsets.ModelViewSet):
     """Supplier API endpoints"""
     serializer_class = SupplierSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
         # Filter by tenant if using SaaS
-        user = self.request.user
-        if hasattr(user, 'tenant_membership'):
-            return Supplier.objects.filter(tenant=user.tenant_membership.tenant)
+        tenant = self.request.tenant
+        if tenant is not None:
+            return Supplier.objects.filter(tenant=tenant)
         return Supplier.objects.all()
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create or update suppliers in bulk, matched by supplier_code"""
+        return _bulk_response(request, bulk_upsert_suppliers)
+    
     @action(detail=True, methods=['get'])
     def emissions(self, request, pk=None):
         """Get emissions for a supplier"""
         supplier = self.get_object()
-        entries = EmissionEntry.objects.filter(supplier=supplier)
-        serializer = EmissionEntrySerializer(entries, many=True)
+        fields = self.get_sparse_fields(EmissionEntrySerializer)
+        entries = optimize_queryset(EmissionEntry.objects.filter(supplier=supplier), EmissionEntrySerializer, fields)
+        serializer = EmissionEntrySerializer(entries, many=True, fields=fields)
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
     def predict_hotspot(self, request, pk=None):
-        """Predict if supplier is a hotspot"""
+        """Queue a hotspot prediction for the supplier"""
         supplier = self.get_object()
-        prediction = MLPredictionService.create_prediction(supplier, model_type='hotspot')
-        serializer = MLPredictionSerializer(prediction)
-        return Response(serializer.data)
+        return _enqueue_job(request, 'supplier.predict_hotspot', supplier_id=supplier.pk)
+    
+    @action(detail=False, methods=['get'])
+    def features(self, request):
+        """Stored hotspot features of the tenant's suppliers, paged by supplier id
+        
+        Pass the returned ``next_after`` as ``after`` for the next page; it is
+        null on the last page.
+        """
+        try:
+            after = int(request.query_params['after']) if request.query_params.get('after') else None
+            limit = min(int(request.query_params.get('limit', FEATURE_PAGE_SIZE)), MAX_FEATURE_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'after and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'limit must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        ids, X = load_feature_matrix(self.get_queryset(), after=after, limit=limit)
+        return Response({
+            'feature_version': FEATURE_VERSION,
+            'features': FEATURE_NAMES,
+            'supplier_ids': ids.tolist(),
+            'rows': X.tolist(),
+            'next_after': int(ids[-1]) if len(ids) == limit else None,
+        })
+    
+    @action(detail=True, methods=['post'])
+    def forecast(self, request, pk=None):
+        """Forecast the supplier's monthly emissions for ``periods`` months"""
+        supplier = self.get_object()
+        return _forecast_response(request, Supplier.objects.filter(pk=supplier.pk))
+    
+    @action(detail=False, methods=['post'], url_path='forecast')
+    def forecast_all(self, request):
+        """Forecast the tenant's suppliers, or those listed in ``supplier_ids``, in one batch"""
+        suppliers = self.get_queryset()
+        supplier_ids = request.data.get('supplier_ids')
+        if supplier_ids is not None:
+            if not isinstance(supplier_ids, list) or not all(isinstance(pk, int) for pk in supplier_ids):
+                return Response({'error': 'supplier_ids must be a list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+            suppliers = suppliers.filter(pk__in=supplier_ids)
+        return _forecast_response(request, suppliers)
+    
+    @action(detail=False, methods=['post'])
+    def score_hotspots(self, request):
+        """Queue hotspot scoring of every supplier in the tenant"""
+        return _enqueue_job(request, 'supplier.score_hotspots')
     
     @action(detail=True, methods=['post'])
     def estimate_from_spend(self, request, pk=None):
@@ -70,38 +178,44 @@ class SupplierViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class EmissionEntryViewSet(viewsets.ModelViewSet):
+class EmissionEntryViewSet(TenantScopedMixin, CachedResponseMixin, FastListMixin, QueryOptimizationMixin, viewsets.ModelViewSet):
     """Emission entry API endpoints"""
     serializer_class = EmissionEntrySerializer
     permission_classes = [IsAuthenticated]
+    fast_list = True
     
     def get_queryset(self):
-        user = self.request.user
-        if hasattr(user, 'tenant_membership'):
-            return EmissionEntry.objects.filter(supplier__tenant=user.tenant_membership.tenant)
+        tenant = self.request.tenant
+        if tenant is not None:
+            return EmissionEntry.objects.filter(supplier__tenant=tenant)
         return EmissionEntry.objects.all()
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create emission entries in bulk; items with an id update that entry"""
+        return _bulk_response(request, bulk_upsert_emission_entries)
+    
     @action(detail=True, methods=['post'])
     def verify_blockchain(self, request, pk=None):
-        """Verify emission entry on blockchain"""
+        """Queue blockchain verification of the emission entry"""
         entry = self.get_object()
-        blockchain_service = BlockchainService()
-        verification = blockchain_service.verify_emission_entry(entry)
-        return Response({
-            'transaction_hash': verification.transaction_hash,
-            'status': verification.verification_status,
-        })
+        return _enqueue_job(request, 'emission.verify_blockchain', entry_id=entry.pk)
 
 
-class IoTDeviceViewSet(viewsets.ModelViewSet):
+class IoTDeviceViewSet(TenantScopedMixin, FastListMixin, QueryOptimizationMixin, viewsets.ModelViewSet):
     """IoT device API endpoints"""
     serializer_class = IoTDeviceSerializer
     permission_classes = [IsAuthenticated]
     
+    def get_throttles(self):
+        if self.action == 'readings':
+            return [IngestRateThrottle(), DeviceRateThrottle()]
+        return super().get_throttles()
+    
     def get_queryset(self):
-        user = self.request.user
-        if hasattr(user, 'tenant_membership'):
-            return IoTDevice.objects.filter(supplier__tenant=user.tenant_membership.tenant)
+        tenant = self.request.tenant
+        if tenant is not None:
+            return IoTDevice.objects.filter(supplier__tenant=tenant)
         return IoTDevice.objects.all()
     
     @action(detail=True, methods=['post'])
@@ -114,6 +228,7 @@ class IoTDeviceViewSet(viewsets.ModelViewSet):
         if api_key != device.api_key:
             return Response({'error': 'Invalid API key for device'}, status=status.HTTP_401_UNAUTHORIZED)
         
+        start = time.perf_counter()
         reading = IoTReading.objects.create(
             device=device,
             energy_kwh=request.data.get('energy_kwh'),
@@ -126,6 +241,8 @@ class IoTDeviceViewSet(viewsets.ModelViewSet):
         
         # Process reading
         IoTDataProcessor.process_reading(reading)
+        iot_ingest_duration.observe(time.perf_counter() - start, 'api')
+        iot_readings_ingested.inc('api')
         
         serializer = IoTReadingSerializer(reading)
         return Response(serializer.data)
@@ -138,44 +255,90 @@ class IoTDeviceViewSet(viewsets.ModelViewSet):
         since = timezone.now() - timedelta(hours=hours)
         
         readings = IoTReading.objects.filter(device=device, timestamp__gte=since)
-        serializer = IoTReadingSerializer(readings, many=True)
+        fast = self.get_fast_serializer(IoTReadingSerializer)
+        if fast is not None:
+            return self.fast_list_response(readings, fast, paginate=False)
+        fields = self.get_sparse_fields(IoTReadingSerializer)
+        serializer = IoTReadingSerializer(optimize_queryset(readings, IoTReadingSerializer, fields), many=True, fields=fields)
         return Response(serializer.data)
 
 
-class MLPredictionViewSet(viewsets.ReadOnlyModelViewSet):
+class MLPredictionViewSet(TenantScopedMixin, CachedResponseMixin, QueryOptimizationMixin, viewsets.ReadOnlyModelViewSet):
     """ML prediction API endpoints"""
     serializer_class = MLPredictionSerializer
     permission_classes = [IsAuthenticated]
+    sparse_actions = ('list', 'retrieve', 'hotspots')
     
     def get_queryset(self):
-        user = self.request.user
-        if hasattr(user, 'tenant_membership'):
-            return MLPrediction.objects.filter(supplier__tenant=user.tenant_membership.tenant)
+        tenant = self.request.tenant
+        if tenant is not None:
+            return MLPrediction.objects.filter(supplier__tenant=tenant)
         return MLPrediction.objects.all()
     
     @action(detail=False, methods=['get'])
     def hotspots(self, request):
         """Get all hotspot predictions"""
-        hotspots = self.get_queryset().filter(is_hotspot=True)
-        serializer = self.get_serializer(hotspots, many=True)
-        return Response(serializer.data)
+        def build():
+            hotspots = self.filter_queryset(self.get_queryset()).filter(is_hotspot=True)
+            serializer = self.get_serializer(hotspots, many=True)
+            return Response(serializer.data)
+        return self.cached_response(request, build)
 
 
-class ScenarioViewSet(viewsets.ModelViewSet):
+class ScenarioViewSet(TenantScopedMixin, QueryOptimizationMixin, viewsets.ModelViewSet):
     """Scenario modeling API endpoints"""
     serializer_class = ScenarioSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        user = self.request.user
-        if hasattr(user, 'tenant_membership'):
-            return Scenario.objects.filter(tenant=user.tenant_membership.tenant)
+        tenant = self.request.tenant
+        if tenant is not None:
+            return Scenario.objects.filter(tenant=tenant)
         return Scenario.objects.all()
     
     @action(detail=True, methods=['post'])
     def calculate(self, request, pk=None):
-        """Calculate scenario reduction"""
-        from scenarios.services import ScenarioService
+        """Queue calculation of the scenario reduction"""
         scenario = self.get_object()
-        result = ScenarioService.calculate_scenario(scenario)
-        return Response(result)
+        return _enqueue_job(request, 'scenario.calculate', scenario_id=scenario.pk)
+
+
+class EmissionAnalyticsViewSet(TenantScopedMixin, CachedResponseMixin, viewsets.GenericViewSet):
+    """Emissions totals grouped by time bucket and supplier dimensions.
+
+    Query parameters: ``source`` (emissions, spend, combined), ``bucket``
+    (day, week, month, quarter, year), ``group_by`` (comma-separated
+    supplier, region, industry, data_source) and the filters ``start``,
+    ``end``, ``supplier``, ``region``, ``industry`` and ``data_source``.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def list(self, request):
+        options = parse_analytics_params(request.query_params)
+        return self.cached_response(request, lambda: Response({
+            'source': options['source'],
+            'bucket': options['bucket'],
+            'group_by': options['group_by'],
+            'results': emissions_analytics(request.tenant, options),
+        }))
+
+
+class JobViewSet(TenantScopedMixin, viewsets.ReadOnlyModelViewSet):
+    """Background job status, results and cancellation"""
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        tenant = self.request.tenant
+        if tenant is not None:
+            return Job.objects.filter(tenant=tenant)
+        return Job.objects.all()
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel a queued or running job"""
+        job = self.get_object()
+        if not job.is_active:
+            return Response({'error': f'Job is already {job.status}'}, status=status.HTTP_409_CONFLICT)
+        job = JobService.cancel(job)
+        return Response(self.get_serializer(job).data)
@@ -40,6 +40,9 @@ class BlockchainVerification(models.Model):
             'scope3_emissions': str(emission_entry.scope3_emissions),
             'notes': emission_entry.notes,
         }
+        # Evidence is covered by its stored content digest, so files are never re-read here
+        if emission_entry.evidence_sha256:
+            data['evidence_sha256'] = emission_entry.evidence_sha256
         data_string = json.dumps(data, sort_keys=True)
         return hashlib.sha256(data_string.encode()).hexdigest()
 
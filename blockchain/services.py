@@ -6,6 +6,7 @@ import json
 from django.conf import settings
 from blockchain.models import BlockchainVerification
 from core.models import EmissionEntry
+from monitoring.metrics import blockchain_verifications
 import logging
 
 logger = logging.getLogger(__name__)
@@ -42,6 +43,7 @@ class BlockchainService:
         emission_entry.blockchain_verified = True
         emission_entry.save()
         
+        blockchain_verifications.inc(self.network, verification.verification_status)
         logger.info(f"Created blockchain verification for entry {emission_entry.id}: {transaction_hash}")
         
         return verification
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Supplier, EmissionEntry
+from .models import Supplier, EmissionEntry, EvidenceDocument
 
 
 @admin.register(Supplier)
@@ -15,4 +15,12 @@ class EmissionEntryAdmin(admin.ModelAdmin):
     list_display = ['supplier', 'date_reported', 'scope3_emissions', 'data_source', 'verified', 'blockchain_verified']
     list_filter = ['verified', 'blockchain_verified', 'data_source', 'date_reported']
     search_fields = ['supplier__name', 'notes']
-    readonly_fields = ['blockchain_hash']
\ No newline at end of file
+    readonly_fields = ['blockchain_hash', 'evidence_sha256']
+
+
+@admin.register(EvidenceDocument)
+class EvidenceDocumentAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'file_name', 'status', 'content_type', 'page_count', 'size_bytes', 'processed_at']
+    list_filter = ['status', 'content_type']
+    search_fields = ['sha256', 'file_name']
+    readonly_fields = ['sha256', 'created_at', 'processed_at']
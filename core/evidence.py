@@ -0,0 +1,140 @@
+"""
+Background processing of evidence files: text extraction, page count and thumbnails
+
+PDF support uses pypdf (text, page count) and pypdfium2 (first-page render);
+image thumbnails use Pillow. All three are optional: when one is missing the
+corresponding artifact is skipped and the document is still marked ready.
+"""
+from datetime import timedelta
+from io import BytesIO
+import mimetypes
+import logging
+import re
+import zipfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import EvidenceDocument
+from core.storage import evidence_storage
+from core.tasks import submit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THUMBNAIL_SIZE = (320, 320)
+DEFAULT_TEXT_MAX_CHARS = 200000
+DEFAULT_PROCESSING_TIMEOUT = 600
+
+
+def schedule_processing(document_id):
+    """Queue an evidence document for processing once the current transaction commits"""
+    transaction.on_commit(lambda: submit(process_evidence_document, document_id))
+
+
+def stale_processing():
+    """Match documents left 'processing' by a worker that died, claimed too long ago"""
+    timeout = getattr(settings, 'EVIDENCE_PROCESSING_TIMEOUT', DEFAULT_PROCESSING_TIMEOUT)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Q(status='processing') & (Q(processing_started_at__lt=cutoff) | Q(processing_started_at__isnull=True))
+
+
+def process_evidence_document(document_id):
+    """Extract text, page count, size and a thumbnail for an evidence document"""
+    # Claim the document so concurrent workers never process the same file twice
+    claimed = EvidenceDocument.objects.filter(
+        Q(status__in=['pending', 'failed']) | stale_processing(), pk=document_id,
+    ).update(status='processing', error='', processing_started_at=timezone.now())
+    if not claimed:
+        return None
+
+    document = EvidenceDocument.objects.get(pk=document_id)
+    try:
+        document.size_bytes = evidence_storage.size(document.file_name)
+        document.content_type = mimetypes.guess_type(document.file_name)[0] or 'application/octet-stream'
+        with evidence_storage.open(document.file_name, 'rb') as fh:
+            data = fh.read()
+
+        text, page_count, thumbnail = extract_artifacts(data, document.content_type)
+        max_chars = getattr(settings, 'EVIDENCE_TEXT_MAX_CHARS', DEFAULT_TEXT_MAX_CHARS)
+        document.text = text[:max_chars]
+        document.page_count = page_count
+        if thumbnail:
+            document.thumbnail.save('thumbnail.png', ContentFile(thumbnail), save=False)
+        document.status = 'ready'
+    except Exception as e:
+        logger.error(f"Error processing evidence {document.sha256}: {e}")
+        document.status = 'failed'
+        document.error = str(e)
+
+    document.processed_at = timezone.now()
+    document.save()
+    return document
+
+
+def extract_artifacts(data, content_type):
+    """Return (text, page_count, thumbnail_png_bytes) for raw evidence content"""
+    if content_type == 'application/pdf':
+        return _extract_pdf(data)
+    if content_type.startswith('image/'):
+        return '', 1, _render_thumbnail(data)
+    if content_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
+        return _extract_docx(data), None, None
+    if content_type.startswith('text/'):
+        return data.decode('utf-8', errors='replace'), None, None
+    return '', None, None
+
+
+def _extract_pdf(data):
+    text, page_count, thumbnail = '', None, None
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        logger.warning("pypdf not installed; skipping PDF text extraction")
+    else:
+        reader = PdfReader(BytesIO(data))
+        page_count = len(reader.pages)
+        text = '\n'.join(page.extract_text() or '' for page in reader.pages)
+
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        logger.warning("pypdfium2 not installed; skipping PDF thumbnail")
+    else:
+        pdf = pdfium.PdfDocument(data)
+        try:
+            if page_count is None:
+                page_count = len(pdf)
+            if len(pdf):
+                image = pdf[0].render(scale=1).to_pil()
+                thumbnail = _encode_thumbnail(image)
+        finally:
+            pdf.close()
+    return text, page_count, thumbnail
+
+
+def _extract_docx(data):
+    with zipfile.ZipFile(BytesIO(data)) as archive:
+        xml = archive.read('word/document.xml').decode('utf-8', errors='replace')
+    xml = re.sub(r'</w:p>', '\n', xml)
+    return re.sub(r'<[^>]+>', '', xml)
+
+
+def _render_thumbnail(data):
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.warning("Pillow not installed; skipping image thumbnail")
+        return None
+    with Image.open(BytesIO(data)) as image:
+        return _encode_thumbnail(image)
+
+
+def _encode_thumbnail(image):
+    image = image.convert('RGB')
+    image.thumbnail(getattr(settings, 'EVIDENCE_THUMBNAIL_SIZE', DEFAULT_THUMBNAIL_SIZE))
+    buffer = BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
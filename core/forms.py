@@ -46,8 +46,7 @@ class EmissionEntryForm(forms.ModelForm):
         }
     
     def __init__(self, *args, **kwargs):
-        user = kwargs.pop('user', None)
+        tenant = kwargs.pop('tenant', None)
         super().__init__(*args, **kwargs)
-        if user and hasattr(user, 'tenant_membership'):
-            tenant = user.tenant_membership.tenant
+        if tenant:
             self.fields['supplier'].queryset = Supplier.objects.filter(tenant=tenant)
\ No newline at end of file
@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Avg, Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+import random
+import time
+import numpy as np
+from core.models import Supplier, EmissionEntry
+from ml_services.features import build_feature_matrix
+
+
+def per_supplier_features(suppliers):
+    """The former per-supplier extraction (about five queries each), kept as the baseline"""
+    ids, rows = [], []
+    for supplier in suppliers:
+        entries = EmissionEntry.objects.filter(supplier=supplier)
+        if not entries.exists():
+            continue
+        avg_emissions = entries.aggregate(avg=Avg('scope3_emissions'))['avg'] or 0
+        total_emissions = entries.aggregate(total=Sum('scope3_emissions'))['total'] or 0
+        entry_count = entries.count()
+        recent = entries.order_by('-date_reported', '-pk')[:3]
+        recent_avg = sum(e.scope3_emissions for e in recent) / len(recent) if recent else 0
+        ids.append(supplier.pk)
+        rows.append([
+            float(avg_emissions), float(total_emissions), entry_count, float(recent_avg),
+            float(supplier.annual_spend or 0), float(supplier.emission_factor or 0), 1 if supplier.region else 0,
+        ])
+    return np.array(ids), np.array(rows, dtype=np.float64)
+
+
+class Command(BaseCommand):
+    help = 'Compare per-supplier and vectorized hotspot feature extraction on synthetic data (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000], help='Supplier counts to time')
+        parser.add_argument('--entries', type=int, default=12, help='Emission entries per supplier')
+        parser.add_argument('--baseline-limit', type=int, default=2000,
+                            help='Skip the per-supplier baseline above this many suppliers')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = 0
+            for size in sorted(options['sizes']):
+                self.create_suppliers(created, size - created, options['entries'])
+                created = size
+                suppliers = Supplier.objects.filter(supplier_code__startswith='BENCH-HS-').order_by('pk')
+
+                start = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    ids, X = build_feature_matrix(suppliers)
+                fast_time = time.perf_counter() - start
+                line = f'{size} suppliers: vectorized {fast_time * 1000:.1f} ms ({len(queries)} queries)'
+
+                if size <= options['baseline_limit']:
+                    start = time.perf_counter()
+                    with CaptureQueriesContext(connection) as queries:
+                        baseline_ids, baseline_X = per_supplier_features(suppliers)
+                    slow_time = time.perf_counter() - start
+                    if not (np.array_equal(ids, baseline_ids) and np.allclose(X, baseline_X)):
+                        self.stdout.write(self.style.ERROR(f'{size} suppliers: features differ between paths'))
+                    line += (f', per-supplier {slow_time * 1000:.1f} ms ({len(queries)} queries), '
+                             f'speedup {slow_time / fast_time:.1f}x')
+                self.stdout.write(line)
+            transaction.set_rollback(True)
+
+    def create_suppliers(self, offset, count, entries):
+        suppliers = Supplier.objects.bulk_create([
+            Supplier(
+                name=f'Benchmark Supplier {offset + i}',
+                supplier_code=f'BENCH-HS-{offset + i}',
+                contact_email=f'bench-hs-{offset + i}@example.com',
+                region=random.choice(['', 'EU', 'APAC']),
+                annual_spend=Decimal(random.randint(10000, 5000000)),
+                emission_factor=Decimal('0.4500'),
+            )
+            for i in range(count)
+        ])
+        now = timezone.now()
+        EmissionEntry.objects.bulk_create([
+            EmissionEntry(
+                supplier=supplier,
+                date_reported=now - timedelta(days=30 * j),
+                scope3_emissions=Decimal(str(round(random.uniform(10, 1000), 2))),
+            )
+            for supplier in suppliers
+            for j in range(random.randint(1, entries))
+        ], batch_size=2000)
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+import os
+import time
+import numpy as np
+from ml_services.seasonal import fit_holt_winters, forecast_seasonal
+
+
+def synthetic_history(suppliers, months, seed=0):
+    """Seasonal series with trends, noise, gaps and late starts"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(months)
+    base = rng.uniform(10, 1000, (suppliers, 1))
+    history = base * (
+        1 + rng.normal(0, 0.01, (suppliers, 1)) * t
+        + rng.uniform(0, 0.4, (suppliers, 1)) * np.sin(2 * np.pi * (t + rng.integers(0, 12, (suppliers, 1))) / 12)
+        + rng.normal(0, 0.05, (suppliers, months))
+    )
+    reported = rng.random((suppliers, months)) >= 0.1
+    # Suppliers start reporting within the first half of the period
+    start = rng.integers(0, months // 2, suppliers)
+    reported[np.arange(suppliers), start] = True
+    history[~reported | (t < start[:, None])] = np.nan
+    return history
+
+
+def per_supplier_forecast(history, first_slot, periods):
+    """Fitting one supplier at a time, kept as the baseline"""
+    results = [fit_holt_winters(row[None, :], first_slot, periods) for row in history]
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+class Command(BaseCommand):
+    help = 'Time per-supplier seasonal forecasting on synthetic histories'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Supplier counts to time')
+        parser.add_argument('--months', type=int, default=48, help='Months of history per supplier')
+        parser.add_argument('--periods', type=int, default=12, help='Months forecast, held out to measure the error')
+        parser.add_argument('--processes', type=int, default=os.cpu_count(), help='Worker processes for the parallel run')
+        parser.add_argument('--baseline-limit', type=int, default=1000,
+                            help='Skip the per-supplier baseline above this many suppliers')
+
+    def handle(self, *args, **options):
+        periods = options['periods']
+        for size in sorted(options['sizes']):
+            history = synthetic_history(size, options['months'] + periods)
+            training, holdout = history[:, :-periods], history[:, -periods:]
+
+            start = time.perf_counter()
+            forecasts, _, _ = forecast_seasonal(training, 0, periods)
+            single_time = time.perf_counter() - start
+            line = f'{size} suppliers: vectorized {single_time * 1000:.0f} ms'
+
+            if options['processes'] > 1:
+                start = time.perf_counter()
+                parallel, _, _ = forecast_seasonal(training, 0, periods, processes=options['processes'])
+                parallel_time = time.perf_counter() - start
+                if not np.array_equal(forecasts, parallel, equal_nan=True):
+                    self.stdout.write(self.style.ERROR(f'{size} suppliers: forecasts differ between process counts'))
+                line += f", {options['processes']} processes {parallel_time * 1000:.0f} ms"
+
+            if size <= options['baseline_limit']:
+                start = time.perf_counter()
+                baseline, _, _ = per_supplier_forecast(training, 0, periods)
+                slow_time = time.perf_counter() - start
+                if not np.allclose(forecasts, baseline):
+                    self.stdout.write(self.style.ERROR(f'{size} suppliers: forecasts differ between paths'))
+                line += f', per-supplier {slow_time * 1000:.0f} ms, speedup {slow_time / single_time:.1f}x'
+
+            # The former forecast input: the average of the last two reported months
+            previous_two = np.array([row[~np.isnan(row)][-2:].mean() for row in training])
+            line += (f'; holdout MAE {np.nanmean(np.abs(forecasts - holdout)):.1f} '
+                     f'(last-two average {np.nanmean(np.abs(previous_two[:, None] - holdout)):.1f})')
+            self.stdout.write(line)
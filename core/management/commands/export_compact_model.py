@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_services.compact import export_compact_model
+from ml_services.models import MLModel
+from ml_services.registry import ModelUnavailable, registry
+
+
+class Command(BaseCommand):
+    help = 'Export the active model of a type to the NumPy-only format scored by the Lambda functions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model-type', default='hotspot', choices=[choice for choice, _ in MLModel.MODEL_TYPE_CHOICES])
+        parser.add_argument('--output', help='File to write (default: ML_MODELS_DIR/<type>_model_v<version>.npz)')
+        parser.add_argument('--s3-bucket', help='Also upload the export to this bucket')
+        parser.add_argument('--s3-key', help='Object key for the upload (default: <type>_model.npz)')
+
+    def handle(self, *args, **options):
+        model_type = options['model_type']
+        try:
+            loaded = registry.get(model_type)
+        except ModelUnavailable as e:
+            raise CommandError(str(e))
+
+        output = Path(options['output'] or Path(settings.ML_MODELS_DIR) / f'{model_type}_model_v{loaded.version}.npz')
+        output.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with open(output, 'wb') as f:
+                export_compact_model(loaded.estimator, f)
+        except ValueError as e:
+            output.unlink(missing_ok=True)
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {model_type} model v{loaded.version} to {output} ({output.stat().st_size // 1024} KB)'
+        ))
+
+        if options['s3_bucket']:
+            import boto3
+
+            key = options['s3_key'] or f'{model_type}_model.npz'
+            boto3.client('s3').upload_file(str(output), options['s3_bucket'], key)
+            self.stdout.write(self.style.SUCCESS(f"Uploaded to s3://{options['s3_bucket']}/{key}"))
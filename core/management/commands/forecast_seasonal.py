@@ -0,0 +1,37 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Supplier
+from ml_services.forecasting import DEFAULT_FORECAST_PERIODS, MAX_FORECAST_PERIODS
+from ml_services.services import EmissionForecastService
+from saas.models import Tenant
+
+
+class Command(BaseCommand):
+    help = 'Fit a seasonal model per supplier and store monthly emission forecasts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', action='append', dest='tenants', metavar='SLUG', help='Tenant slug (repeatable)')
+        parser.add_argument('--periods', type=int, default=DEFAULT_FORECAST_PERIODS, help='Months to forecast')
+        parser.add_argument('--processes', type=int, default=os.cpu_count(), help='Fit suppliers in this many worker processes')
+
+    def handle(self, *args, **options):
+        if not 1 <= options['periods'] <= MAX_FORECAST_PERIODS:
+            raise CommandError(f'--periods must be between 1 and {MAX_FORECAST_PERIODS}')
+        suppliers = Supplier.objects.all()
+        if options['tenants']:
+            tenants = Tenant.objects.filter(slug__in=options['tenants'])
+            missing = set(options['tenants']) - set(tenants.values_list('slug', flat=True))
+            if missing:
+                raise CommandError(f"Unknown tenant(s): {', '.join(sorted(missing))}")
+            suppliers = suppliers.filter(tenant__in=tenants)
+
+        start = time.perf_counter()
+        forecast = EmissionForecastService.forecast_seasonal(
+            suppliers, options['periods'], processes=options['processes'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Forecast {forecast} suppliers for {options['periods']} months in {time.perf_counter() - start:.1f}s"
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from core.models import EvidenceDocument
+from core.evidence import process_evidence_document, stale_processing
+
+
+class Command(BaseCommand):
+    help = 'Process pending and stalled evidence documents (text extraction, page count, thumbnails)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry documents that failed before')
+
+    def handle(self, *args, **options):
+        statuses = ['pending', 'failed'] if options['retry_failed'] else ['pending']
+        # Documents stuck 'processing' after a worker died are picked up again
+        document_ids = list(
+            EvidenceDocument.objects.filter(Q(status__in=statuses) | stale_processing()).values_list('id', flat=True)
+        )
+        self.stdout.write(f'Processing {len(document_ids)} evidence documents...')
+
+        failed = 0
+        for document_id in document_ids:
+            document = process_evidence_document(document_id)
+            if document and document.status == 'failed':
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'Failed {document.file_name}: {document.error}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {len(document_ids) - failed} documents, {failed} failed'))
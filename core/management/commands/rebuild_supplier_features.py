@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Supplier
+from ml_services.features import FEATURE_VERSION, REFRESH_BATCH_SIZE, refresh_supplier_features
+from ml_services.models import SupplierFeatures
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored hotspot features of every supplier, e.g. after changing FEATURE_VERSION'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REFRESH_BATCH_SIZE, help='Suppliers per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        supplier_ids = list(Supplier.objects.order_by('pk').values_list('pk', flat=True))
+        start = time.perf_counter()
+        for offset in range(0, len(supplier_ids), batch_size):
+            with transaction.atomic():
+                refresh_supplier_features(supplier_ids[offset:offset + batch_size])
+            self.stdout.write(f'{min(offset + batch_size, len(supplier_ids))}/{len(supplier_ids)} suppliers')
+        stored = SupplierFeatures.objects.filter(feature_version=FEATURE_VERSION).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored features (version {FEATURE_VERSION}) for {stored} suppliers in {time.perf_counter() - start:.1f}s'
+        ))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Supplier
+from ml_services.registry import ModelUnavailable
+from ml_services.services import MLPredictionService
+from saas.models import Tenant
+
+
+class Command(BaseCommand):
+    help = (
+        'Score every supplier of the given tenants (default: all active tenants and suppliers without one) '
+        'for hotspots in one batch per tenant'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', action='append', dest='tenants', metavar='SLUG', help='Tenant slug (repeatable)')
+        parser.add_argument('--processes', type=int, default=1, help='Score tenants in this many worker processes')
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.filter(is_active=True)
+        if options['tenants']:
+            tenants = Tenant.objects.filter(slug__in=options['tenants'])
+            missing = set(options['tenants']) - set(tenants.values_list('slug', flat=True))
+            if missing:
+                raise CommandError(f"Unknown tenant(s): {', '.join(sorted(missing))}")
+        names = dict(tenants.values_list('pk', 'name'))
+        if not options['tenants'] and Supplier.objects.filter(tenant__isnull=True).exists():
+            names[None] = 'Suppliers without a tenant'
+
+        start = time.perf_counter()
+        try:
+            results = MLPredictionService.score_tenants(names, processes=options['processes'])
+        except ModelUnavailable as e:
+            raise CommandError(f"{e}; run train_hotspot_model first")
+        for tenant_id, (scored, hotspots) in sorted(results.items(), key=lambda item: names[item[0]]):
+            self.stdout.write(f'{names[tenant_id]}: {scored} suppliers scored, {hotspots} hotspots')
+        total = sum(scored for scored, _ in results.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {total} suppliers across {len(results)} tenants in {time.perf_counter() - start:.1f}s'
+        ))
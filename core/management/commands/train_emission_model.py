@@ -1,110 +1,89 @@
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.utils import timezone
 from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error
-import numpy as np
-import joblib
-import os
-from pathlib import Path
-from decimal import Decimal
-from core.models import EmissionEntry, Supplier
+
+from ml_services.forecast_training import (
+    FORECAST_FEATURES, HISTORY_CHUNK_SIZE, PREVIOUS_ENTRIES,
+    build_training_set, cross_validate, holdout_split, load_emission_history, rmse,
+)
 from ml_services.models import MLModel
+from ml_services.registry import prune_versions, save_artifact
+
 
 class Command(BaseCommand):
     help = 'Train a simple ML model for emission prediction'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--cv-folds', type=int, default=0, help='Also report RMSE over this many time-ordered folds')
+        parser.add_argument('--jobs', type=int, default=1, help='Folds trained in parallel (-1 for one per CPU)')
+        parser.add_argument('--test-fraction', type=float, default=0.2, help='Most recent share of rows held out for the RMSE')
+        parser.add_argument('--chunk-size', type=int, default=HISTORY_CHUNK_SIZE, help='Entries fetched per database round trip')
+
     def handle(self, *args, **options):
         self.stdout.write('Training emission prediction model...')
+        start = time.perf_counter()
 
         # Get historical data
-        entries = EmissionEntry.objects.filter(
-            verified=True
-        ).select_related('supplier').order_by('date_reported')
-
-        if entries.count() < 10:
+        history = load_emission_history(chunk_size=options['chunk_size'])
+        if len(history) < 10:
             self.stdout.write(self.style.WARNING('Not enough data for training. Need at least 10 verified entries.'))
             return
 
-        # Prepare features and target
-        X = []  # Features: [supplier_id, month, year, previous_emissions]
-        y = []  # Target: emissions
-
-        supplier_emissions = {}
-        for entry in entries:
-            supplier_id = entry.supplier.id
-            if supplier_id not in supplier_emissions:
-                supplier_emissions[supplier_id] = []
-            supplier_emissions[supplier_id].append({
-                'date': entry.date_reported,
-                'emissions': float(entry.scope3_emissions)
-            })
-
-        # Create time series features
-        for supplier_id, emissions in supplier_emissions.items():
-            if len(emissions) < 3:  # Need at least 3 data points
-                continue
-
-            emissions.sort(key=lambda x: x['date'])
-            for i in range(2, len(emissions)):
-                # Features: supplier_id, month, previous_2_emissions_avg
-                prev_avg = (emissions[i-1]['emissions'] + emissions[i-2]['emissions']) / 2
-                month = emissions[i]['date'].month
-                X.append([supplier_id, month, prev_avg])
-                y.append(emissions[i]['emissions'])
-
+        # Features: supplier_id, month, average of the previous two entries
+        X, y, _ = build_training_set(history)
+        self.stdout.write(
+            f'Loaded {len(history)} entries and built {len(X)} training rows in {time.perf_counter() - start:.1f}s'
+        )
         if len(X) < 5:
             self.stdout.write(self.style.WARNING('Not enough time series data for training.'))
             return
 
-        X = np.array(X)
-        y = np.array(y)
-
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-        # Train model
+        metadata = {
+            'features': FORECAST_FEATURES,
+            'previous_entries': PREVIOUS_ENTRIES,
+            'algorithm': 'LinearRegression',
+        }
+        if options['cv_folds']:
+            scores = cross_validate(X, y, options['cv_folds'], jobs=options['jobs'])
+            metadata['cv_rmse'] = scores
+            self.stdout.write(f"Cross-validation RMSE by fold: {', '.join(f'{s:.2f}' for s in scores)} tCO2e")
+
+        # Train on the earlier rows, evaluate on the most recent ones
+        split = holdout_split(len(X), options['test_fraction'])
         model = LinearRegression()
-        model.fit(X_train, y_train)
+        model.fit(X[:split], y[:split])
+        model_rmse = rmse(model, X[split:], y[split:])
+        metadata['rmse'] = model_rmse
 
-        # Evaluate
-        y_pred = model.predict(X_test)
-        mse = mean_squared_error(y_test, y_pred)
-        rmse = np.sqrt(mse)
+        self.stdout.write(f'Model trained. RMSE: {model_rmse:.2f} tCO2e')
 
-        self.stdout.write(f'Model trained. RMSE: {rmse:.2f} tCO2e')
-
-        # Save model
-        model_dir = Path('ml_models')
-        model_dir.mkdir(exist_ok=True)
-        model_path = model_dir / 'emission_predictor.joblib'
-        joblib.dump(model, model_path)
+        # Save model; every training run is a new version, so workers reload it and cached forecasts expire
+        version = timezone.now().strftime('%Y%m%d%H%M%S')
+        model_path = Path(settings.ML_MODELS_DIR) / f'forecast_model_v{version}.pkl'
+        stored_path = save_artifact(model, model_path)
 
         # Save to database
-        ml_model, created = MLModel.objects.get_or_create(
+        ml_model = MLModel.objects.create(
             name='Emission Time Series Predictor',
-            defaults={
-                'model_type': 'forecast',
-                'version': '1.0',
-                'model_path': str(model_path),
-                'accuracy_score': Decimal(str(1 / (1 + rmse))),  # Simple accuracy metric
-                'training_data_size': len(X_train),
-                'metadata': {
-                    'features': ['supplier_id', 'month', 'prev_2_avg_emissions'],
-                    'rmse': rmse,
-                    'algorithm': 'LinearRegression'
-                }
-            }
+            model_type='forecast',
+            version=version,
+            is_active=False,
+            model_path=stored_path,
+            accuracy_score=Decimal(f'{1 / (1 + model_rmse):.4f}'),  # Simple accuracy metric
+            training_data_size=split,
+            metadata=metadata,
         )
-
-        if not created:
-            ml_model.version = '1.1'
-            ml_model.accuracy_score = Decimal(str(1 / (1 + rmse)))
-            ml_model.metadata = {
-                'features': ['supplier_id', 'month', 'prev_2_avg_emissions'],
-                'rmse': rmse,
-                'algorithm': 'LinearRegression'
-            }
-            ml_model.save()
+        ml_model.activate()
 
         self.stdout.write(self.style.SUCCESS(f'Model saved to {model_path}'))
-        self.stdout.write(self.style.SUCCESS('ML model training completed!'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(
+            f'{ml_model} activated; training completed in {time.perf_counter() - start:.1f}s'
+        ))
+        pruned = prune_versions('forecast')
+        if pruned:
+            self.stdout.write(f'Removed {pruned} old forecast model versions')
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ml_services.features import FEATURE_NAMES, FEATURE_VERSION
+from ml_services.models import MLModel
+from ml_services.registry import prune_versions, save_artifact
+from ml_services.services import HotspotPredictor
+
+
+class Command(BaseCommand):
+    help = 'Train the hotspot model, save it as a new version and activate it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-activate', action='store_true', help='Register the new version without activating it')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Training hotspot model...')
+        try:
+            model, training_size = HotspotPredictor.train()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        version = timezone.now().strftime('%Y%m%d%H%M%S')
+        model_path = Path(settings.ML_MODELS_DIR) / f'hotspot_model_v{version}.pkl'
+        stored_path = save_artifact(model, model_path)
+
+        ml_model = MLModel.objects.create(
+            name='Hotspot Model',
+            model_type='hotspot',
+            version=version,
+            is_active=False,
+            model_path=stored_path,
+            training_data_size=training_size,
+            metadata={
+                'algorithm': 'IsolationForest',
+                'contamination': HotspotPredictor.CONTAMINATION,
+                'features': FEATURE_NAMES,
+                'feature_version': FEATURE_VERSION,
+            },
+        )
+        self.stdout.write(self.style.SUCCESS(f'Model saved to {model_path}'))
+
+        if not options['no_activate']:
+            ml_model.activate()
+            self.stdout.write(self.style.SUCCESS(f'{ml_model} activated'))
+        pruned = prune_versions('hotspot')
+        if pruned:
+            self.stdout.write(f'Removed {pruned} old hotspot model versions')
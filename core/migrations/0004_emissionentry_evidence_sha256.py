@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:57
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_emissionentry_blockchain_hash_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emissionentry',
+            name='evidence_sha256',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 of the evidence file content', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='emissionentry',
+            name='evidence_file',
+            field=models.FileField(blank=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to='evidence/'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:58
+
+import core.storage
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_emissionentry_evidence_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvidenceDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(help_text='SHA-256 of the evidence file content', max_length=64, unique=True)),
+                ('file_name', models.CharField(help_text='Stored name of the evidence file', max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('size_bytes', models.BigIntegerField(blank=True, null=True)),
+                ('page_count', models.IntegerField(blank=True, null=True)),
+                ('text', models.TextField(blank=True, help_text='Extracted text used for search')),
+                ('thumbnail', models.FileField(blank=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to='evidence/thumbnails/')),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='emissionentry',
+            name='evidence_document',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entries', to='core.evidencedocument'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_evidencedocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evidencedocument',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, help_text='When a worker claimed the document', null=True),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from decimal import Decimal
+from .storage import evidence_storage, digest_from_name
 
 # Create your models here.
 # Below are the data models I implemented for this project
@@ -31,12 +32,39 @@ class Supplier(models.Model):
         return None
 
 
+# Derived artifacts for evidence files, shared by every entry with the same content
+class EvidenceDocument(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    sha256 = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the evidence file content")
+    file_name = models.CharField(max_length=255, help_text="Stored name of the evidence file")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    content_type = models.CharField(max_length=100, blank=True)
+    size_bytes = models.BigIntegerField(null=True, blank=True)
+    page_count = models.IntegerField(null=True, blank=True)
+    text = models.TextField(blank=True, help_text="Extracted text used for search")
+    thumbnail = models.FileField(upload_to='evidence/thumbnails/', storage=evidence_storage, blank=True, null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    processing_started_at = models.DateTimeField(null=True, blank=True, help_text="When a worker claimed the document")
+
+    def __str__(self):
+        return f"Evidence {self.sha256[:12]} ({self.status})"
+
+
 # Now we move to the Emissions Entry class/model
 class EmissionEntry(models.Model):
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='emission_entries')
     date_reported = models.DateTimeField()
     scope3_emissions = models.DecimalField(max_digits=12, decimal_places=2) # Flexible for larger numbers
-    evidence_file = models.FileField(upload_to='evidence/', blank=True, null=True)
+    evidence_file = models.FileField(upload_to='evidence/', storage=evidence_storage, blank=True, null=True)
+    evidence_sha256 = models.CharField(max_length=64, blank=True, db_index=True, help_text="SHA-256 of the evidence file content")
+    evidence_document = models.ForeignKey(EvidenceDocument, on_delete=models.SET_NULL, null=True, blank=True, related_name='entries')
     notes = models.TextField(blank=True)
     verified = models.BooleanField(default=False)
     # Blockchain verification
@@ -54,4 +82,34 @@ class EmissionEntry(models.Model):
     ml_confidence = models.DecimalField(max_digits=5, decimal_places=4, null=True, blank=True, help_text="ML model confidence (0-1)")
 
     def __str__(self):
-        return f"{self.supplier.name} emission on {self.date_reported}: {self.scope3_emissions} tons"
\ No newline at end of file
+        return f"{self.supplier.name} emission on {self.date_reported}: {self.scope3_emissions} tons"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        entry = super().from_db(db, field_names, values)
+        # The stored supplier, to tell when a save moves the entry (absent if deferred)
+        if 'supplier_id' in entry.__dict__:
+            entry._loaded_supplier_id = entry.supplier_id
+        return entry
+
+    def save(self, *args, **kwargs):
+        """Commit evidence to content-addressed storage and record its digest"""
+        evidence = self.evidence_file
+        new_evidence = bool(evidence) and not evidence._committed
+        if new_evidence:
+            evidence.save(evidence.name, evidence.file, save=False)
+        self.evidence_sha256 = digest_from_name(evidence.name) if evidence else ''
+
+        if not self.evidence_sha256:
+            self.evidence_document = None
+        elif new_evidence or self.evidence_document_id is None:
+            self.evidence_document, _ = EvidenceDocument.objects.get_or_create(
+                sha256=self.evidence_sha256,
+                defaults={'file_name': evidence.name},
+            )
+        super().save(*args, **kwargs)
+
+        # Text extraction and thumbnails run on the worker pool, never in the request
+        if self.evidence_document and self.evidence_document.status == 'pending':
+            from .evidence import schedule_processing
+            schedule_processing(self.evidence_document_id)
@@ -0,0 +1,112 @@
+"""
+Content-addressed storage for emission evidence files
+"""
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.utils.deconstruct import deconstructible
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def file_digest(content):
+    """Return the SHA-256 hex digest of a Django File, reusing the upload-time hash if present"""
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+def digest_from_name(name):
+    """Extract the SHA-256 digest from a content-addressed file name ('' for legacy names)"""
+    if not name:
+        return ''
+    stem = os.path.splitext(posixpath.basename(name))[0]
+    return stem if SHA256_PATTERN.match(stem) else ''
+
+
+class _AlreadyStored(Exception):
+    """The content-addressed name was taken while the file was being written"""
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names files by their SHA-256 digest.
+
+    Saving a file whose content is already stored returns the existing name
+    without writing anything, so the same invoice attached to many entries is
+    kept on disk once. Files are fanned out as ``<dir>/<ab>/<abcdef...>.<ext>``.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        digest = file_digest(content)
+        extension = os.path.splitext(name)[1].lower()
+        name = posixpath.join(posixpath.dirname(name), digest[:2], f"{digest}{extension}")
+
+        if self.exists(name):
+            return name
+        try:
+            return self._save(name, content)
+        except _AlreadyStored:
+            # Another request stored the same content after the exists() check
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        # Only called when the file appeared under its name mid-save; a
+        # content-addressed name always refers to the same bytes, so keep it
+        if digest_from_name(name):
+            raise _AlreadyStored(name)
+        return super().get_available_name(name, max_length=max_length)
+
+
+class HashingMemoryFileUploadHandler(MemoryFileUploadHandler):
+    """In-memory upload handler that hashes chunks as they stream in"""
+
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.activated:
+            self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
+
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Temporary-file upload handler that hashes chunks as they stream in"""
+
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
+
+
+evidence_storage = ContentAddressedStorage()
@@ -0,0 +1,60 @@
+"""
+Local background worker pool for work that must not run inside a request
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from monitoring.metrics import background_tasks_pending
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process-wide worker pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BACKGROUND_WORKERS', 2),
+                    thread_name_prefix='scope3-worker',
+                )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception(f"Background task {func.__name__} failed")
+        raise
+    finally:
+        # Worker threads hold their own connection; release it between tasks
+        connection.close()
+        background_tasks_pending.dec()
+
+
+def submit(func, *args, **kwargs):
+    """Run func on the worker pool and return a Future.
+
+    With BACKGROUND_TASKS_EAGER the task runs inline, which keeps tests and
+    management commands deterministic.
+    """
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        future = Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception as e:
+            logger.exception(f"Background task {func.__name__} failed")
+            future.set_exception(e)
+        return future
+    background_tasks_pending.inc()
+    return get_executor().submit(_run, func, args, kwargs)
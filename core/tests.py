@@ -1,3 +1,187 @@
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from core.evidence import process_evidence_document
+from core.models import EmissionEntry, EvidenceDocument, Supplier
+from core.storage import (
+    HashingMemoryFileUploadHandler, HashingTemporaryFileUploadHandler, digest_from_name, evidence_storage,
+)
+
+
+class EvidenceTestCase(TestCase):
+    """Stores evidence files in a temporary media directory"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.supplier = Supplier.objects.create(name='Steel Co', supplier_code='SUP-0', contact_email='s0@example.com')
+
+    def attach(self, content, name='invoice.txt'):
+        return EmissionEntry.objects.create(
+            supplier=self.supplier, date_reported=timezone.now(), scope3_emissions=Decimal('4.00'),
+            evidence_file=ContentFile(content, name=name),
+        )
+
+
+class EvidenceProcessingTests(EvidenceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.document = self.attach(b'Invoice total: 42 t CO2e').evidence_document
+
+    def test_document_is_processed(self):
+        document = process_evidence_document(self.document.pk)
+        self.assertEqual(document.status, 'ready')
+        self.assertEqual(document.text, 'Invoice total: 42 t CO2e')
+        self.assertEqual((document.size_bytes, document.content_type), (24, 'text/plain'))
+        self.assertIsNotNone(document.processed_at)
+        # Already processed documents are not claimed again
+        self.assertIsNone(process_evidence_document(self.document.pk))
+
+    def test_extraction_error_marks_document_failed(self):
+        with mock.patch('core.evidence.extract_artifacts', side_effect=ValueError('corrupt file')), \
+                self.assertLogs('core.evidence', 'ERROR'):
+            document = process_evidence_document(self.document.pk)
+        self.assertEqual((document.status, document.error), ('failed', 'corrupt file'))
+
+    def process(self, *args):
+        call_command('process_evidence', *args, stdout=StringIO())
+        return EvidenceDocument.objects.get(pk=self.document.pk).status
+
+    def test_failed_documents_are_retried_on_request(self):
+        EvidenceDocument.objects.filter(pk=self.document.pk).update(status='failed', error='corrupt file')
+        self.assertEqual(self.process(), 'failed')
+        self.assertEqual(self.process('--retry-failed'), 'ready')
+        self.assertEqual(EvidenceDocument.objects.get(pk=self.document.pk).error, '')
+
+    def test_stalled_documents_are_retried(self):
+        # Claimed recently: another worker is still on it
+        EvidenceDocument.objects.filter(pk=self.document.pk).update(
+            status='processing', processing_started_at=timezone.now(),
+        )
+        self.assertIsNone(process_evidence_document(self.document.pk))
+        self.assertEqual(self.process(), 'processing')
+
+        with self.settings(EVIDENCE_PROCESSING_TIMEOUT=60):
+            EvidenceDocument.objects.filter(pk=self.document.pk).update(
+                processing_started_at=timezone.now() - timedelta(minutes=5),
+            )
+            self.assertEqual(self.process(), 'ready')
+
+
+class ContentAddressedStorageTests(EvidenceTestCase):
+    content = b'%PDF-1.4 invoice'
+    digest = hashlib.sha256(content).hexdigest()
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), evidence_storage.location)
+            for root, _, names in os.walk(evidence_storage.location) for name in names
+        )
+
+    def test_files_are_named_by_digest_and_stored_once(self):
+        name = evidence_storage.save('evidence/Invoice.PDF', ContentFile(self.content))
+        self.assertEqual(name, f'evidence/{self.digest[:2]}/{self.digest}.pdf')
+        self.assertEqual(digest_from_name(name), self.digest)
+        self.assertEqual(evidence_storage.save('evidence/copy.pdf', ContentFile(self.content)), name)
+        self.assertEqual(self.stored_files(), [name])
+
+    def test_upload_time_digest_is_reused(self):
+        upload = ContentFile(self.content)
+        upload.sha256 = 'a' * 64
+        self.assertEqual(evidence_storage.save('evidence/invoice.pdf', upload), f'evidence/aa/{"a" * 64}.pdf')
+
+    def test_concurrent_save_of_same_content_keeps_one_name(self):
+        name = evidence_storage.save('evidence/invoice.pdf', ContentFile(self.content))
+        # Another request wrote the file between the exists() check and the write
+        with mock.patch.object(type(evidence_storage), 'exists', side_effect=[False]):
+            self.assertEqual(evidence_storage.save('evidence/invoice.pdf', ContentFile(self.content)), name)
+        self.assertEqual(self.stored_files(), [name])
+
+    def test_upload_handlers_hash_streamed_chunks(self):
+        chunks = [b'a' * 10, b'b' * 10, b'c' * 5]
+        for handler_class in [HashingMemoryFileUploadHandler, HashingTemporaryFileUploadHandler]:
+            with self.subTest(handler_class.__name__):
+                handler = handler_class()
+                handler.handle_raw_input(None, {}, 25, 'boundary')
+                try:
+                    handler.new_file('evidence_file', 'invoice.txt', 'text/plain', 25)
+                except StopFutureHandlers:
+                    # The in-memory handler claims files small enough to keep in memory
+                    pass
+                offset = 0
+                for chunk in chunks:
+                    handler.receive_data_chunk(chunk, offset)
+                    offset += len(chunk)
+                uploaded = handler.file_complete(offset)
+                self.assertEqual(uploaded.sha256, hashlib.sha256(b''.join(chunks)).hexdigest())
+                uploaded.close()
+
+
+class EvidenceDownloadTests(EvidenceTestCase):
+    content = b'0123456789'
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('analyst', password='secret'))
+        self.entry = self.attach(self.content)
+        self.url = f'/emissions/{self.entry.pk}/evidence/'
+        self.etag = f'"{self.entry.evidence_sha256}"'
+
+    def download(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full_download(self):
+        response, body = self.download()
+        self.assertEqual((response.status_code, body), (200, self.content))
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.download(**{'If-None-Match': self.etag})[0].status_code, 304)
+
+    def test_byte_ranges(self):
+        for header, content_range, expected in [
+            ('bytes=2-4', 'bytes 2-4/10', b'234'),
+            ('bytes=7-', 'bytes 7-9/10', b'789'),
+            ('bytes=-3', 'bytes 7-9/10', b'789'),
+            ('bytes=8-100', 'bytes 8-9/10', b'89'),
+        ]:
+            with self.subTest(header):
+                response, body = self.download(Range=header)
+                self.assertEqual((response.status_code, body), (206, expected))
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(expected)))
+        # Malformed and multi-range headers are ignored
+        for header in ['bytes=a-b', 'bytes=0-1,4-5']:
+            response, body = self.download(Range=header)
+            self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_unsatisfiable_range(self):
+        for header in ['bytes=10-', 'bytes=5-2', 'bytes=-0']:
+            with self.subTest(header):
+                response, _ = self.download(Range=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */10')
 
-# Create your tests here.
+    def test_if_range(self):
+        response, body = self.download(Range='bytes=0-1', **{'If-Range': self.etag})
+        self.assertEqual((response.status_code, body), (206, b'01'))
+        # A stale validator gets the whole current file
+        response, body = self.download(Range='bytes=0-1', **{'If-Range': '"other"'})
+        self.assertEqual((response.status_code, body), (200, self.content))
@@ -6,6 +6,8 @@ urlpatterns = [
     path('submit-emission/', views.submit_emission, name='submit_emission'),
     path('submit-emission/success/', views.submit_emission_success, name='submit_emission_success'),
     path('emissions/', views.emission_list, name='emission_list'),
+    path('emissions/<int:pk>/evidence/', views.evidence_download, name='evidence_download'),
+    path('emissions/<int:pk>/evidence/thumbnail/', views.evidence_thumbnail, name='evidence_thumbnail'),
     path('dashboard/', views.dashboard, name='dashboard'),
 ]
 
@@ -1,9 +1,12 @@
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.db import models
 from django.db.models import Sum, Avg, Count, Q
 from django.utils import timezone
 from datetime import timedelta
+import mimetypes
+import re
 
 from .forms import EmissionEntryForm
 from .models import EmissionEntry, Supplier
@@ -24,12 +27,12 @@ def home(request):
 @login_required
 def submit_emission(request):
     if request.method == 'POST':
-        form = EmissionEntryForm(request.POST, request.FILES, user=request.user)
+        form = EmissionEntryForm(request.POST, request.FILES, tenant=request.tenant)
         if form.is_valid():
             form.save()
             return redirect('submit_emission_success')
     else:
-        form = EmissionEntryForm(user=request.user)
+        form = EmissionEntryForm(tenant=request.tenant)
     return render(request, 'core/submit_emission.html', {'form': form})
 
 
@@ -40,8 +43,7 @@ def submit_emission_success(request):
 @login_required
 def emission_list(request):
     # http://127.0.0.1:8000/emissions/
-    # Get user's tenant
-    tenant = request.user.tenant_membership.tenant if hasattr(request.user, 'tenant_membership') else None
+    tenant = request.tenant
     
     # Get filter values from GET request
     supplier_id = request.GET.get('supplier')
@@ -51,7 +53,7 @@ def emission_list(request):
 
     search_query = request.GET.get('search')
     if search_query:
-        entries = entries.filter(notes__icontains=search_query)
+        entries = entries.filter(Q(notes__icontains=search_query) | Q(evidence_document__text__icontains=search_query))
 
     if supplier_id:
         entries = entries.filter(supplier__id=supplier_id)
@@ -64,6 +66,9 @@ def emission_list(request):
     # For filter dropdown
     suppliers = Supplier.objects.filter(tenant=tenant) if tenant else Supplier.objects.all()
 
+    # Only the small evidence artifacts are needed for the table, never the extracted text
+    entries = entries.select_related('supplier', 'evidence_document').defer('evidence_document__text')
+
     paginator = Paginator(entries, 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
@@ -81,10 +86,8 @@ def emission_list(request):
 @login_required
 def dashboard(request):
     """Enhanced dashboard with ML insights and scenario modeling"""
-    # Get user's tenant if applicable
-    tenant = None
-    if hasattr(request.user, 'tenant_membership'):
-        tenant = request.user.tenant_membership.tenant
+    tenant = request.tenant
+    if tenant:
         suppliers = Supplier.objects.filter(tenant=tenant)
     else:
         suppliers = Supplier.objects.all()
@@ -163,3 +166,107 @@ def dashboard(request):
     }
     
     return render(request, 'core/dashboard.html', context)
+
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def _parse_range(header, size):
+    """Parse a single-range 'Range' header into inclusive (start, end) offsets.
+
+    Returns None when the header should be ignored (absent, malformed or
+    multi-range) and raises ValueError when the range cannot be satisfied.
+    """
+    match = RANGE_PATTERN.match(header.strip()) if header else None
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError('Empty suffix range')
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def _stream_range(file, start, end):
+    file.seek(start)
+    remaining = end - start + 1
+    try:
+        while remaining > 0:
+            chunk = file.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _get_evidence_entry(request, pk):
+    tenant = request.tenant
+    entries = EmissionEntry.objects.filter(supplier__tenant=tenant) if tenant else EmissionEntry.objects.all()
+    return get_object_or_404(entries.select_related('evidence_document').defer('evidence_document__text'), pk=pk)
+
+
+@login_required
+def evidence_download(request, pk):
+    """Serve an entry's evidence file with ETag and HTTP range request support"""
+    entry = _get_evidence_entry(request, pk)
+    evidence = entry.evidence_file
+    if not evidence:
+        raise Http404('No evidence file attached')
+
+    etag = f'"{entry.evidence_sha256}"' if entry.evidence_sha256 else None
+    if etag and etag in request.headers.get('If-None-Match', ''):
+        return HttpResponseNotModified(headers={'ETag': etag})
+
+    size = evidence.size
+    content_type = mimetypes.guess_type(evidence.name)[0] or 'application/octet-stream'
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range == etag:
+        try:
+            byte_range = _parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            return HttpResponse(status=416, headers={'Content-Range': f'bytes */{size}'})
+
+    if byte_range is None:
+        response = FileResponse(evidence.open('rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_stream_range(evidence.open('rb'), start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+
+    response['Accept-Ranges'] = 'bytes'
+    if etag:
+        # Content-addressed files never change under the same name
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+
+@login_required
+def evidence_thumbnail(request, pk):
+    """Serve the first-page thumbnail rendered for an entry's evidence"""
+    entry = _get_evidence_entry(request, pk)
+    document = entry.evidence_document
+    if not document or not document.thumbnail:
+        raise Http404('No thumbnail available')
+
+    etag = f'"{document.sha256}-thumb"'
+    if etag in request.headers.get('If-None-Match', ''):
+        return HttpResponseNotModified(headers={'ETag': etag})
+    response = FileResponse(document.thumbnail.open('rb'), content_type='image/png')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
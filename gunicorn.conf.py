@@ -0,0 +1,36 @@
+"""
+Gunicorn settings (read automatically when gunicorn starts in this directory)
+
+The application and the active ML models are loaded once in the master
+process before it forks, so workers share the model memory instead of each
+loading a copy. The master re-checks the active models before every fork,
+so after activating a new model a reload (HUP) starts workers sharing it;
+until then each worker loads the new model for itself.
+
+Workers merge their metrics through snapshot files in
+METRICS_MULTIPROCESS_DIR, which is emptied when the server starts.
+"""
+import os
+import tempfile
+
+wsgi_app = 'scope3_tracker.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 3))
+preload_app = True
+
+# Read by the Django settings, so set before the application is loaded
+os.environ.setdefault('METRICS_MULTIPROCESS_DIR', os.path.join(tempfile.gettempdir(), 'scope3-metrics'))
+
+
+def on_starting(server):
+    # Totals of a previous server's workers would otherwise be counted again
+    from monitoring.metrics import clear_snapshots
+
+    clear_snapshots()
+
+
+def pre_fork(server, worker):
+    # Runs in the master, after the preloaded application is imported
+    from ml_services.registry import preload_for_fork
+
+    preload_for_fork()
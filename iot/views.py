@@ -6,8 +6,11 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
+import time
 from iot.models import IoTDevice, IoTReading
 from iot.services import IoTDataProcessor
+from monitoring.metrics import iot_ingest_duration, iot_readings_ingested
+from saas.ratelimit import check_rate_limit
 from decimal import Decimal
 import logging
 
@@ -24,7 +27,19 @@ def ingest_iot_data(request):
         api_key = data.get('api_key')
         
         # Authenticate device
-        device = get_object_or_404(IoTDevice, device_id=device_id, api_key=api_key, is_active=True)
+        device = get_object_or_404(
+            IoTDevice.objects.select_related('supplier__tenant'),
+            device_id=device_id, api_key=api_key, is_active=True,
+        )
+        
+        # Enforce the tenant's ingestion quota before writing anything
+        tenant = device.supplier.tenant
+        retry_after = (check_rate_limit(tenant, 'device', key=device.pk)
+                       or check_rate_limit(tenant, 'ingest'))
+        if retry_after:
+            response = JsonResponse({'status': 'error', 'message': 'Rate limit exceeded'}, status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
         
         # Update last seen
         from django.utils import timezone
@@ -32,6 +47,7 @@ def ingest_iot_data(request):
         device.save()
         
         # Create reading
+        start = time.perf_counter()
         reading = IoTReading.objects.create(
             device=device,
             energy_kwh=Decimal(str(data.get('energy_kwh', 0))),
@@ -44,6 +60,8 @@ def ingest_iot_data(request):
         
         # Process reading
         emissions_tons = IoTDataProcessor.process_reading(reading)
+        iot_ingest_duration.observe(time.perf_counter() - start, 'device')
+        iot_readings_ingested.inc('device')
         
         return JsonResponse({
             'status': 'success',
@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'tenant', 'status', 'progress', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind', 'tenant']
+    search_fields = ['id', 'kind', 'dedup_key']
+    readonly_fields = ['id', 'dedup_key', 'created_at', 'started_at', 'finished_at']
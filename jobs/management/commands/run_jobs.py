@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from jobs.models import Job, stale_cutoff
+from jobs.services import JobService
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs in this process (for example after a worker restart)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requeue-running', action='store_true',
+                            help='Requeue running jobs with no progress report within JOB_STALE_AFTER')
+
+    def handle(self, *args, **options):
+        if options['requeue_running']:
+            # Jobs still reporting progress belong to a live worker and are left alone
+            requeued = Job.objects.filter(status='running', heartbeat_at__lt=stale_cutoff()).update(
+                status='queued', started_at=None, heartbeat_at=None,
+            )
+            self.stdout.write(f'Requeued {requeued} interrupted jobs')
+
+        job_ids = list(Job.objects.filter(status='queued').order_by('created_at').values_list('id', flat=True))
+        self.stdout.write(f'Running {len(job_ids)} queued jobs...')
+
+        failed = 0
+        for job_id in job_ids:
+            job = JobService.run(job_id)
+            if job and job.status == 'failed':
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'Failed {job.kind} job {job.pk}: {job.error}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Ran {len(job_ids) - failed} jobs, {failed} failed'))
@@ -0,0 +1,66 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """A unit of long-running work executed on the background worker pool"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    ACTIVE_STATUSES = ['queued', 'running']
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=100, help_text="Registered handler name")
+    tenant = models.ForeignKey('saas.Tenant', on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    params = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    dedup_key = models.CharField(max_length=64, db_index=True, help_text="Identical in-flight jobs share this key")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    progress = models.FloatField(default=0, help_text="Fraction complete (0-1)")
+    progress_message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    cancel_requested = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Last sign of life from the running worker")
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # At most one queued or running job per dedup key
+            models.UniqueConstraint(
+                fields=['dedup_key'], condition=Q(status__in=['queued', 'running']), name='unique_active_job',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+    @property
+    def is_stale(self):
+        """Running without a report, or queued without a worker, for longer than JOB_STALE_AFTER"""
+        if self.status == 'running':
+            return self.heartbeat_at is not None and self.heartbeat_at < stale_cutoff()
+        # A restart drops queued submissions, leaving the job to hold its dedup key
+        return self.status == 'queued' and self.created_at < stale_cutoff()
+
+
+def stale_cutoff():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'JOB_STALE_AFTER', 1800))
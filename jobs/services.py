@@ -0,0 +1,143 @@
+"""
+Job registry, queueing and execution
+
+Handlers are plain functions registered under a kind with ``@register``;
+they receive the Job and its params as keyword arguments and return a
+JSON-serialisable result. Long handlers call ``report_progress``, which
+also raises ``JobCancelled`` once a cancellation has been requested.
+"""
+import hashlib
+import json
+import logging
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from core.tasks import submit
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job has been cancelled"""
+
+
+def register(kind):
+    """Register a job handler under ``kind``"""
+    def decorator(func):
+        if kind in _handlers:
+            raise ValueError(f"Job kind {kind} is already registered")
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+def get_handler(kind):
+    return _handlers[kind]
+
+
+def make_dedup_key(kind, params, tenant_id=None):
+    """Identical kind, tenant and params map to the same key"""
+    payload = json.dumps([kind, tenant_id, params], sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class JobService:
+    """Queue, run and cancel background jobs"""
+
+    @staticmethod
+    def enqueue(kind, params=None, tenant=None, user=None):
+        """Queue a job, or return the identical job already in flight.
+
+        Returns (job, created).
+        """
+        get_handler(kind)
+        params = params or {}
+        dedup_key = make_dedup_key(kind, params, tenant.pk if tenant else None)
+        active = Job.objects.filter(dedup_key=dedup_key, status__in=Job.ACTIVE_STATUSES)
+
+        job = active.first()
+        if job is not None and job.is_stale:
+            # Its worker died or never picked it up; free the dedup key instead of blocking it forever
+            logger.warning(f"Abandoning orphaned {job.kind} job {job.pk}")
+            error = 'Worker stopped reporting progress' if job.status == 'running' else 'No worker picked up the job'
+            Job.objects.filter(pk=job.pk, status=job.status).update(
+                status='failed', error=error, finished_at=timezone.now(),
+            )
+            job = None
+        if job is not None:
+            return job, False
+        try:
+            with transaction.atomic():
+                job = Job.objects.create(
+                    kind=kind, params=params, tenant=tenant, created_by=user, dedup_key=dedup_key,
+                )
+        except IntegrityError:
+            # Lost a race with an identical request
+            job = active.first()
+            if job is None:
+                raise
+            return job, False
+
+        transaction.on_commit(lambda: submit(JobService.run, job.pk))
+        return job, True
+
+    @staticmethod
+    def run(job_id):
+        """Execute a queued job; returns the job, or None if it was not claimable"""
+        # Claim the job so it runs once even if it is submitted twice
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=job_id, status='queued', cancel_requested=False).update(
+            status='running', started_at=now, heartbeat_at=now,
+        )
+        if not claimed:
+            return None
+
+        job = Job.objects.get(pk=job_id)
+        logger.info(f"Running {job.kind} job {job.pk}")
+        try:
+            result = get_handler(job.kind)(job, **job.params)
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            logger.exception(f"{job.kind} job {job.pk} failed")
+            job.status = 'failed'
+            job.error = str(e)
+        else:
+            job.status = 'succeeded'
+            job.result = result
+            job.progress = 1
+
+        job.finished_at = timezone.now()
+        # A job abandoned as stale meanwhile keeps its failure
+        finished = Job.objects.filter(pk=job.pk, status='running').update(
+            status=job.status, result=job.result, error=job.error, progress=job.progress, finished_at=job.finished_at,
+        )
+        if not finished:
+            logger.warning(f"{job.kind} job {job.pk} finished after it was abandoned")
+            job.refresh_from_db()
+        return job
+
+    @staticmethod
+    def cancel(job):
+        """Cancel a job; queued jobs stop at once, running ones at their next progress report"""
+        Job.objects.filter(pk=job.pk, status='queued').update(
+            status='cancelled', cancel_requested=True, finished_at=timezone.now(),
+        )
+        Job.objects.filter(pk=job.pk, status='running').update(cancel_requested=True)
+        job.refresh_from_db()
+        return job
+
+
+def report_progress(job, progress, message=''):
+    """Record progress (0-1) for a running job and stop it if cancellation was requested"""
+    Job.objects.filter(pk=job.pk).update(
+        progress=progress, progress_message=message[:255], heartbeat_at=timezone.now(),
+    )
+    job.progress, job.progress_message = progress, message
+    if Job.objects.filter(pk=job.pk, cancel_requested=True).exists():
+        raise JobCancelled()
@@ -0,0 +1,137 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from api.tests import QueryBudgetTestCase
+
+from core.models import Supplier, EmissionEntry
+from jobs.models import Job
+from jobs.services import JobCancelled, JobService, report_progress
+from saas.models import Tenant, TenantUser
+from scenarios.models import Scenario
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class JobTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Acme', slug='acme')
+        cls.user = User.objects.create_user('analyst', password='secret')
+        TenantUser.objects.create(tenant=cls.tenant, user=cls.user, role='admin')
+        cls.supplier = Supplier.objects.create(
+            name='Steel Co', supplier_code='SUP-0', contact_email='s0@example.com', tenant=cls.tenant,
+        )
+        cls.entry = EmissionEntry.objects.create(
+            supplier=cls.supplier, date_reported=timezone.now(), scope3_emissions=Decimal('4.00'),
+        )
+        cls.scenario = Scenario.objects.create(
+            name='Efficiency', scenario_type='efficiency', tenant=cls.tenant,
+            baseline_emissions=Decimal('0'), projected_emissions=Decimal('0'),
+            reduction_percentage=Decimal('0'), reduction_amount=Decimal('0'),
+        )
+
+    def post(self, url):
+        self.authenticate()
+        return self.client.post(url)
+
+    def test_actions_return_job_and_run_in_background(self):
+        for url, check in [
+            (f'/api/emissions/{self.entry.pk}/verify_blockchain/', lambda result: self.assertEqual(result['status'], 'verified')),
+            (f'/api/scenarios/{self.scenario.pk}/calculate/', lambda result: self.assertEqual(result['baseline_emissions'], 4.0)),
+        ]:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.post(url)
+            self.assertEqual(response.status_code, 202, response.content)
+            self.assertEqual(response['Location'], response.json()['status_url'])
+
+            self.authenticate()
+            job = self.client.get(response.json()['status_url']).json()
+            self.assertEqual(job['status'], 'succeeded', job['error'])
+            self.assertEqual(job['progress'], 1)
+            check(job['result'])
+
+    def test_identical_in_flight_jobs_are_deduplicated(self):
+        url = f'/api/suppliers/{self.supplier.pk}/predict_hotspot/'
+        first = self.post(url).json()
+        second = self.post(url).json()
+        self.assertEqual(first['job_id'], second['job_id'])
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_cancel_queued_job(self):
+        job_id = self.post(f'/api/scenarios/{self.scenario.pk}/calculate/').json()['job_id']
+        response = self.post(f'/api/jobs/{job_id}/cancel/')
+        self.assertEqual(response.json()['status'], 'cancelled')
+        self.assertIsNone(JobService.run(job_id))
+        self.assertEqual(self.post(f'/api/jobs/{job_id}/cancel/').status_code, 409)
+        # A cancelled job no longer blocks an identical new one
+        self.assertNotEqual(self.post(f'/api/scenarios/{self.scenario.pk}/calculate/').json()['job_id'], job_id)
+
+    def test_running_job_stops_at_next_progress_report(self):
+        job, _ = JobService.enqueue('scenario.calculate', {'scenario_id': self.scenario.pk}, tenant=self.tenant)
+        Job.objects.filter(pk=job.pk).update(status='running')
+        JobService.cancel(job)
+        with self.assertRaises(JobCancelled):
+            report_progress(job, 0.5)
+
+    def test_failed_job_records_error(self):
+        job, _ = JobService.enqueue('scenario.calculate', {'scenario_id': 0}, tenant=self.tenant)
+        with self.assertLogs('jobs.services', 'ERROR'):
+            job = JobService.run(job.pk)
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('does not exist', job.error)
+
+    def test_requeue_running_skips_live_jobs(self):
+        live, _ = JobService.enqueue('scenario.calculate', {'scenario_id': self.scenario.pk}, tenant=self.tenant)
+        orphan, _ = JobService.enqueue('scenario.calculate', {'scenario_id': 0}, tenant=self.tenant)
+        Job.objects.filter(pk=live.pk).update(status='running', heartbeat_at=timezone.now())
+        Job.objects.filter(pk=orphan.pk).update(status='running', heartbeat_at=timezone.now() - timedelta(hours=1))
+
+        with self.assertLogs('jobs.services', 'ERROR'):
+            call_command('run_jobs', requeue_running=True, stdout=StringIO())
+        self.assertEqual(Job.objects.get(pk=live.pk).status, 'running')
+        self.assertEqual(Job.objects.get(pk=orphan.pk).status, 'failed')
+
+    def test_orphaned_job_does_not_block_identical_job(self):
+        params = {'scenario_id': self.scenario.pk}
+        job, _ = JobService.enqueue('scenario.calculate', params, tenant=self.tenant)
+        Job.objects.filter(pk=job.pk).update(status='running', heartbeat_at=timezone.now())
+        self.assertEqual(JobService.enqueue('scenario.calculate', params, tenant=self.tenant), (job, False))
+
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        with self.assertLogs('jobs.services', 'WARNING'):
+            new_job, created = JobService.enqueue('scenario.calculate', params, tenant=self.tenant)
+        self.assertTrue(created)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'failed')
+
+    def test_job_left_queued_does_not_block_identical_job(self):
+        params = {'scenario_id': self.scenario.pk}
+        with self.captureOnCommitCallbacks():
+            job, _ = JobService.enqueue('scenario.calculate', params, tenant=self.tenant)
+        self.assertEqual(JobService.enqueue('scenario.calculate', params, tenant=self.tenant), (job, False))
+
+        # Its submission was lost in a restart
+        Job.objects.filter(pk=job.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        with self.assertLogs('jobs.services', 'WARNING'):
+            new_job, created = JobService.enqueue('scenario.calculate', params, tenant=self.tenant)
+        self.assertTrue(created)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('failed', 'No worker picked up the job'))
+        self.assertIsNone(JobService.run(job.pk))
+
+    def test_abandoned_job_keeps_its_failure(self):
+        job, _ = JobService.enqueue('scenario.calculate', {'scenario_id': self.scenario.pk}, tenant=self.tenant)
+
+        def abandon(job, **params):
+            Job.objects.filter(pk=job.pk).update(status='failed', error='Worker stopped reporting progress')
+            return {}
+
+        with mock.patch.dict('jobs.services._handlers', {'scenario.calculate': abandon}), \
+                self.assertLogs('jobs.services', 'WARNING'):
+            job = JobService.run(job.pk)
+        self.assertEqual((job.status, job.error), ('failed', 'Worker stopped reporting progress'))
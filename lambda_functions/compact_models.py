@@ -0,0 +1,116 @@
+"""
+NumPy-only scoring of exported ML models
+
+Models trained with scikit-learn are exported by the ``export_compact_model``
+management command into a single uncompressed ``.npz`` file of plain arrays
+(no pickles), so a Lambda function can score with nothing but NumPy and skip
+importing scikit-learn on cold start. Supported models:
+
+* ``isolation_forest``: all trees flattened into shared node arrays; reproduces
+  ``IsolationForest.score_samples``, ``decision_function`` and ``predict``
+  exactly
+* ``linear``: coefficients and intercept of a linear regression; reproduces
+  ``predict``
+"""
+import numpy as np
+
+FORMAT_VERSION = 1
+# Rows scored at once; bounds the (rows x trees) node index matrix
+SCORE_CHUNK_SIZE = 10000
+
+
+class CompactIsolationForest:
+    """Isolation forest scored by walking all trees at once, one level per step"""
+    kind = 'isolation_forest'
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        # Right then left child of each node, so [2 * node + went_left] is the next node
+        self.children = np.stack([arrays['children_right'], arrays['children_left']], axis=1).ravel()
+        self.missing_go_to_left = arrays['missing_go_to_left']
+        self.path_length = arrays['path_length']
+        self.roots = arrays['roots']
+        self.max_depth = int(arrays['max_depth'])
+        self.denominator = float(arrays['denominator'])
+        self.offset = float(arrays['offset'])
+        self.n_features = int(arrays['n_features'])
+        self.has_missing = bool(self.missing_go_to_left.any())
+
+    def score_samples(self, X):
+        """Opposite of the anomaly score, as ``IsolationForest.score_samples``"""
+        X = self._check(X)
+        return np.concatenate([
+            self._score_chunk(X[start:start + SCORE_CHUNK_SIZE])
+            for start in range(0, len(X), SCORE_CHUNK_SIZE)
+        ]) if len(X) else np.empty(0)
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset
+
+    def predict(self, X):
+        """-1 for outliers (hotspots) and 1 for inliers"""
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+    def _check(self, X):
+        # Trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected an array of shape (n, {self.n_features}), got {X.shape}")
+        return X
+
+    def _score_chunk(self, X):
+        flat = X.ravel()
+        row_starts = (np.arange(len(X)) * self.n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        # Leaves point at themselves, so every sample can take max_depth steps
+        for _ in range(self.max_depth):
+            values = flat.take(row_starts + self.feature.take(nodes))
+            go_left = values <= self.threshold.take(nodes)
+            if self.has_missing:
+                go_left |= np.isnan(values) & self.missing_go_to_left.take(nodes)
+            nodes = self.children.take(2 * nodes + go_left)
+        lengths = self.path_length[nodes]
+        # Summed tree by tree, in the same order and precision as scikit-learn
+        depths = np.zeros(len(X))
+        for tree in range(lengths.shape[1]):
+            depths += lengths[:, tree]
+        if self.denominator == 0:
+            return -np.ones(len(X))
+        return -(2 ** -(depths / self.denominator))
+
+
+class CompactLinearModel:
+    """Linear regression: X @ coef + intercept"""
+    kind = 'linear'
+
+    def __init__(self, arrays):
+        self.coef = arrays['coef']
+        self.intercept = arrays['intercept']
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(self.coef):
+            raise ValueError(f"Expected an array of shape (n, {len(self.coef)}), got {X.shape}")
+        return X @ self.coef + self.intercept
+
+
+MODEL_CLASSES = {cls.kind: cls for cls in (CompactIsolationForest, CompactLinearModel)}
+
+
+def save_compact_model(file, kind, arrays):
+    """Write model arrays to a path or binary file object"""
+    np.savez(file, format_version=FORMAT_VERSION, kind=kind, **arrays)
+
+
+def load_compact_model(file):
+    """Load a model written by ``save_compact_model`` from a path or binary file object"""
+    with np.load(file, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+    version = int(arrays.pop('format_version'))
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact model format {version}, expected {FORMAT_VERSION}")
+    kind = str(arrays.pop('kind'))
+    if kind not in MODEL_CLASSES:
+        raise ValueError(f"Unknown compact model kind {kind!r}")
+    return MODEL_CLASSES[kind](arrays)
@@ -1,47 +1,110 @@
 """
 AWS Lambda function for batch ML predictions
 Triggered by EventBridge on a schedule (e.g., daily)
+
+Suppliers' stored hotspot features are read from the API
+(``/api/suppliers/features/``) a page at a time, each page is scored in one
+call of the NumPy-only model export (see compact_models and the
+export_compact_model command) and the predictions are published to SQS in
+batches of 10. When the invocation is about to run out of time, the
+function invokes itself asynchronously with the cursor of the next page, so
+tenants of any size are covered by a chain of invocations.
+
+The API key decides the tenant; schedule one rule per tenant key. Clients
+are passed to ``run_batch``, so local stand-ins for S3, SQS, Lambda and the
+API can replace AWS (``AWS_ENDPOINT_URL`` also points boto3 at a local
+emulator).
 """
+import io
 import json
 import os
-import boto3
-from datetime import datetime, timedelta
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+
+import numpy as np
 
-# Initialize clients
-s3 = boto3.client('s3')
-sqs = boto3.client('sqs')
+try:
+    from compact_models import load_compact_model
+except ImportError:  # Imported as lambda_functions.ml_batch_prediction, e.g. by the Django tests
+    from lambda_functions.compact_models import load_compact_model
 
 # Environment variables
 MODEL_BUCKET = os.environ.get('MODEL_BUCKET', 'scope3-ml-models')
+MODEL_KEY = os.environ.get('MODEL_KEY', 'hotspot_model.npz')
 PREDICTION_QUEUE = os.environ.get('PREDICTION_QUEUE', 'ml-predictions')
 API_ENDPOINT = os.environ.get('API_ENDPOINT', 'https://api.scope3tracker.com')
+API_KEY = os.environ.get('API_KEY', '')
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 1000))
+
+SQS_BATCH_SIZE = 10  # send_message_batch limit
+SEND_ATTEMPTS = 4
+API_ATTEMPTS = 3
+RETRY_DELAY = 0.5  # Seconds, doubled after each failed attempt
+# Hand over to a new invocation when less time than this remains
+TIME_MARGIN_MS = 60000
+
+# Created once per container, on the first invocation
+_model = None
+_clients = None
+
+
+class FeatureAPI:
+    """Reads pages of supplier features from the Scope 3 Tracker API"""
+
+    def __init__(self, endpoint, api_key, timeout=30):
+        self.endpoint = endpoint.rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def fetch(self, after=None, limit=PAGE_SIZE):
+        query = {'limit': limit}
+        if after is not None:
+            query['after'] = after
+        request = urllib.request.Request(
+            f'{self.endpoint}/api/suppliers/features/?{urllib.parse.urlencode(query)}',
+            headers={'X-API-Key': self.api_key, 'Accept': 'application/json'},
+        )
+        for attempt in range(API_ATTEMPTS):
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    return json.loads(response.read())
+            except urllib.error.HTTPError as e:
+                # Client errors other than rate limiting will not succeed on retry
+                if (e.code < 500 and e.code != 429) or attempt == API_ATTEMPTS - 1:
+                    raise
+                delay = float(e.headers.get('Retry-After') or RETRY_DELAY * 2 ** attempt)
+            except urllib.error.URLError:
+                if attempt == API_ATTEMPTS - 1:
+                    raise
+                delay = RETRY_DELAY * 2 ** attempt
+            time.sleep(delay)
+
+
+def default_clients():
+    """boto3 clients and the API reader used when running on AWS"""
+    global _clients
+    if _clients is None:
+        import boto3
+
+        endpoint_url = os.environ.get('AWS_ENDPOINT_URL') or None
+        _clients = {
+            's3': boto3.client('s3', endpoint_url=endpoint_url),
+            'sqs': boto3.client('sqs', endpoint_url=endpoint_url),
+            'lambda': boto3.client('lambda', endpoint_url=endpoint_url),
+            'api': FeatureAPI(API_ENDPOINT, API_KEY),
+        }
+    return _clients
 
 
 def lambda_handler(event, context):
     """
-    Run batch ML predictions for all active suppliers
+    Run batch ML predictions for the suppliers of the API key's tenant
     """
     try:
-        # Get list of suppliers to process
-        # In production, fetch from database or S3
-        suppliers = get_suppliers_to_process()
-        
-        predictions = []
-        for supplier in suppliers:
-            prediction = generate_prediction(supplier)
-            if prediction:
-                predictions.append(prediction)
-                # Send to queue for processing
-                send_to_queue(prediction)
-        
-        return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'message': f'Generated {len(predictions)} predictions',
-                'predictions': predictions
-            })
-        }
-    
+        return run_batch(event or {}, context, default_clients())
     except Exception as e:
         print(f"Error in batch prediction: {str(e)}")
         return {
@@ -50,77 +113,145 @@ def lambda_handler(event, context):
         }
 
 
-def get_suppliers_to_process():
+def run_batch(event, context, clients):
     """
-    Get list of suppliers that need predictions
+    Score pages of suppliers until done or out of time
+
+    ``event`` may carry ``cursor`` (the last supplier id already scored) and
+    ``run_id`` when continuing an earlier invocation.
     """
-    # In production, query database or S3
-    # For now, return mock data
-    return [
-        {'id': 1, 'name': 'Supplier A', 'region': 'Zimbabwe'},
-        {'id': 2, 'name': 'Supplier B', 'region': 'South Africa'},
-    ]
+    model = get_model(clients['s3'])
+    run_id = event.get('run_id') or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    cursor = event.get('cursor')
+    scored = hotspots = published = failed = 0
+    continued = False
 
+    while True:
+        page = clients['api'].fetch(after=cursor, limit=PAGE_SIZE)
+        predictions = score_page(model, page, run_id)
+        scored += len(predictions)
+        hotspots += sum(p['is_hotspot'] for p in predictions)
+        sent, not_sent = publish_predictions(clients['sqs'], predictions)
+        published += sent
+        failed += not_sent
 
-def generate_prediction(supplier):
-    """
-    Generate ML prediction for supplier
-    """
-    # Load model from S3
-    model = load_model_from_s3('hotspot_model_v1.0.pkl')
-    
-    # Get supplier features
-    features = get_supplier_features(supplier)
-    
-    # Generate prediction
-    is_hotspot = model.predict([features])[0] == -1
-    confidence = abs(model.score_samples([features])[0]) / 10.0
-    confidence = min(max(confidence, 0.0), 1.0)
-    
+        cursor = page['next_after']
+        if cursor is None:
+            break
+        if context is not None and context.get_remaining_time_in_millis() < TIME_MARGIN_MS:
+            continue_in_new_invocation(clients['lambda'], context, {'run_id': run_id, 'cursor': cursor})
+            continued = True
+            break
+
+    print(f"Run {run_id}: scored {scored} suppliers ({hotspots} hotspots), published {published}, failed {failed}")
     return {
-        'supplier_id': supplier['id'],
-        'is_hotspot': bool(is_hotspot),
-        'confidence': float(confidence),
-        'timestamp': datetime.utcnow().isoformat(),
+        'statusCode': 200 if not failed else 207,
+        'body': json.dumps({
+            'run_id': run_id,
+            'scored': scored,
+            'hotspots': hotspots,
+            'published': published,
+            'failed': failed,
+            'next_cursor': cursor if continued else None,
+        })
     }
 
 
-def load_model_from_s3(model_name):
+def get_model(s3):
     """
-    Load ML model from S3
+    Return the hotspot model, loading it from S3 on the first call in this container
     """
-    import pickle
-    
-    try:
-        response = s3.get_object(Bucket=MODEL_BUCKET, Key=model_name)
-        model = pickle.loads(response['Body'].read())
-        return model
-    except Exception as e:
-        print(f"Error loading model: {e}")
-        # Return default model
-        from sklearn.ensemble import IsolationForest
-        return IsolationForest()
+    global _model
+    if _model is None:
+        _model = load_model_from_s3(s3, MODEL_KEY)
+    return _model
 
 
-def get_supplier_features(supplier):
+def load_model_from_s3(s3, model_name):
     """
-    Get features for supplier (mock implementation)
+    Load an exported compact model from S3
+
+    Errors propagate: an untrained fallback model would only produce
+    meaningless predictions.
     """
-    # In production, fetch from database
-    return [100.0, 500.0, 10, 120.0, 50000.0, 0.5, 1]
+    response = s3.get_object(Bucket=MODEL_BUCKET, Key=model_name)
+    return load_compact_model(io.BytesIO(response['Body'].read()))
 
 
-def send_to_queue(prediction):
+def score_page(model, page, run_id):
     """
-    Send prediction to SQS for async processing
+    Score one page of features in a single call; returns one prediction per supplier
     """
-    try:
-        sqs.send_message(
-            QueueUrl=PREDICTION_QUEUE,
-            MessageBody=json.dumps(prediction)
-        )
-    except Exception as e:
-        print(f"Error sending to queue: {e}")
+    if not page['supplier_ids']:
+        return []
+    scores = model.score_samples(np.asarray(page['rows'], dtype=np.float64))
+    # Same decision and confidence as the web application's HotspotPredictor
+    is_hotspot = scores - model.offset < 0
+    confidence = np.clip(np.abs(scores) / 10.0, 0.0, 1.0)
+    timestamp = datetime.now(timezone.utc).isoformat()
+    return [
+        {
+            'run_id': run_id,
+            'supplier_id': supplier_id,
+            'is_hotspot': bool(hotspot),
+            'confidence': float(conf),
+            'feature_version': page['feature_version'],
+            'timestamp': timestamp,
+        }
+        for supplier_id, hotspot, conf in zip(page['supplier_ids'], is_hotspot, confidence)
+    ]
 
 
+def publish_predictions(sqs, predictions):
+    """
+    Send predictions to SQS in batches of 10, retrying failed entries
+
+    Returns (sent, failed) counts.
+    """
+    sent = failed = 0
+    for start in range(0, len(predictions), SQS_BATCH_SIZE):
+        entries = [
+            {'Id': str(prediction['supplier_id']), 'MessageBody': json.dumps(prediction)}
+            for prediction in predictions[start:start + SQS_BATCH_SIZE]
+        ]
+        not_sent = send_batch(sqs, entries)
+        sent += len(entries) - len(not_sent)
+        failed += len(not_sent)
+    return sent, failed
+
+
+def send_batch(sqs, entries):
+    """
+    Send one batch; returns the entries still not accepted after SEND_ATTEMPTS attempts
+    """
+    rejected = []
+    for attempt in range(SEND_ATTEMPTS):
+        if attempt:
+            time.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+        try:
+            response = sqs.send_message_batch(QueueUrl=PREDICTION_QUEUE, Entries=entries)
+        except Exception as e:
+            # Throttling or a network error: the whole batch is retried
+            print(f"Error sending batch to queue (attempt {attempt + 1}): {e}")
+            continue
+        failures = {failure['Id']: failure for failure in response.get('Failed', [])}
+        for failure in failures.values():
+            print(f"Queue rejected prediction {failure['Id']}: {failure.get('Code')} {failure.get('Message', '')}")
+        # Sender faults (e.g. malformed entries) would fail the same way again
+        rejected += [entry for entry in entries if failures.get(entry['Id'], {}).get('SenderFault')]
+        entries = [entry for entry in entries if entry['Id'] in failures and not failures[entry['Id']].get('SenderFault')]
+        if not entries:
+            break
+    return rejected + entries
+
 
+def continue_in_new_invocation(lambda_client, context, state):
+    """
+    Invoke this function asynchronously to carry on from ``state['cursor']``
+    """
+    lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType='Event',
+        Payload=json.dumps(state).encode(),
+    )
+    print(f"Run {state['run_id']}: continuing after supplier {state['cursor']} in a new invocation")
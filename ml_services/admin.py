@@ -1,5 +1,5 @@
-from django.contrib import admin
-from .models import MLModel, MLPrediction, SpendBasedEstimate
+from django.contrib import admin, messages
+from .models import MLModel, MLPrediction, SpendBasedEstimate, SupplierFeatures
 
 
 @admin.register(MLModel)
@@ -7,6 +7,16 @@ class MLModelAdmin(admin.ModelAdmin):
     list_display = ['name', 'model_type', 'version', 'is_active', 'accuracy_score']
     list_filter = ['model_type', 'is_active']
     search_fields = ['name']
+    actions = ['activate_model']
+
+    @admin.action(description='Activate selected model (deactivates others of its type)')
+    def activate_model(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, 'Select exactly one model to activate.', messages.ERROR)
+            return
+        model = queryset.get()
+        model.activate()
+        self.message_user(request, f'{model} is now active; workers pick it up within seconds.')
 
 
 @admin.register(MLPrediction)
@@ -23,4 +33,15 @@ class SpendBasedEstimateAdmin(admin.ModelAdmin):
     search_fields = ['supplier__name']
 
 
+@admin.register(SupplierFeatures)
+class SupplierFeaturesAdmin(admin.ModelAdmin):
+    list_display = ['supplier', 'feature_version', 'entry_count', 'avg_emissions', 'recent_avg_emissions', 'updated_at']
+    list_filter = ['feature_version']
+    search_fields = ['supplier__name']
+
+    # Maintained from emission entries; rebuild_supplier_features recomputes it
+    def has_add_permission(self, request):
+        return False
 
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -6,5 +6,6 @@ class MlServicesConfig(AppConfig):
     name = 'ml_services'
     verbose_name = 'ML Services'
 
-
-
+    def ready(self):
+        from .signals import connect_signals
+        connect_signals()
@@ -0,0 +1,110 @@
+"""
+Export of trained models to the NumPy-only format of lambda_functions.compact_models
+"""
+import io
+from pathlib import Path
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+from sklearn.linear_model import LinearRegression
+
+from lambda_functions.compact_models import load_compact_model, save_compact_model
+
+
+def average_path_length(n_samples):
+    """Expected path length of an unsuccessful search in a binary tree of ``n_samples`` points.
+
+    The normalisation IsolationForest applies to path lengths: c(n) = 2 H(n - 1) - 2 (n - 1) / n,
+    with the harmonic number H approximated by ln + Euler's constant.
+    """
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    lengths = np.zeros_like(n_samples)
+    lengths[n_samples == 2] = 1.0
+    large = n_samples > 2
+    n = n_samples[large]
+    lengths[large] = 2.0 * (np.log(n - 1.0) + np.euler_gamma) - 2.0 * (n - 1.0) / n
+    return lengths
+
+
+def _node_depths(tree):
+    # Root at depth 1, as IsolationForest counts them; children follow their parent
+    depths = np.ones(tree.node_count, dtype=np.int64)
+    for node in range(tree.node_count):
+        for child in (tree.children_left[node], tree.children_right[node]):
+            if child != -1:
+                depths[child] = depths[node] + 1
+    return depths
+
+
+def export_isolation_forest(model):
+    """Flatten a fitted IsolationForest into the arrays of a CompactIsolationForest"""
+    n_features = model.n_features_in_
+    subsample_features = model._max_features != n_features
+    nodes = {name: [] for name in ('feature', 'threshold', 'children_left', 'children_right', 'missing_go_to_left', 'path_length')}
+    roots, offset, max_depth = [], 0, 0
+    for estimator, features in zip(model.estimators_, model.estimators_features_):
+        tree = estimator.tree_
+        index = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+        depths = _node_depths(tree)
+        max_depth = max(max_depth, int(depths.max()) - 1)
+
+        # Leaves get a valid column; their split is never used
+        feature = np.where(is_leaf, 0, tree.feature)
+        if subsample_features:
+            feature = np.asarray(features)[feature]
+        nodes['feature'].append(feature)
+        nodes['threshold'].append(tree.threshold)
+        nodes['children_left'].append(np.where(is_leaf, index, tree.children_left) + offset)
+        nodes['children_right'].append(np.where(is_leaf, index, tree.children_right) + offset)
+        missing = getattr(tree, 'missing_go_to_left', None)
+        nodes['missing_go_to_left'].append(np.zeros(tree.node_count, dtype=bool) if missing is None else missing.astype(bool))
+        nodes['path_length'].append(depths + average_path_length(tree.n_node_samples) - 1.0)
+        roots.append(offset)
+        offset += tree.node_count
+
+    arrays = {name: np.concatenate(values) for name, values in nodes.items()}
+    arrays['feature'] = arrays['feature'].astype(np.int32)
+    arrays['children_left'] = arrays['children_left'].astype(np.int32)
+    arrays['children_right'] = arrays['children_right'].astype(np.int32)
+    arrays.update(
+        roots=np.asarray(roots, dtype=np.int32),
+        max_depth=max_depth,
+        denominator=len(model.estimators_) * average_path_length([model.max_samples_])[0],
+        offset=model.offset_,
+        n_features=n_features,
+    )
+    return arrays
+
+
+def export_linear_model(model):
+    coef = np.asarray(model.coef_, dtype=np.float64)
+    if coef.ndim != 1:
+        raise ValueError("Only single-target linear models can be exported")
+    return {'coef': coef, 'intercept': np.float64(model.intercept_)}
+
+
+EXPORTERS = [
+    (IsolationForest, 'isolation_forest', export_isolation_forest),
+    (LinearRegression, 'linear', export_linear_model),
+]
+
+
+def export_compact_model(estimator, file):
+    """Write a fitted estimator in the compact format to a path or binary file.
+
+    Returns the compact model read back from the written bytes.
+    """
+    for estimator_class, kind, export in EXPORTERS:
+        if isinstance(estimator, estimator_class):
+            break
+    else:
+        raise ValueError(f"No compact export for {type(estimator).__name__}")
+    buffer = io.BytesIO()
+    save_compact_model(buffer, kind, export(estimator))
+    data = buffer.getvalue()
+    if hasattr(file, 'write'):
+        file.write(data)
+    else:
+        Path(file).write_bytes(data)
+    return load_compact_model(io.BytesIO(data))
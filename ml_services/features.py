@@ -0,0 +1,131 @@
+"""
+Vectorized feature extraction for hotspot prediction
+
+All suppliers' features come from a single query: window functions compute
+each supplier's average, total and count of emissions over all its entries
+and rank the entries by recency, and only the three most recent rows per
+supplier are returned. pandas then averages those rows per supplier, so the
+cost is one round trip regardless of the number of suppliers.
+
+The results are persisted in ``SupplierFeatures``, refreshed for the
+affected suppliers whenever their entries or details change, so training
+and scoring read one compact row per supplier instead of raw entries. Rows
+carry ``FEATURE_VERSION``; bump it whenever the features change and run
+``rebuild_supplier_features``, and models trained on other versions will
+refuse to score.
+"""
+import numpy as np
+import pandas as pd
+from django.db.models import Avg, Count, F, QuerySet, Sum, Window
+from django.db.models.functions import RowNumber
+
+from core.models import EmissionEntry
+from ml_services.models import SupplierFeatures
+
+FEATURE_NAMES = [
+    'avg_emissions',
+    'total_emissions',
+    'entry_count',
+    'recent_avg_emissions',
+    'annual_spend',
+    'emission_factor',
+    'has_region',
+]
+RECENT_ENTRIES = 3
+FEATURE_VERSION = 1
+# Model fields the features are computed from
+ENTRY_FEATURE_FIELDS = frozenset({'supplier', 'scope3_emissions', 'date_reported'})
+SUPPLIER_FEATURE_FIELDS = frozenset({'annual_spend', 'emission_factor', 'region'})
+# Suppliers recomputed per query when refreshing the store
+REFRESH_BATCH_SIZE = 1000
+
+
+def _filter_suppliers(queryset, suppliers):
+    if isinstance(suppliers, QuerySet):
+        return queryset.filter(supplier__in=suppliers.values('pk'))
+    if suppliers is not None:
+        return queryset.filter(supplier_id__in=[getattr(s, 'pk', s) for s in suppliers])
+    return queryset
+
+
+def _recent_rows(suppliers):
+    partition = {'partition_by': F('supplier_id')}
+    return (
+        _filter_suppliers(EmissionEntry.objects.all(), suppliers)
+        .annotate(
+            recency=Window(RowNumber(), order_by=[F('date_reported').desc(), F('pk').desc()], **partition),
+            supplier_avg=Window(Avg('scope3_emissions'), **partition),
+            supplier_total=Window(Sum('scope3_emissions'), **partition),
+            supplier_count=Window(Count('pk'), **partition),
+        )
+        .filter(recency__lte=RECENT_ENTRIES)
+        .values_list(
+            'supplier_id', 'scope3_emissions', 'supplier_avg', 'supplier_total', 'supplier_count',
+            'supplier__annual_spend', 'supplier__emission_factor', 'supplier__region',
+        )
+    )
+
+
+def build_feature_matrix(suppliers=None):
+    """Return (supplier ids, feature matrix) for suppliers that have emission entries.
+
+    ``suppliers`` may be a Supplier queryset, an iterable of suppliers or
+    ids, or None for all suppliers. Rows of the float64 matrix follow the
+    returned ids (ascending) and its columns ``FEATURE_NAMES``.
+    """
+    columns = ['supplier_id', 'emissions', 'avg', 'total', 'count', 'spend', 'factor', 'region']
+    frame = pd.DataFrame.from_records(list(_recent_rows(suppliers)), columns=columns)
+    if frame.empty:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(FEATURE_NAMES)))
+
+    numeric = ['emissions', 'avg', 'total', 'spend', 'factor']
+    frame[numeric] = frame[numeric].astype(float).fillna(0.0)
+    frame['has_region'] = frame['region'].fillna('').astype(bool).astype(float)
+    grouped = frame.groupby('supplier_id', sort=True)
+    features = grouped[['avg', 'total', 'count', 'spend', 'factor', 'has_region']].first()
+    features.insert(3, 'recent', grouped['emissions'].mean())
+    return features.index.to_numpy(dtype=np.int64), features.to_numpy(dtype=np.float64)
+
+
+def refresh_supplier_features(supplier_ids):
+    """Recompute the stored features of the given suppliers from their entries.
+
+    Suppliers left without entries lose their row. Runs in the caller's
+    transaction, so the store rolls back together with the change to the
+    entries.
+    """
+    supplier_ids = sorted(set(supplier_ids))
+    for start in range(0, len(supplier_ids), REFRESH_BATCH_SIZE):
+        batch = supplier_ids[start:start + REFRESH_BATCH_SIZE]
+        ids, X = build_feature_matrix(batch)
+        rows = [
+            SupplierFeatures(supplier_id=supplier_id, feature_version=FEATURE_VERSION, **dict(zip(FEATURE_NAMES, values)))
+            for supplier_id, values in zip(ids.tolist(), X.tolist())
+        ]
+        for row in rows:
+            row.entry_count = int(row.entry_count)
+            row.has_region = bool(row.has_region)
+        SupplierFeatures.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['supplier'],
+            update_fields=['feature_version', *FEATURE_NAMES, 'updated_at'],
+        )
+        emptied = set(batch).difference(ids.tolist())
+        if emptied:
+            SupplierFeatures.objects.filter(supplier_id__in=emptied).delete()
+
+
+def load_feature_matrix(suppliers=None, after=None, limit=None):
+    """Return (supplier ids, feature matrix) from the feature store.
+
+    Same contract as ``build_feature_matrix``, but reads one stored row per
+    supplier of the current ``FEATURE_VERSION``. ``after`` and ``limit``
+    page through the suppliers by id.
+    """
+    rows = _filter_suppliers(SupplierFeatures.objects.filter(feature_version=FEATURE_VERSION), suppliers)
+    if after is not None:
+        rows = rows.filter(supplier_id__gt=after)
+    rows = rows.order_by('supplier_id').values_list('supplier_id', *FEATURE_NAMES)
+    if limit is not None:
+        rows = rows[:limit]
+    data = np.array(list(rows), dtype=np.float64).reshape(-1, len(FEATURE_NAMES) + 1)
+    return data[:, 0].astype(np.int64), data[:, 1:]
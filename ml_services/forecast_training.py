@@ -0,0 +1,111 @@
+"""
+Training data and validation for the emission forecast model
+
+Entry history is streamed from the database in chunks of plain values into
+a columnar DataFrame (about 24 bytes per entry, so 10M entries take a few
+hundred MB), already sorted by supplier and date. Lag features then come
+from whole-column shifts and rolling windows masked at supplier boundaries
+instead of per-supplier Python loops.
+
+Validation is time based: rows are ordered by date, so every fold trains on
+the past and is scored on the period that follows. Folds are fitted in
+parallel threads; fold training sets are prefixes of the ordered arrays and
+so are not copied.
+"""
+import numpy as np
+import pandas as pd
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from joblib import Parallel, delayed
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import TimeSeriesSplit
+
+from core.models import EmissionEntry
+
+FORECAST_FEATURES = ['supplier_id', 'month', 'prev_2_avg_emissions']
+# Entries averaged into the lag feature; suppliers need one more entry than this to contribute rows
+PREVIOUS_ENTRIES = 2
+HISTORY_CHUNK_SIZE = 100000
+
+
+def load_emission_history(entries=None, chunk_size=HISTORY_CHUNK_SIZE):
+    """Stream entries into a DataFrame of supplier_id, date_reported and emissions.
+
+    Defaults to verified entries. Rows are ordered by supplier, date and id.
+    """
+    if entries is None:
+        entries = EmissionEntry.objects.filter(verified=True)
+    rows = (
+        entries
+        .order_by('supplier_id', 'date_reported', 'pk')
+        .values_list('supplier_id', 'date_reported', Cast('scope3_emissions', FloatField()))
+        .iterator(chunk_size=chunk_size)
+    )
+    columns = ['supplier_id', 'date_reported', 'emissions']
+    frames, chunk = [], []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            frames.append(_history_frame(chunk, columns))
+            chunk = []
+    if chunk or not frames:
+        frames.append(_history_frame(chunk, columns))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _history_frame(chunk, columns):
+    frame = pd.DataFrame.from_records(chunk, columns=columns)
+    return frame.astype({
+        'supplier_id': np.int64,
+        'date_reported': 'datetime64[ns, UTC]',
+        'emissions': np.float64,
+    })
+
+
+def build_training_set(history):
+    """Return (X, y, dates) for entries with PREVIOUS_ENTRIES earlier entries of their supplier.
+
+    Columns of X follow ``FORECAST_FEATURES``; rows are ordered by date
+    (``dates``, UTC datetime64).
+    """
+    emissions = history['emissions']
+    # Position of each entry within its supplier's history
+    position = history.groupby('supplier_id', sort=False).cumcount().to_numpy()
+    # The history is sorted by supplier, so a plain rolling window is correct
+    # wherever the whole window lies within one supplier
+    previous_avg = emissions.shift(1).rolling(PREVIOUS_ENTRIES).mean().to_numpy()
+    usable = position >= PREVIOUS_ENTRIES
+
+    training = pd.DataFrame({
+        'supplier_id': history['supplier_id'].to_numpy()[usable],
+        'month': history['date_reported'].dt.month.to_numpy()[usable],
+        'prev_2_avg_emissions': previous_avg[usable],
+        'target': emissions.to_numpy()[usable],
+        'date_reported': history['date_reported'].to_numpy(dtype='datetime64[ns]')[usable],
+    }).sort_values('date_reported', kind='stable')
+    X = np.ascontiguousarray(training[FORECAST_FEATURES].to_numpy(dtype=np.float64))
+    return X, training['target'].to_numpy(), training['date_reported'].to_numpy()
+
+
+def rmse(model, X, y):
+    return float(np.sqrt(np.mean((model.predict(X) - y) ** 2)))
+
+
+def _fit_fold(X, y, train_end, test_start, test_end):
+    model = LinearRegression().fit(X[:train_end], y[:train_end])
+    return rmse(model, X[test_start:test_end], y[test_start:test_end])
+
+
+def cross_validate(X, y, folds, jobs=1):
+    """RMSE of each time-ordered fold; X and y must be ordered by date"""
+    splits = TimeSeriesSplit(n_splits=folds).split(X)
+    return Parallel(n_jobs=jobs, prefer='threads')(
+        # TimeSeriesSplit yields a prefix for training and the block after it for testing
+        delayed(_fit_fold)(X, y, len(train), test[0], test[-1] + 1)
+        for train, test in splits
+    )
+
+
+def holdout_split(n_rows, test_fraction):
+    """Index separating the earlier rows used for training from the later holdout"""
+    return n_rows - max(1, int(round(n_rows * test_fraction)))
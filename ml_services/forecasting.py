@@ -0,0 +1,80 @@
+"""
+Multi-period emission forecasts from the trained forecast model
+
+The forecast model predicts a supplier's next entry from the supplier, the
+month and the average of its previous two entries. Forecasts for several
+months are produced recursively: each predicted month becomes history for
+the next one. All suppliers advance together, so a forecast of ``periods``
+months costs one query for the recent history and ``periods`` predict calls
+on the whole supplier matrix, however many suppliers are requested.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from django.db.models import F, FloatField, QuerySet, Window
+from django.db.models.functions import Cast, RowNumber
+
+from core.models import EmissionEntry
+from ml_services.forecast_training import PREVIOUS_ENTRIES
+
+DEFAULT_FORECAST_PERIODS = 12
+MAX_FORECAST_PERIODS = 36
+
+
+def recent_history(suppliers):
+    """Return (supplier ids, emissions) of the last PREVIOUS_ENTRIES verified entries per supplier.
+
+    Only suppliers with that many verified entries are returned. Rows of the
+    emissions matrix are ordered oldest to newest.
+    """
+    entries = EmissionEntry.objects.filter(verified=True)
+    if isinstance(suppliers, QuerySet):
+        entries = entries.filter(supplier__in=suppliers.values('pk'))
+    else:
+        entries = entries.filter(supplier_id__in=[getattr(s, 'pk', s) for s in suppliers])
+    rows = (
+        entries
+        .annotate(recency=Window(
+            RowNumber(), partition_by=F('supplier_id'), order_by=[F('date_reported').desc(), F('pk').desc()],
+        ))
+        .filter(recency__lte=PREVIOUS_ENTRIES)
+        .values_list('supplier_id', 'recency', Cast('scope3_emissions', FloatField()))
+    )
+    data = np.array(list(rows), dtype=np.float64).reshape(-1, 3)
+    ids, inverse = np.unique(data[:, 0].astype(np.int64), return_inverse=True)
+    history = np.full((len(ids), PREVIOUS_ENTRIES), np.nan)
+    # Recency 1 is the newest entry, stored in the last column
+    history[inverse, PREVIOUS_ENTRIES - data[:, 1].astype(np.int64)] = data[:, 2]
+    complete = ~np.isnan(history).any(axis=1)
+    return ids[complete], history[complete]
+
+
+def month_periods(first_month, periods):
+    """Return [(first day, last day)] of ``periods`` consecutive months from ``first_month``"""
+    result = []
+    start = first_month.replace(day=1)
+    for _ in range(periods):
+        following = (start + timedelta(days=32)).replace(day=1)
+        result.append((start, following - timedelta(days=1)))
+        start = following
+    return result
+
+
+def next_month(today=None):
+    today = today or date.today()
+    return (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def forecast_matrix(model, supplier_ids, history, months):
+    """Forecast every supplier for each month; returns (predictions, lag feature) of shape (suppliers, months)"""
+    window = history.copy()
+    predictions = np.empty((len(supplier_ids), len(months)))
+    lags = np.empty_like(predictions)
+    X = np.empty((len(supplier_ids), 3))
+    X[:, 0] = supplier_ids
+    for step, month in enumerate(months):
+        X[:, 1] = month
+        X[:, 2] = lags[:, step] = window.mean(axis=1)
+        predictions[:, step] = model.predict(X)
+        window = np.column_stack([window[:, 1:], predictions[:, step]])
+    return predictions, lags
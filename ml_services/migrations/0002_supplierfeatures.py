@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_evidencedocument'),
+        ('ml_services', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplierFeatures',
+            fields=[
+                ('supplier', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='hotspot_features', serialize=False, to='core.supplier')),
+                ('feature_version', models.PositiveSmallIntegerField()),
+                ('avg_emissions', models.FloatField()),
+                ('total_emissions', models.FloatField()),
+                ('entry_count', models.PositiveIntegerField()),
+                ('recent_avg_emissions', models.FloatField(help_text='Average of the three most recent entries')),
+                ('annual_spend', models.FloatField()),
+                ('emission_factor', models.FloatField()),
+                ('has_region', models.BooleanField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'supplier features',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Features as defined for FEATURE_VERSION 1 (ml_services.features)
+FEATURE_VERSION = 1
+RECENT_ENTRIES = 3
+
+
+def backfill_supplier_features(apps, schema_editor):
+    """Store features for suppliers whose entries predate the feature store"""
+    Supplier = apps.get_model('core', 'Supplier')
+    SupplierFeatures = apps.get_model('ml_services', 'SupplierFeatures')
+    rows = []
+    for supplier in Supplier.objects.filter(emission_entries__isnull=False).distinct().iterator():
+        emissions = [
+            float(value) for value in supplier.emission_entries.order_by('-date_reported', '-pk')
+            .values_list('scope3_emissions', flat=True)
+        ]
+        recent = emissions[:RECENT_ENTRIES]
+        rows.append(SupplierFeatures(
+            supplier_id=supplier.pk,
+            feature_version=FEATURE_VERSION,
+            avg_emissions=sum(emissions) / len(emissions),
+            total_emissions=sum(emissions),
+            entry_count=len(emissions),
+            recent_avg_emissions=sum(recent) / len(recent),
+            annual_spend=float(supplier.annual_spend or 0),
+            emission_factor=float(supplier.emission_factor or 0),
+            has_region=bool(supplier.region),
+        ))
+    SupplierFeatures.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_services', '0002_supplierfeatures'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_supplier_features, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_services', '0003_backfill_supplier_features'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mlmodel',
+            name='model_type',
+            field=models.CharField(choices=[('hotspot', 'Hotspot Prediction'), ('spend_estimate', 'Spend-Based Estimation'), ('anomaly', 'Anomaly Detection'), ('forecast', 'Emission Forecasting'), ('seasonal_forecast', 'Seasonal Emission Forecasting')], max_length=50),
+        ),
+    ]
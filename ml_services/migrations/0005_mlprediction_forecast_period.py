@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:28
+
+from django.db import migrations, models
+from django.db.models import F, Min
+
+FORECAST_MODEL_TYPES = ['forecast', 'seasonal_forecast']
+
+
+def dedupe_forecasts(apps, schema_editor):
+    """Keep one forecast row per model, supplier and month, and mark it as such"""
+    MLPrediction = apps.get_model('ml_services', 'MLPrediction')
+    forecasts = MLPrediction.objects.filter(model__model_type__in=FORECAST_MODEL_TYPES)
+    # Reruns updated the oldest row of a month, so later duplicates are stale
+    kept = forecasts.values('model_id', 'supplier_id', 'period_start').annotate(first=Min('pk')).values_list('first', flat=True)
+    forecasts.exclude(pk__in=list(kept)).delete()
+    forecasts.update(forecast_period=F('period_start'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_evidencedocument_processing_started_at'),
+        ('ml_services', '0004_mlmodel_seasonal_forecast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mlprediction',
+            name='forecast_period',
+            field=models.DateField(blank=True, help_text='Month forecast, one row per model and supplier', null=True),
+        ),
+        migrations.RunPython(dedupe_forecasts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='mlprediction',
+            constraint=models.UniqueConstraint(fields=('model', 'supplier', 'forecast_period'), name='unique_forecast_period'),
+        ),
+    ]
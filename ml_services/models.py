@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from core.models import Supplier, EmissionEntry
 from decimal import Decimal
 
@@ -10,6 +10,7 @@ class MLModel(models.Model):
         ('spend_estimate', 'Spend-Based Estimation'),
         ('anomaly', 'Anomaly Detection'),
         ('forecast', 'Emission Forecasting'),
+        ('seasonal_forecast', 'Seasonal Emission Forecasting'),
     ]
     name = models.CharField(max_length=255)
     model_type = models.CharField(max_length=50, choices=MODEL_TYPE_CHOICES)
@@ -24,6 +25,13 @@ class MLModel(models.Model):
     
     def __str__(self):
         return f"{self.name} v{self.version} ({self.model_type})"
+    
+    def activate(self):
+        """Make this the only active model of its type"""
+        with transaction.atomic():
+            MLModel.objects.filter(model_type=self.model_type, is_active=True).exclude(pk=self.pk).update(is_active=False)
+            self.is_active = True
+            self.save()
 
 
 class MLPrediction(models.Model):
@@ -37,12 +45,18 @@ class MLPrediction(models.Model):
     prediction_date = models.DateTimeField(auto_now_add=True)
     period_start = models.DateField(help_text="Start of prediction period")
     period_end = models.DateField(help_text="End of prediction period")
+    # Set (to period_start) on forecast rows only; hotspot scores keep their history
+    forecast_period = models.DateField(null=True, blank=True, help_text="Month forecast, one row per model and supplier")
     input_features = models.JSONField(default=dict, help_text="Features used for prediction")
     # Link to actual emission entry if prediction was validated
     validated_entry = models.ForeignKey(EmissionEntry, on_delete=models.SET_NULL, null=True, blank=True, related_name='validated_predictions')
     
     class Meta:
         ordering = ['-prediction_date']
+        constraints = [
+            # Rows without a forecast period never conflict (NULLs are distinct)
+            models.UniqueConstraint(fields=['model', 'supplier', 'forecast_period'], name='unique_forecast_period'),
+        ]
     
     def __str__(self):
         return f"Prediction for {self.supplier.name}: {self.predicted_emissions} tCO2e (confidence: {self.confidence_score})"
@@ -68,4 +82,25 @@ class SpendBasedEstimate(models.Model):
         return f"Estimate for {self.supplier.name}: {self.estimated_emissions} tCO2e from ${self.spend_amount}"
 
 
+class SupplierFeatures(models.Model):
+    """Hotspot features of a supplier, kept current as its entries and details change.
 
+    Rows exist only for suppliers with emission entries. ``feature_version``
+    records the feature definitions the row was computed with.
+    """
+    supplier = models.OneToOneField(Supplier, on_delete=models.CASCADE, primary_key=True, related_name='hotspot_features')
+    feature_version = models.PositiveSmallIntegerField()
+    avg_emissions = models.FloatField()
+    total_emissions = models.FloatField()
+    entry_count = models.PositiveIntegerField()
+    recent_avg_emissions = models.FloatField(help_text="Average of the three most recent entries")
+    annual_spend = models.FloatField()
+    emission_factor = models.FloatField()
+    has_region = models.BooleanField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'supplier features'
+    
+    def __str__(self):
+        return f"Features for supplier {self.supplier_id} (v{self.feature_version})"
@@ -0,0 +1,223 @@
+"""
+Process-wide registry of loaded ML models
+
+Each process loads the artifact of the active ``MLModel`` of a type once and
+keeps it in memory. Saving or deleting an MLModel bumps a generation in the
+shared cache; processes look at it at most every ML_MODEL_REFRESH_INTERVAL
+seconds and, when it changed, load the newly active artifact before swapping
+it in, so requests keep scoring with the old model meanwhile. Models are
+never trained here: without an active model and artifact ``ModelUnavailable``
+is raised and the training command has to be run.
+
+Artifacts are written uncompressed by ``save_artifact`` and loaded with
+ML_MODEL_MMAP_MODE, so their numpy arrays are mapped read-only from the page
+cache rather than copied into each process. ``preload_for_fork`` loads the
+active models in a server's master process; forked workers then share
+them instead of loading their own copies.
+"""
+import gc
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import joblib
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from ml_services.models import MLModel, MLPrediction
+from monitoring.metrics import ml_model_load_duration
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'ml-model-generation'
+
+
+class ModelUnavailable(Exception):
+    """Raised when no trained artifact exists for the active model of a type"""
+
+
+class LoadedModel:
+    """A model artifact held in memory with the MLModel row it came from"""
+    __slots__ = ('ml_model_id', 'model_type', 'version', 'feature_version', 'accuracy_score', 'path', 'estimator', 'loaded_at')
+
+    def __init__(self, ml_model, path, estimator):
+        self.ml_model_id = ml_model.pk
+        self.model_type = ml_model.model_type
+        self.version = ml_model.version
+        # Version of the stored features the model was trained on, when recorded
+        self.feature_version = (ml_model.metadata or {}).get('feature_version')
+        self.accuracy_score = ml_model.accuracy_score
+        self.path = path
+        self.estimator = estimator
+        self.loaded_at = time.time()
+
+    def is_current(self, ml_model):
+        return (
+            ml_model is not None and ml_model.pk == self.ml_model_id
+            and ml_model.version == self.version and artifact_path(ml_model) == self.path
+        )
+
+
+def artifact_path(ml_model):
+    """Return the artifact file of a model; relative paths are relative to BASE_DIR"""
+    if ml_model.model_path:
+        path = Path(ml_model.model_path)
+        return path if path.is_absolute() else Path(settings.BASE_DIR) / path
+    return Path(settings.ML_MODELS_DIR) / f'{ml_model.model_type}_model_v{ml_model.version}.pkl'
+
+
+def save_artifact(estimator, path):
+    """Write an estimator where workers can memory-map it; returns the path to store on the MLModel.
+
+    The file is written uncompressed (compressed files cannot be mapped)
+    and renamed into place, so loaders never see a partial file and
+    processes mapping a previous file keep a valid mapping. The returned
+    path is relative to BASE_DIR when possible, so the row survives a move
+    of the checkout.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    joblib.dump(estimator, tmp_path, compress=0)
+    os.replace(tmp_path, path)
+    try:
+        return str(path.relative_to(settings.BASE_DIR))
+    except ValueError:
+        return str(path)
+
+
+def prune_versions(model_type, keep=None):
+    """Remove all but the ``keep`` newest inactive versions of a model type.
+
+    Their artifacts are deleted, and so are their rows unless predictions
+    refer to them: those rows stay so the predictions keep their history.
+    Returns the number of versions that lost their artifact or row.
+    """
+    keep = getattr(settings, 'ML_MODEL_RETENTION', 3) if keep is None else keep
+    versions = MLModel.objects.filter(model_type=model_type)
+    stale = list(versions.filter(is_active=False).order_by('-created_at', '-pk')[keep:])
+    if not stale:
+        return 0
+    stale_ids = [ml_model.pk for ml_model in stale]
+    referenced = set(MLPrediction.objects.filter(model_id__in=stale_ids).values_list('model_id', flat=True).distinct())
+    removed = set(stale_ids) - referenced
+    kept_paths = {artifact_path(ml_model) for ml_model in versions.exclude(pk__in=stale_ids)}
+    for ml_model in stale:
+        path = artifact_path(ml_model)
+        if path not in kept_paths and path.exists():
+            path.unlink(missing_ok=True)
+            removed.add(ml_model.pk)
+    MLModel.objects.filter(pk__in=set(stale_ids) - referenced).delete()
+    if removed:
+        logger.info(f"Pruned {len(removed)} old {model_type} model versions")
+    return len(removed)
+
+
+def get_active_model(model_type):
+    return MLModel.objects.filter(model_type=model_type, is_active=True).order_by('-updated_at', '-pk').first()
+
+
+class ModelRegistry:
+    """Loaded models by type, shared by all threads of a process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self._generation = None
+        self._checked_at = 0.0
+
+    def get(self, model_type):
+        """Return the LoadedModel for the active model of a type"""
+        self._check_generation()
+        loaded = self._models.get(model_type)
+        if loaded is not None:
+            return loaded
+        with self._lock:
+            loaded = self._models.get(model_type)
+            if loaded is None:
+                loaded = self._models[model_type] = self._load(get_active_model(model_type), model_type)
+        return loaded
+
+    def preload(self, model_types=None):
+        """Load the active models of the given (default: all) types ahead of the first request"""
+        loaded = []
+        for model_type in model_types or [choice for choice, _ in MLModel.MODEL_TYPE_CHOICES]:
+            try:
+                loaded.append(self.get(model_type))
+            except ModelUnavailable:
+                continue
+        return loaded
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._checked_at = 0.0
+
+    def _check_generation(self):
+        now = time.monotonic()
+        if now - self._checked_at < getattr(settings, 'ML_MODEL_REFRESH_INTERVAL', 5):
+            return
+        self._checked_at = now
+        generation = cache.get(GENERATION_KEY)
+        if generation == self._generation:
+            return
+        self._generation = generation
+        with self._lock:
+            for model_type, loaded in list(self._models.items()):
+                self._refresh(model_type, loaded)
+
+    def _refresh(self, model_type, loaded):
+        active = get_active_model(model_type)
+        if loaded.is_current(active):
+            return
+        try:
+            replacement = self._load(active, model_type)
+        except ModelUnavailable as e:
+            if active is None:
+                # Deactivated without a successor: stop serving it
+                self._models.pop(model_type, None)
+            else:
+                logger.error(f"Keeping {model_type} model v{loaded.version}: {e}")
+            return
+        self._models[model_type] = replacement
+        logger.info(f"Swapped {model_type} model v{loaded.version} for v{replacement.version}")
+
+    def _load(self, ml_model, model_type):
+        if ml_model is None:
+            raise ModelUnavailable(f"No active {model_type} model has been trained")
+        path = artifact_path(ml_model)
+        if not path.exists():
+            raise ModelUnavailable(f"Artifact {path} for {ml_model} does not exist")
+        start = time.perf_counter()
+        estimator = joblib.load(path, mmap_mode=getattr(settings, 'ML_MODEL_MMAP_MODE', 'r'))
+        ml_model_load_duration.observe(time.perf_counter() - start, model_type)
+        logger.info(f"Loaded {ml_model} from {path}")
+        return LoadedModel(ml_model, path, estimator)
+
+
+def bump_generation():
+    """Make every process re-check its active models at its next refresh"""
+    cache.set(GENERATION_KEY, time.time_ns(), timeout=None)
+    # This process applies the change on its next lookup
+    registry._checked_at = 0.0
+
+
+registry = ModelRegistry()
+
+
+def preload_for_fork(model_types=None):
+    """Load the active models in a process about to fork workers (e.g. the gunicorn master).
+
+    Workers inherit the loaded models: mapped arrays stay shared in the page
+    cache and everything else is shared copy-on-write. Freezing the garbage
+    collector keeps collections in the workers from writing to, and so
+    copying, the inherited objects. Database connections opened while
+    loading are closed so no worker reuses the parent's.
+    """
+    loaded = registry.preload(model_types)
+    connections.close_all()
+    gc.freeze()
+    return loaded
@@ -0,0 +1,160 @@
+"""
+Per-supplier seasonal emission forecasts
+
+Every supplier gets its own additive Holt-Winters model with a damped trend
+(ETS(A,Ad,A)) fitted to its monthly verified emissions. Suppliers are not
+looped over: their histories form a padded supplier x month matrix (NaN
+where nothing was reported) and the smoothing recursions advance all
+suppliers and all candidate smoothing parameters at once, one month per
+step. Each supplier keeps the parameters with the smallest one-step-ahead
+squared error.
+
+Months without data only advance the state (level plus damped trend), so
+gaps and series of different lengths need no special handling. Large
+supplier sets are split into chunks, optionally fitted in worker
+processes.
+"""
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time
+
+import numpy as np
+from django.utils import timezone
+
+from core.models import EmissionEntry
+from ml_services.forecast_training import load_emission_history
+
+SEASON_LENGTH = 12
+# Months of history fitted; older entries are ignored
+HISTORY_MONTHS = 60
+# Damping of the trend per month, so long horizons level off
+DAMPING = 0.98
+# Candidate (alpha, beta, gamma) smoothing parameters, within the usual
+# ETS bounds beta <= alpha and gamma <= 1 - alpha
+SMOOTHING_GRID = np.array([
+    (alpha, beta, gamma)
+    for alpha, beta, gamma in itertools.product((0.1, 0.3, 0.5, 0.8), (0.0, 0.05, 0.2), (0.0, 0.1, 0.3))
+    if beta <= alpha and gamma <= 1 - alpha
+])
+CHUNK_SIZE = 250
+
+
+def month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def month_start(index):
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def monthly_history(suppliers=None, end=None, months=HISTORY_MONTHS):
+    """Return (supplier ids, first month, emissions matrix) of monthly verified emissions.
+
+    The matrix has one row per supplier with data and one column per month
+    for the ``months`` months before ``end`` (default: the current month, so
+    only complete months are used). Months without entries are NaN.
+    """
+    end = month_index(end or timezone.localdate())
+    first = end - months
+    entries = EmissionEntry.objects.filter(
+        verified=True, date_reported__gte=timezone.make_aware(datetime.combine(month_start(first), time.min)),
+    )
+    if suppliers is not None:
+        entries = entries.filter(supplier__in=suppliers.values('pk'))
+    # Summed here rather than by month in SQL, which SQLite truncates row by row in Python
+    frame = load_emission_history(entries)
+    reported = frame['date_reported'].dt.tz_convert(timezone.get_current_timezone_name())
+    columns = (reported.dt.year * 12 + reported.dt.month - 1 - first).to_numpy()
+    in_range = columns < months
+    ids, rows = np.unique(frame['supplier_id'].to_numpy()[in_range], return_inverse=True)
+    history = np.zeros((len(ids), months))
+    reports = np.zeros((len(ids), months), dtype=bool)
+    np.add.at(history, (rows, columns[in_range]), frame['emissions'].to_numpy()[in_range])
+    reports[rows, columns[in_range]] = True
+    history[~reports] = np.nan
+    return ids, month_start(first), history
+
+
+def _initial_state(history, first_slot):
+    """Level, trend and seasonal components before each supplier's first observation"""
+    n, length = history.shape
+    observed = ~np.isnan(history)
+    start = observed.argmax(axis=1)
+    slots = (first_slot + np.arange(length)) % SEASON_LENGTH
+
+    # Seasonal profile: average deviation from the supplier's mean per
+    # calendar month, for suppliers with two full seasons of data
+    deviation = np.where(observed, history - np.nanmean(history, axis=1, keepdims=True), 0.0)
+    totals = np.zeros((n, SEASON_LENGTH))
+    counts = np.zeros((n, SEASON_LENGTH))
+    np.add.at(totals.T, slots, deviation.T)
+    np.add.at(counts.T, slots, observed.T)
+    season = np.divide(totals, counts, out=np.zeros_like(totals), where=counts > 0)
+    season -= season.mean(axis=1, keepdims=True)
+    season[observed.sum(axis=1) < 2 * SEASON_LENGTH] = 0.0
+
+    level = history[np.arange(n), start] - season[np.arange(n), slots[start]]
+    return start, level, season
+
+
+def fit_holt_winters(history, first_slot, periods, grid=SMOOTHING_GRID):
+    """Fit every row of ``history`` and forecast ``periods`` months past its last column.
+
+    ``first_slot`` is the calendar month (0-11) of the first column. Rows
+    must have at least one observation. Returns (forecasts, parameters,
+    rmse): forecasts of shape (suppliers, periods), the chosen (alpha,
+    beta, gamma) per supplier and its one-step-ahead RMSE (NaN for
+    suppliers with a single observation).
+    """
+    n, length = history.shape
+    start, level, season = _initial_state(history, first_slot)
+    # Candidate parameters on the first axis, suppliers on the second
+    alpha, beta, gamma = (grid[:, i, None] for i in range(3))
+    level = np.broadcast_to(level, (len(grid), n)).copy()
+    trend = np.zeros_like(level)
+    season = np.broadcast_to(season, (len(grid), n, SEASON_LENGTH)).copy()
+    sse = np.zeros_like(level)
+    observations = np.zeros(n)
+
+    for t in range(length):
+        slot = (first_slot + t) % SEASON_LENGTH
+        # The first observation initialised the level; before it nothing changes
+        observed = ~np.isnan(history[:, t]) & (t > start)
+        error = np.where(observed, history[:, t] - (level + DAMPING * trend + season[:, :, slot]), 0.0)
+        level += DAMPING * trend + alpha * error
+        trend = DAMPING * trend + beta * error
+        season[:, :, slot] += gamma * error
+        sse += error ** 2
+        observations += observed
+
+    best = sse.argmin(axis=0)
+    suppliers = np.arange(n)
+    level, trend, season = level[best, suppliers], trend[best, suppliers], season[best, suppliers]
+    horizon = np.arange(1, periods + 1)
+    damped_steps = np.cumsum(DAMPING ** horizon)
+    forecast_slots = (first_slot + length - 1 + horizon) % SEASON_LENGTH
+    forecasts = level[:, None] + damped_steps * trend[:, None] + season[:, forecast_slots]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rmse = np.sqrt(sse[best, suppliers] / observations)
+    return np.maximum(forecasts, 0.0), grid[best], rmse
+
+
+def _fit_chunk(args):
+    return fit_holt_winters(*args)
+
+
+def forecast_seasonal(history, first_slot, periods, processes=1, chunk_size=CHUNK_SIZE):
+    """``fit_holt_winters`` over chunks of suppliers, in ``processes`` forked workers when above one"""
+    chunks = [
+        (history[offset:offset + chunk_size], first_slot, periods)
+        for offset in range(0, len(history), chunk_size)
+    ]
+    if not chunks:
+        return np.empty((0, periods)), np.empty((0, 3)), np.empty(0)
+    if processes <= 1 or len(chunks) == 1:
+        results = list(map(_fit_chunk, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('fork')) as pool:
+            results = list(pool.map(_fit_chunk, chunks))
+    return tuple(np.concatenate(parts) for parts in zip(*results))
@@ -1,20 +1,25 @@
 """
 ML Services for emission prediction and hotspot detection
 """
-from datetime import datetime, timedelta
-from django.utils import timezone
+from datetime import timedelta
 from django.utils import timezone
 import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestRegressor, IsolationForest
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-import joblib
-import os
+from sklearn.ensemble import IsolationForest
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import hashlib
 from django.conf import settings
-from django.db.models import Avg, Sum, Count
-from core.models import EmissionEntry, Supplier
+from django.core.cache import cache
+from django.db import connections, transaction
+from core.models import Supplier
+from ml_services.features import FEATURE_VERSION, load_feature_matrix
+from ml_services import seasonal
+from ml_services.forecasting import forecast_matrix, month_periods, next_month, recent_history
 from ml_services.models import MLModel, MLPrediction, SpendBasedEstimate
+from ml_services.registry import ModelUnavailable, registry
+from monitoring.metrics import ml_scoring_duration
+from saas.versioning import bump_data_version, get_data_version
 from decimal import Decimal
 import logging
 
@@ -24,104 +29,54 @@ logger = logging.getLogger(__name__)
 class HotspotPredictor:
     """Predicts emission hotspots using ML"""
     
-    def __init__(self, model_version='1.0'):
-        self.model_version = model_version
-        self.model = None
-        self.scaler = StandardScaler()
-        self.model_path = os.path.join(settings.ML_MODELS_DIR, f'hotspot_model_v{model_version}.pkl')
-        self.load_or_train()
-    
-    def load_or_train(self):
-        """Load existing model or train new one"""
-        if os.path.exists(self.model_path):
-            try:
-                self.model = joblib.load(self.model_path)
-                logger.info(f"Loaded hotspot model from {self.model_path}")
-            except Exception as e:
-                logger.error(f"Error loading model: {e}")
-                self.train()
-        else:
-            self.train()
+    CONTAMINATION = 0.15
+    MIN_TRAINING_SUPPLIERS = 10
     
-    def prepare_features(self, suppliers):
-        """Prepare features for prediction"""
-        features = []
-        for supplier in suppliers:
-            # Get historical data
-            entries = EmissionEntry.objects.filter(supplier=supplier)
-            if not entries.exists():
-                continue
-            
-            avg_emissions = entries.aggregate(avg=Avg('scope3_emissions'))['avg'] or 0
-            total_emissions = entries.aggregate(total=Sum('scope3_emissions'))['total'] or 0
-            entry_count = entries.count()
-            recent_emissions = entries.order_by('-date_reported')[:3]
-            recent_avg = sum([e.scope3_emissions for e in recent_emissions]) / len(recent_emissions) if recent_emissions else 0
-            
-            # Supplier features
-            spend = float(supplier.annual_spend) if supplier.annual_spend else 0
-            emission_factor = float(supplier.emission_factor) if supplier.emission_factor else 0
-            
-            feature_vector = [
-                float(avg_emissions),
-                float(total_emissions),
-                entry_count,
-                float(recent_avg),
-                spend,
-                emission_factor,
-                1 if supplier.region else 0,  # Has region
-            ]
-            features.append((supplier, feature_vector))
-        
-        return features
+    def __init__(self, model):
+        self.model = model
     
-    def train(self):
-        """Train hotspot detection model"""
+    @classmethod
+    def train(cls):
+        """Fit a hotspot model on the feature store (all suppliers with emission data).
+
+        Returns (model, training size); raises ValueError when there is too
+        little data. Used by the train_hotspot_model command only.
+        """
         logger.info("Training hotspot prediction model...")
-        
-        # Get all suppliers with emission data
-        suppliers = Supplier.objects.filter(emission_entries__isnull=False).distinct()
-        
-        if suppliers.count() < 10:
-            logger.warning("Insufficient data for training. Using default model.")
-            self.model = IsolationForest(contamination=0.1, random_state=42)
-            return
-        
-        features_data = self.prepare_features(suppliers)
-        if not features_data:
-            logger.warning("No features prepared. Using default model.")
-            self.model = IsolationForest(contamination=0.1, random_state=42)
-            return
-        
-        X = np.array([f[1] for f in features_data])
+        _, X = load_feature_matrix()
+        if len(X) < cls.MIN_TRAINING_SUPPLIERS:
+            raise ValueError(
+                f"Insufficient data for training: {len(X)} suppliers with emissions, "
+                f"need {cls.MIN_TRAINING_SUPPLIERS}"
+            )
         
         # Use Isolation Forest for anomaly/hotspot detection
-        self.model = IsolationForest(contamination=0.15, random_state=42)
-        self.model.fit(X)
-        
-        # Save model
-        os.makedirs(settings.ML_MODELS_DIR, exist_ok=True)
-        joblib.dump(self.model, self.model_path)
-        logger.info(f"Model saved to {self.model_path}")
+        model = IsolationForest(contamination=cls.CONTAMINATION, random_state=42)
+        model.fit(X)
+        return model, len(X)
     
-    def predict_hotspot(self, supplier):
-        """Predict if supplier is a hotspot"""
-        features_data = self.prepare_features([supplier])
-        if not features_data:
-            return False, 0.5
-        
-        X = np.array([features_data[0][1]])
-        prediction = self.model.predict(X)[0]
-        score = self.model.score_samples(X)[0]
-        
+    def score(self, X):
+        """Score a feature matrix; returns (is_hotspot, confidence) arrays"""
+        scores = self.model.score_samples(X)
+        # Same decision as IsolationForest.predict, without scoring the matrix twice
+        is_hotspot = scores - self.model.offset_ < 0
         # Normalize score to 0-1 (higher = more likely hotspot)
-        is_hotspot = prediction == -1
-        confidence = abs(score) / 10.0  # Rough normalization
-        confidence = min(max(confidence, 0.0), 1.0)
-        
+        confidence = np.clip(np.abs(scores) / 10.0, 0.0, 1.0)  # Rough normalization
         return is_hotspot, confidence
 
 
+def get_hotspot_model():
+    """Return the loaded hotspot model, refusing one trained on other features"""
+    # Loaded once per process; raises ModelUnavailable rather than training here
+    loaded = registry.get('hotspot')
+    if loaded.feature_version is not None and loaded.feature_version != FEATURE_VERSION:
+        raise ModelUnavailable(
+            f"Hotspot model v{loaded.version} was trained on feature version {loaded.feature_version}, "
+            f"the store holds version {FEATURE_VERSION}; retrain it"
+        )
+    return loaded
+
+
 class SpendBasedEstimator:
     """Estimates emissions based on spend and industry factors"""
     
@@ -181,28 +136,22 @@ class MLPredictionService:
         if not period_end:
             period_end = period_start + timedelta(days=365)
         
-        # Get or create model
-        model, _ = MLModel.objects.get_or_create(
-            model_type=model_type,
-            defaults={
-                'name': f'{model_type.title()} Model',
-                'version': '1.0',
-                'is_active': True,
-            }
-        )
-        
         if model_type == 'hotspot':
-            predictor = HotspotPredictor()
-            is_hotspot, confidence = predictor.predict_hotspot(supplier)
-            
-            # Get average emissions for prediction
-            entries = EmissionEntry.objects.filter(supplier=supplier)
-            avg_emissions = entries.aggregate(avg=Avg('scope3_emissions'))['avg'] or Decimal('0')
+            loaded = get_hotspot_model()
+            start = time.perf_counter()
+            _, X = load_feature_matrix([supplier.pk])
+            if len(X):
+                is_hotspot, confidence = HotspotPredictor(loaded.estimator).score(X)
+                is_hotspot, confidence = bool(is_hotspot[0]), float(confidence[0])
+                ml_scoring_duration.observe(time.perf_counter() - start, 'hotspot')
+            else:
+                is_hotspot, confidence = False, 0.5
             
             prediction = MLPrediction.objects.create(
                 supplier=supplier,
-                model=model,
-                predicted_emissions=avg_emissions,
+                model_id=loaded.ml_model_id,
+                # Feature 0 is the supplier's average emissions
+                predicted_emissions=Decimal(f'{X[0, 0]:.2f}') if len(X) else Decimal('0'),
                 confidence_score=confidence,
                 is_hotspot=is_hotspot,
                 hotspot_reason="High emission intensity detected" if is_hotspot else "",
@@ -218,3 +167,221 @@ class MLPredictionService:
             return prediction
         
         return None
+    
+    @staticmethod
+    def score_suppliers(suppliers, period_start=None, period_end=None, batch_size=1000):
+        """Score a queryset of suppliers in one pass and bulk-insert their hotspot predictions.
+
+        Features come from one read of the feature store and the model scores the whole matrix
+        at once. Suppliers without emission data get the same neutral
+        prediction as ``create_prediction``. Returns the created predictions.
+        """
+        if not period_start:
+            period_start = timezone.now().date()
+        if not period_end:
+            period_end = period_start + timedelta(days=365)
+        
+        loaded = get_hotspot_model()
+        rows = list(suppliers.order_by().values_list('pk', 'tenant_id', 'annual_spend', 'emission_factor', 'region'))
+        if not rows:
+            return []
+        ids, X = load_feature_matrix(suppliers)
+        if len(X):
+            is_hotspot, confidence = HotspotPredictor(loaded.estimator).score(X)
+        position = {supplier_id: i for i, supplier_id in enumerate(ids.tolist())}
+        
+        predictions = []
+        for supplier_id, tenant_id, annual_spend, emission_factor, region in rows:
+            i = position.get(supplier_id)
+            hotspot = i is not None and bool(is_hotspot[i])
+            predictions.append(MLPrediction(
+                supplier_id=supplier_id,
+                model_id=loaded.ml_model_id,
+                # Feature 0 is the supplier's average emissions
+                predicted_emissions=Decimal('0') if i is None else Decimal(f'{X[i, 0]:.2f}'),
+                confidence_score=Decimal('0.5') if i is None else Decimal(f'{confidence[i]:.4f}'),
+                is_hotspot=hotspot,
+                hotspot_reason="High emission intensity detected" if hotspot else "",
+                period_start=period_start,
+                period_end=period_end,
+                input_features={
+                    'annual_spend': float(annual_spend) if annual_spend else 0,
+                    'emission_factor': float(emission_factor) if emission_factor else 0,
+                    'region': region or '',
+                },
+            ))
+        with transaction.atomic():
+            MLPrediction.objects.bulk_create(predictions, batch_size=batch_size)
+        # bulk_create sends no post_save signals
+        for tenant_id in {row[1] for row in rows}:
+            bump_data_version(tenant_id)
+        logger.info(f"Scored {len(predictions)} suppliers with {loaded.model_type} model v{loaded.version}")
+        return predictions
+    
+    @staticmethod
+    def score_tenants(tenant_ids, processes=1):
+        """Score every supplier of each tenant; returns {tenant id: (scored, hotspots)}.
+
+        A tenant id of None scores the suppliers without a tenant. With
+        ``processes`` > 1 tenants are scored in a pool of forked worker
+        processes, which inherit the already loaded model.
+        """
+        tenant_ids = list(tenant_ids)
+        if processes <= 1 or len(tenant_ids) <= 1:
+            return dict(map(_score_tenant, tenant_ids))
+        get_hotspot_model()
+        # Children must open their own database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('fork')) as pool:
+            return dict(pool.map(_score_tenant, tenant_ids))
+
+
+class EmissionForecastService:
+    """Multi-period emission forecasts from the active forecast model"""
+    
+    @staticmethod
+    def forecast_suppliers(suppliers, periods, tenant_id=None, batch_size=1000):
+        """Forecast monthly emissions of a Supplier queryset for ``periods`` months from next month.
+
+        All suppliers are predicted together and the forecasts are stored in
+        bulk, one MLPrediction row per supplier, month and model: forecasting
+        a month again updates its row. Results are cached per model version
+        and the data version of ``tenant_id``'s scope, so repeated requests
+        do not recompute them. Suppliers with fewer than two verified entries
+        are reported as skipped.
+        """
+        loaded = registry.get('forecast')
+        months = month_periods(next_month(), periods)
+        supplier_ids = sorted(suppliers.order_by().values_list('pk', flat=True))
+        digest = hashlib.sha256(','.join(map(str, supplier_ids)).encode()).hexdigest()[:16]
+        version = get_data_version(tenant_id)
+        key_prefix = f'forecast:{loaded.ml_model_id}:{loaded.version}:{tenant_id}:{months[0][0]}:{periods}:{digest}'
+        result = cache.get(f'{key_prefix}:{version}')
+        if result is not None:
+            return result
+        
+        ids, history = recent_history(suppliers)
+        predictions, lags = forecast_matrix(loaded.estimator, ids, history, [start.month for start, _ in months])
+        confidence = Decimal(f'{min(max(float(loaded.accuracy_score or 0), 0.0), 1.0):.4f}')
+        rows = []
+        for i, supplier_id in enumerate(ids.tolist()):
+            for step, (period_start, period_end) in enumerate(months):
+                rows.append(MLPrediction(
+                    supplier_id=supplier_id,
+                    model_id=loaded.ml_model_id,
+                    predicted_emissions=Decimal(f'{max(predictions[i, step], 0.0):.2f}'),
+                    confidence_score=confidence,
+                    period_start=period_start,
+                    period_end=period_end,
+                    input_features={'month': period_start.month, 'prev_2_avg_emissions': round(float(lags[i, step]), 4)},
+                ))
+        changed = EmissionForecastService._store(rows, loaded.ml_model_id, batch_size)
+        tenants = EmissionForecastService._bump_data_versions(changed)
+        
+        result = {
+            'model_version': loaded.version,
+            'periods': [{'start': start.isoformat(), 'end': end.isoformat()} for start, end in months],
+            'forecasts': [
+                {
+                    'supplier_id': supplier_id,
+                    'predicted_emissions': [float(row.predicted_emissions) for row in rows[i * periods:(i + 1) * periods]],
+                }
+                for i, supplier_id in enumerate(ids.tolist())
+            ],
+            'skipped': sorted(set(supplier_ids) - set(ids.tolist())),
+        }
+        # Cache under the version our own writes produced, unless something else changed meanwhile
+        expected = version + (len(tenants) if tenant_id is None else int(tenant_id in tenants))
+        if get_data_version(tenant_id) == expected:
+            cache.set(f'{key_prefix}:{expected}', result, timeout=getattr(settings, 'FORECAST_CACHE_TIMEOUT', 86400))
+        logger.info(f"Forecast {len(ids)} suppliers for {periods} months with forecast model v{loaded.version}")
+        return result
+
+    @staticmethod
+    def forecast_seasonal(suppliers, periods, processes=1, batch_size=1000):
+        """Fit a seasonal model per supplier and store ``periods`` monthly forecasts.
+
+        Each supplier with verified emissions in the last
+        ``seasonal.HISTORY_MONTHS`` months gets its own Holt-Winters fit (see
+        ``ml_services.seasonal``), forecast from the current month on, the
+        first without complete data. Rows are upserted like those of
+        ``forecast_suppliers``, under the seasonal model's MLModel row, and
+        the data version of every tenant whose rows changed is bumped.
+        Returns the number of suppliers forecast.
+        """
+        ids, first_month, history = seasonal.monthly_history(suppliers)
+        forecasts, parameters, rmse = seasonal.forecast_seasonal(
+            history, first_month.month - 1, periods, processes=processes,
+        )
+        model, _ = MLModel.objects.get_or_create(
+            model_type='seasonal_forecast',
+            defaults={
+                'name': 'Seasonal Holt-Winters', 'version': '1',
+                'metadata': {'season_length': seasonal.SEASON_LENGTH, 'damping': seasonal.DAMPING},
+            },
+        )
+        months = month_periods(
+            seasonal.month_start(seasonal.month_index(first_month) + history.shape[1]), periods,
+        )
+        # One-step error relative to the supplier's average month; unknown for single observations
+        with np.errstate(invalid='ignore', divide='ignore'):
+            confidence = np.nan_to_num(np.clip(1 - rmse / np.nanmean(history, axis=1), 0.0, 1.0))
+        rows = []
+        for i, supplier_id in enumerate(ids.tolist()):
+            alpha, beta, gamma = parameters[i].tolist()
+            for step, (period_start, period_end) in enumerate(months):
+                rows.append(MLPrediction(
+                    supplier_id=supplier_id,
+                    model_id=model.pk,
+                    predicted_emissions=Decimal(f'{forecasts[i, step]:.2f}'),
+                    confidence_score=Decimal(f'{confidence[i]:.4f}'),
+                    period_start=period_start,
+                    period_end=period_end,
+                    input_features={'month': period_start.month, 'alpha': alpha, 'beta': beta, 'gamma': gamma},
+                ))
+        changed = EmissionForecastService._store(rows, model.pk, batch_size)
+        EmissionForecastService._bump_data_versions(changed)
+        logger.info(f"Seasonal forecast of {len(ids)} suppliers for {periods} months")
+        return len(ids)
+
+    @staticmethod
+    def _store(rows, model_id, batch_size):
+        """Upsert forecast rows, one per model, supplier and month; returns the ids of suppliers whose rows changed"""
+        fields = ['predicted_emissions', 'confidence_score', 'period_end', 'input_features']
+        for row in rows:
+            row.forecast_period = row.period_start
+        stored = {
+            (supplier_id, period): values
+            for supplier_id, period, *values in MLPrediction.objects.filter(
+                model_id=model_id,
+                supplier_id__in={row.supplier_id for row in rows},
+                forecast_period__in={row.forecast_period for row in rows},
+            ).values_list('supplier_id', 'forecast_period', *fields)
+        }
+        changed = [
+            row for row in rows
+            if stored.get((row.supplier_id, row.forecast_period)) != [getattr(row, field) for field in fields]
+        ]
+        # The constraint on (model, supplier, forecast_period) makes concurrent runs update rather than duplicate
+        with transaction.atomic():
+            MLPrediction.objects.bulk_create(
+                changed, batch_size=batch_size, update_conflicts=True,
+                unique_fields=['model', 'supplier', 'forecast_period'], update_fields=fields,
+            )
+        return {row.supplier_id for row in changed}
+
+    @staticmethod
+    def _bump_data_versions(supplier_ids):
+        """Invalidate cached responses of the suppliers' tenants; returns those tenants"""
+        if not supplier_ids:
+            return set()
+        # bulk_create sends no post_save signals
+        tenants = set(Supplier.objects.filter(pk__in=supplier_ids).values_list('tenant_id', flat=True).distinct())
+        for tenant in tenants:
+            bump_data_version(tenant)
+        return tenants
+
+
+def _score_tenant(tenant_id):
+    predictions = MLPredictionService.score_suppliers(Supplier.objects.filter(tenant_id=tenant_id))
+    return tenant_id, (len(predictions), sum(p.is_hotspot for p in predictions))
@@ -0,0 +1,65 @@
+"""
+Signal handlers keeping loaded models in step with the active MLModel rows,
+and the supplier feature store in step with emission entries and suppliers
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from core.models import EmissionEntry, Supplier
+from ml_services.features import ENTRY_FEATURE_FIELDS, SUPPLIER_FEATURE_FIELDS, refresh_supplier_features
+from ml_services.models import MLModel
+from ml_services.registry import bump_generation
+
+
+def reload_models(sender, instance, **kwargs):
+    # After commit, so other processes see the new active row when they reload
+    transaction.on_commit(bump_generation)
+
+
+def remember_entry_supplier(sender, instance, update_fields=None, **kwargs):
+    # An entry moved to another supplier changes the features of both
+    instance._previous_supplier_id = None
+    if not instance._state.adding and (update_fields is None or 'supplier' in update_fields):
+        if hasattr(instance, '_loaded_supplier_id'):
+            instance._previous_supplier_id = instance._loaded_supplier_id
+        else:
+            # Loaded with the supplier deferred
+            instance._previous_supplier_id = (
+                EmissionEntry.objects.filter(pk=instance.pk).values_list('supplier_id', flat=True).first()
+            )
+
+
+def refresh_entry_supplier(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'supplier' in update_fields:
+        instance._loaded_supplier_id = instance.supplier_id
+    if update_fields is not None and not ENTRY_FEATURE_FIELDS.intersection(update_fields):
+        return
+    supplier_ids = {instance.supplier_id}
+    previous = getattr(instance, '_previous_supplier_id', None)
+    if previous is not None:
+        supplier_ids.add(previous)
+    refresh_supplier_features(supplier_ids)
+
+
+def refresh_deleted_entry_supplier(sender, instance, origin=None, **kwargs):
+    # Deleting a supplier cascades to its entries and its feature row
+    if isinstance(origin, Supplier):
+        return
+    refresh_supplier_features([instance.supplier_id])
+
+
+def refresh_supplier(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not SUPPLIER_FEATURE_FIELDS.intersection(update_fields):
+        return
+    # A new supplier has no entries and so no features yet
+    if not created:
+        refresh_supplier_features([instance.pk])
+
+
+def connect_signals():
+    post_save.connect(reload_models, sender=MLModel, dispatch_uid='reload_models_save')
+    post_delete.connect(reload_models, sender=MLModel, dispatch_uid='reload_models_delete')
+    pre_save.connect(remember_entry_supplier, sender=EmissionEntry, dispatch_uid='remember_entry_supplier')
+    post_save.connect(refresh_entry_supplier, sender=EmissionEntry, dispatch_uid='refresh_entry_features')
+    post_delete.connect(refresh_deleted_entry_supplier, sender=EmissionEntry, dispatch_uid='refresh_deleted_entry_features')
+    post_save.connect(refresh_supplier, sender=Supplier, dispatch_uid='refresh_supplier_features')
@@ -0,0 +1,661 @@
+import importlib
+import io
+import json
+import tempfile
+from io import StringIO
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from decimal import Decimal
+from unittest import mock
+
+import joblib
+import numpy as np
+from sklearn.ensemble import IsolationForest
+from sklearn.linear_model import LinearRegression
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from api.bulk import bulk_upsert_emission_entries
+from api.tests import QueryBudgetTestCase
+from lambda_functions import ml_batch_prediction
+from lambda_functions.compact_models import load_compact_model
+
+from core.models import Supplier, EmissionEntry
+from jobs.models import Job
+from ml_services.compact import average_path_length, export_compact_model
+from ml_services.forecast_training import build_training_set, load_emission_history
+from ml_services.features import FEATURE_NAMES, FEATURE_VERSION, build_feature_matrix, load_feature_matrix
+from ml_services.models import MLModel, MLPrediction, SupplierFeatures
+from ml_services.registry import ModelUnavailable, prune_versions, registry, save_artifact
+from ml_services.seasonal import fit_holt_winters, forecast_seasonal, month_index, month_start, monthly_history
+from ml_services.services import EmissionForecastService, HotspotPredictor, MLPredictionService
+from saas import api_keys
+from saas.models import APIKey, Tenant, TenantUser
+
+
+def register_hotspot_model(directory, version):
+    """Save a small fitted hotspot model and make it the active one"""
+    path = Path(directory) / f'hotspot_model_v{version}.pkl'
+    joblib.dump(IsolationForest(random_state=0).fit([[i, i % 3, 1, i, 0, 0, 1] for i in range(20)]), path)
+    model = MLModel.objects.create(
+        name='Hotspot Model', model_type='hotspot', version=version, model_path=str(path), is_active=False,
+    )
+    model.activate()
+    return model
+
+
+class ModelRegistryTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = Supplier.objects.create(name='Steel Co', supplier_code='SUP-0', contact_email='s0@example.com')
+        EmissionEntry.objects.create(
+            supplier=cls.supplier, date_reported=timezone.now(), scope3_emissions=Decimal('4.00'), data_source='manual',
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.model_dir = Path(directory.name)
+        registry.clear()
+        self.addCleanup(registry.clear)
+
+    def register_model(self, version):
+        with self.captureOnCommitCallbacks(execute=True):
+            return register_hotspot_model(self.model_dir, version)
+
+    @override_settings(ML_MODEL_REFRESH_INTERVAL=0)
+    def test_models_load_once_and_swap_on_activation(self):
+        first = self.register_model('1')
+        with mock.patch('ml_services.registry.joblib.load', wraps=joblib.load) as load:
+            for _ in range(3):
+                self.assertEqual(registry.get('hotspot').ml_model_id, first.pk)
+            self.assertEqual(load.call_count, 1)
+
+            second = self.register_model('2')
+            prediction = MLPredictionService.create_prediction(self.supplier)
+            self.assertEqual(prediction.model_id, second.pk)
+            self.assertEqual(load.call_count, 2)
+        first.refresh_from_db()
+        self.assertFalse(first.is_active)
+
+    def test_missing_model_is_never_trained_inline(self):
+        with mock.patch.object(HotspotPredictor, 'train') as train, self.assertRaises(ModelUnavailable):
+            MLPredictionService.create_prediction(self.supplier)
+        MLModel.objects.create(name='Hotspot Model', model_type='hotspot', model_path=str(self.model_dir / 'gone.pkl'))
+        with self.assertRaises(ModelUnavailable):
+            registry.get('hotspot')
+        train.assert_not_called()
+
+    def test_artifacts_are_memory_mapped(self):
+        path = self.model_dir / 'emission_predictor.joblib'
+        stored_path = save_artifact(LinearRegression().fit([[0, 1, 2], [1, 2, 3], [2, 0, 1]], [1, 2, 3]), path)
+        self.assertEqual(stored_path, str(path))
+        MLModel.objects.create(name='Forecast', model_type='forecast', model_path=stored_path)
+        loaded = registry.get('forecast')
+        self.assertIsInstance(loaded.estimator.coef_, np.memmap)
+        np.testing.assert_allclose(loaded.estimator.predict([[3, 1, 2]]), [4.0])
+
+    def test_training_keeps_recent_versions_only(self):
+        versions = [self.register_model(str(version)) for version in range(1, 6)]
+        old_prediction = MLPrediction.objects.create(
+            supplier=self.supplier, model=versions[0], predicted_emissions=Decimal('1.00'), confidence_score=Decimal('0.5'),
+            period_start=date(2024, 1, 1), period_end=date(2024, 12, 31),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(prune_versions('hotspot', keep=2), 2)
+        # The active version and the two newest inactive ones remain
+        self.assertEqual(
+            [path.name for path in sorted(self.model_dir.iterdir())],
+            ['hotspot_model_v3.pkl', 'hotspot_model_v4.pkl', 'hotspot_model_v5.pkl'],
+        )
+        # Version 1 keeps its row for the prediction made with it
+        self.assertEqual(set(MLModel.objects.values_list('version', flat=True)), {'1', '3', '4', '5'})
+        self.assertTrue(MLPrediction.objects.filter(pk=old_prediction.pk).exists())
+        self.assertEqual(registry.get('hotspot').ml_model_id, versions[-1].pk)
+        self.assertEqual(prune_versions('hotspot', keep=2), 0)
+
+    def test_model_trained_on_other_features_refuses_to_score(self):
+        model = self.register_model('1')
+        MLModel.objects.filter(pk=model.pk).update(metadata={'feature_version': FEATURE_VERSION + 1})
+        with self.assertRaisesMessage(ModelUnavailable, 'retrain'):
+            MLPredictionService.create_prediction(self.supplier)
+
+
+class CompactModelTests(APITestCase):
+    def test_exported_models_score_identically(self):
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(500, 7)) * [1, 100, 5, 3, 1e4, 0.1, 1]
+        samples = np.vstack([rng.normal(size=(200, 7)) * [1, 100, 5, 3, 1e4, 0.1, 1], X[:20]])
+        samples[0, 2] = np.nan
+        with tempfile.TemporaryDirectory() as directory:
+            for params in [{'contamination': 0.15}, {'max_features': 0.5}]:
+                forest = IsolationForest(random_state=0, **params).fit(X)
+                path = Path(directory) / 'hotspot.npz'
+                export_compact_model(forest, path)
+                compact = load_compact_model(path)
+                np.testing.assert_array_equal(compact.score_samples(samples), forest.score_samples(samples))
+                np.testing.assert_array_equal(compact.predict(samples), forest.predict(samples))
+
+        regression = LinearRegression().fit(X, X @ np.arange(7) + 3)
+        compact = export_compact_model(regression, io.BytesIO())
+        np.testing.assert_allclose(compact.predict(samples[1:]), regression.predict(samples[1:]), rtol=1e-12)
+
+    def test_average_path_length(self):
+        lengths = average_path_length([0, 1, 2, 3, 256])
+        np.testing.assert_allclose(lengths[:3], [0.0, 0.0, 1.0])
+        np.testing.assert_allclose(lengths[3], 2 * (np.log(2) + np.euler_gamma) - 4 / 3)
+        # Grows like 2 ln(n) for large samples
+        self.assertAlmostEqual(lengths[4], 10.2448, places=4)
+
+
+class EmissionModelTrainingTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now() - timedelta(days=400)
+        cls.suppliers = [
+            Supplier.objects.create(name=f'SUP {i}', supplier_code=f'SUP-{i}', contact_email=f's{i}@example.com')
+            for i in range(4)
+        ]
+        # Interleaved dates, so supplier order and date order differ
+        for n in range(4):
+            for i, supplier in enumerate(cls.suppliers[:3]):
+                EmissionEntry.objects.create(
+                    supplier=supplier, date_reported=start + timedelta(days=30 * n + i),
+                    scope3_emissions=Decimal(10 * (i + 1) + n), verified=True,
+                )
+        # Too little history to contribute rows, and unverified entries are ignored
+        for n in range(2):
+            EmissionEntry.objects.create(supplier=cls.suppliers[3], date_reported=start, scope3_emissions=Decimal('1.00'), verified=True)
+            EmissionEntry.objects.create(supplier=cls.suppliers[0], date_reported=start, scope3_emissions=Decimal('99.00'))
+
+    def test_lag_features_match_per_supplier_history(self):
+        X, y, dates = build_training_set(load_emission_history(chunk_size=5))
+        self.assertEqual(len(X), 6)
+        self.assertTrue((np.diff(dates) >= np.timedelta64(0)).all())
+        expected = []
+        for n in (2, 3):
+            for i, supplier in enumerate(self.suppliers[:3]):
+                previous = [10 * (i + 1) + n - 1, 10 * (i + 1) + n - 2]
+                month = (timezone.now() - timedelta(days=400) + timedelta(days=30 * n + i)).month
+                expected.append([supplier.pk, month, sum(previous) / 2, 10 * (i + 1) + n])
+        np.testing.assert_allclose(np.column_stack([X, y]), expected)
+
+    def test_command_records_cross_validation(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(ML_MODELS_DIR=Path(directory)):
+            call_command('train_emission_model', '--cv-folds', '2', '--jobs', '2', stdout=StringIO())
+            model = MLModel.objects.get(model_type='forecast')
+            self.assertEqual(len(model.metadata['cv_rmse']), 2)
+            self.assertEqual(model.training_data_size, 5)
+            self.assertTrue(model.is_active)
+            self.assertTrue((Path(directory) / f'forecast_model_v{model.version}.pkl').exists())
+
+
+class EmissionForecastTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Acme', slug='acme')
+        cls.other_tenant = Tenant.objects.create(name='Other', slug='other')
+        cls.user = User.objects.create_user('analyst', password='secret')
+        TenantUser.objects.create(tenant=cls.tenant, user=cls.user, role='admin')
+        now = timezone.now()
+        cls.suppliers = []
+        for tenant, prefix in [(cls.tenant, 'SUP'), (cls.other_tenant, 'EXT')]:
+            for i in range(3):
+                supplier = Supplier.objects.create(
+                    name=f'{prefix} {i}', supplier_code=f'{prefix}-{i}', contact_email=f'{prefix}{i}@example.com', tenant=tenant,
+                )
+                cls.suppliers.append(supplier)
+                # The last supplier has too little history to forecast
+                for days, amount in [(90, 100), (60, 10 * (i + 1)), (30, 20 * (i + 1))][:3 if i < 2 else 1]:
+                    EmissionEntry.objects.create(
+                        supplier=supplier, date_reported=now - timedelta(days=days),
+                        scope3_emissions=Decimal(amount), verified=True,
+                    )
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Predicts the average of the previous two entries
+        X = np.random.default_rng(0).normal(size=(20, 3))
+        stored_path = save_artifact(LinearRegression().fit(X, X[:, 2]), Path(directory.name) / 'forecast_model_v1.pkl')
+        MLModel.objects.create(
+            name='Forecast', model_type='forecast', version='1', model_path=stored_path, accuracy_score=Decimal('0.8000'),
+        )
+        registry.clear()
+        self.addCleanup(registry.clear)
+
+    def forecast(self, url='/api/suppliers/forecast/', **data):
+        self.authenticate()
+        return self.client.post(url, data, format='json')
+
+    def test_tenant_forecast_is_stored_and_cached(self):
+        response = self.forecast(periods=3)
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        first, second, short = self.suppliers[:3]
+        self.assertEqual(body['skipped'], [short.pk])
+        self.assertEqual(len(body['periods']), 3)
+        # Each month continues from the months predicted before it
+        self.assertEqual(body['forecasts'], [
+            {'supplier_id': first.pk, 'predicted_emissions': [15.0, 17.5, 16.25]},
+            {'supplier_id': second.pk, 'predicted_emissions': [30.0, 35.0, 32.5]},
+        ])
+        self.assertEqual(MLPrediction.objects.count(), 6)
+        self.assertEqual(set(MLPrediction.objects.values_list('confidence_score', flat=True)), {Decimal('0.8000')})
+
+        with mock.patch('ml_services.services.forecast_matrix') as forecast_matrix:
+            self.assertEqual(self.forecast(periods=3).json(), body)
+        forecast_matrix.assert_not_called()
+        self.assertEqual(MLPrediction.objects.count(), 6)
+
+        # New data invalidates the cached forecast
+        EmissionEntry.objects.create(supplier=first, date_reported=timezone.now(), scope3_emissions=Decimal('40'), verified=True)
+        listed = self.client.get('/api/ml/predictions/')
+        body = self.forecast(periods=3).json()
+        self.assertEqual(body['forecasts'][0]['predicted_emissions'], [30.0, 35.0, 32.5])
+        # Rewritten forecasts invalidate the cached predictions list
+        relisted = self.client.get('/api/ml/predictions/', HTTP_IF_NONE_MATCH=listed['ETag'])
+        self.assertEqual(relisted.status_code, 200)
+        self.assertNotEqual(relisted['ETag'], listed['ETag'])
+        # The same months are updated in place rather than stored again
+        self.assertEqual(MLPrediction.objects.count(), 6)
+        self.assertEqual(
+            sorted(MLPrediction.objects.filter(supplier=first).values_list('predicted_emissions', flat=True)),
+            [Decimal('30.00'), Decimal('32.50'), Decimal('35.00')],
+        )
+        # The result is cached under the version its own writes produced
+        with mock.patch('ml_services.services.forecast_matrix') as forecast_matrix:
+            self.assertEqual(self.forecast(periods=3).json(), body)
+        forecast_matrix.assert_not_called()
+
+    def test_migration_dedupes_forecasts(self):
+        migration = importlib.import_module('ml_services.migrations.0005_mlprediction_forecast_period')
+        self.forecast(periods=2)
+        model = MLModel.objects.get(model_type='forecast')
+        kept = list(MLPrediction.objects.order_by('pk'))
+        # Rows stored before the constraint existed, including a duplicate month
+        MLPrediction.objects.update(forecast_period=None)
+        duplicate = MLPrediction.objects.create(
+            model=model, supplier=kept[0].supplier, predicted_emissions=Decimal('1'), confidence_score=Decimal('0.5'),
+            period_start=kept[0].period_start, period_end=kept[0].period_end,
+        )
+        hotspots = MLModel.objects.create(name='Hotspots', model_type='hotspot', version='1', model_path='hotspot.pkl')
+        scores = [
+            MLPrediction.objects.create(
+                model=hotspots, supplier=kept[0].supplier, predicted_emissions=Decimal('1'), confidence_score=Decimal('0.5'),
+                period_start=kept[0].period_start, period_end=kept[0].period_end,
+            )
+            for _ in range(2)
+        ]
+        migration.dedupe_forecasts(apps, None)
+        self.assertFalse(MLPrediction.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual(
+            list(MLPrediction.objects.filter(model=model).order_by('pk').values_list('pk', 'forecast_period')),
+            [(row.pk, row.period_start) for row in kept],
+        )
+        # Hotspot scores keep their history
+        self.assertEqual(
+            list(MLPrediction.objects.filter(model=hotspots).order_by('pk').values_list('pk', 'forecast_period')),
+            [(score.pk, None) for score in scores],
+        )
+
+    def test_requested_suppliers_only(self):
+        first, other = self.suppliers[0], self.suppliers[3]
+        body = self.forecast(supplier_ids=[first.pk, other.pk], periods=1).json()
+        self.assertEqual(body['forecasts'], [{'supplier_id': first.pk, 'predicted_emissions': [15.0]}])
+        body = self.forecast(f'/api/suppliers/{first.pk}/forecast/').json()
+        self.assertEqual(len(body['forecasts'][0]['predicted_emissions']), 12)
+        self.assertEqual(self.forecast(f'/api/suppliers/{other.pk}/forecast/').status_code, 404)
+
+    def test_invalid_requests(self):
+        for data in [{'periods': 0}, {'periods': 37}, {'periods': 'soon'}, {'supplier_ids': 'all'}]:
+            self.assertEqual(self.forecast(**data).status_code, 400, data)
+        MLModel.objects.update(is_active=False)
+        registry.clear()
+        self.assertEqual(self.forecast().status_code, 503)
+
+
+class SeasonalForecastTests(APITestCase):
+    def test_seasonal_series_is_continued(self):
+        pattern = np.array([5, 3, 0, -2, -6, -8, -6, -2, 0, 3, 6, 7], dtype=float)
+        history = np.tile(50 + pattern, 3)[None, :].repeat(2, axis=0)
+        history[1, :5] = np.nan
+        # Columns start in April
+        forecasts, _, rmse = fit_holt_winters(history, 3, 14)
+        expected = 50 + pattern[np.arange(36, 50) % 12]
+        np.testing.assert_allclose(forecasts, [expected, expected], atol=1e-9)
+        np.testing.assert_allclose(rmse, [0, 0], atol=1e-9)
+
+    def test_chunks_and_processes_match_single_supplier_fits(self):
+        rng = np.random.default_rng(0)
+        history = rng.uniform(10, 100, (7, 30))
+        history[rng.random(history.shape) < 0.2] = np.nan
+        history[:, 0] = 20.0
+        history[3, :29] = np.nan
+        forecasts, parameters, rmse = forecast_seasonal(history, 0, 6, processes=2, chunk_size=3)
+        for row, expected in zip(history, zip(forecasts, parameters, rmse)):
+            single = fit_holt_winters(row[None, :], 0, 6)
+            for actual, value in zip(single, expected):
+                np.testing.assert_allclose(actual[0], value)
+        self.assertTrue(np.isnan(rmse[3]))
+        self.assertTrue((forecasts >= 0).all())
+
+    def test_monthly_history_sums_verified_entries(self):
+        steel = Supplier.objects.create(name='Steel Co', supplier_code='SUP-0', contact_email='s0@example.com')
+        glass = Supplier.objects.create(name='Glass Co', supplier_code='SUP-1', contact_email='s1@example.com')
+        for supplier, day, amount, verified in [
+            (steel, date(2024, 1, 5), '10.00', True), (steel, date(2024, 1, 20), '5.00', True),
+            (steel, date(2024, 3, 1), '7.00', True), (steel, date(2024, 2, 1), '99.00', False),
+            (glass, date(2024, 2, 10), '4.00', True), (glass, date(2024, 4, 2), '8.00', True),
+            (glass, date(2023, 9, 1), '1.00', True),
+        ]:
+            EmissionEntry.objects.create(
+                supplier=supplier, scope3_emissions=Decimal(amount), verified=verified,
+                date_reported=timezone.make_aware(datetime(day.year, day.month, day.day, 12)),
+            )
+        ids, first_month, history = monthly_history(end=date(2024, 4, 15), months=3)
+        self.assertEqual(ids.tolist(), [steel.pk, glass.pk])
+        self.assertEqual(first_month, date(2024, 1, 1))
+        np.testing.assert_array_equal(history, [[15.0, np.nan, 7.0], [np.nan, 4.0, np.nan]])
+        ids, _, _ = monthly_history(Supplier.objects.filter(pk=glass.pk), end=date(2024, 4, 15), months=3)
+        self.assertEqual(ids.tolist(), [glass.pk])
+
+    def test_forecasts_are_stored_once_per_month(self):
+        tenant = Tenant.objects.create(name='Acme', slug='acme')
+        steel = Supplier.objects.create(name='Steel Co', supplier_code='SUP-0', contact_email='s0@example.com', tenant=tenant)
+        Supplier.objects.create(name='Idle Co', supplier_code='SUP-1', contact_email='s1@example.com')
+        current = month_index(timezone.localdate())
+        for months_ago in range(1, 25):
+            day = month_start(current - months_ago)
+            EmissionEntry.objects.create(
+                supplier=steel, scope3_emissions=Decimal(50 + day.month), verified=True,
+                date_reported=timezone.make_aware(datetime(day.year, day.month, 10, 12)),
+            )
+
+        with mock.patch('ml_services.services.bump_data_version') as bump_data_version:
+            self.assertEqual(EmissionForecastService.forecast_seasonal(Supplier.objects.all(), 3), 1)
+        bump_data_version.assert_called_once_with(tenant.pk)
+        # Unchanged forecasts leave cached responses alone
+        with mock.patch('ml_services.services.bump_data_version') as bump_data_version:
+            call_command('forecast_seasonal', periods=3, processes=1, stdout=StringIO())
+        bump_data_version.assert_not_called()
+        predictions = MLPrediction.objects.filter(supplier=steel).order_by('period_start')
+        self.assertEqual([p.period_start for p in predictions], [month_start(current + i) for i in range(3)])
+        self.assertEqual({p.model.model_type for p in predictions}, {'seasonal_forecast'})
+        # The monthly pattern repeats exactly, so the forecasts continue it
+        self.assertEqual([p.predicted_emissions for p in predictions], [Decimal(50 + p.period_start.month) for p in predictions])
+        self.assertEqual({p.confidence_score for p in predictions}, {Decimal('1.0000')})
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+
+class FakeSQS:
+    """Accepts messages, failing the ids in ``failures`` once with the given sender fault flag"""
+
+    def __init__(self, failures=None):
+        self.failures = dict(failures or {})
+        self.calls = []
+        self.messages = []
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.calls.append([entry['Id'] for entry in Entries])
+        failed = []
+        for entry in Entries:
+            if entry['Id'] in self.failures:
+                failed.append({'Id': entry['Id'], 'SenderFault': self.failures[entry['Id']], 'Code': 'Test'})
+                if not self.failures[entry['Id']]:
+                    del self.failures[entry['Id']]
+            else:
+                self.messages.append(json.loads(entry['MessageBody']))
+        return {'Successful': [], 'Failed': failed}
+
+
+class FakeContext:
+    invoked_function_arn = 'arn:aws:lambda:us-east-1:000000000000:function:ml-batch'
+
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+class BatchPredictionLambdaTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Acme', slug='acme')
+        other = Tenant.objects.create(name='Other', slug='other')
+        now = timezone.now()
+        cls.suppliers = []
+        for i in range(5):
+            supplier = Supplier.objects.create(
+                name=f'SUP {i}', supplier_code=f'SUP-{i}', contact_email=f's{i}@example.com',
+                tenant=cls.tenant, annual_spend=Decimal(1000 * (i + 1)),
+            )
+            EmissionEntry.objects.create(supplier=supplier, date_reported=now, scope3_emissions=Decimal(10 ** i))
+            cls.suppliers.append(supplier)
+        external = Supplier.objects.create(name='EXT', supplier_code='EXT-0', contact_email='e@example.com', tenant=other)
+        EmissionEntry.objects.create(supplier=external, date_reported=now, scope3_emissions=Decimal('5.00'))
+
+    def setUp(self):
+        api_keys.clear_cache()
+        self.addCleanup(api_keys.clear_cache)
+        _, raw_key = APIKey.create_key(self.tenant, 'Batch predictions')
+        rng = np.random.default_rng(0)
+        self.forest = IsolationForest(random_state=0, contamination=0.15).fit(rng.normal(size=(100, 7)) * 1000)
+        buffer = io.BytesIO()
+        export_compact_model(self.forest, buffer)
+        self.lambda_client = mock.Mock()
+        self.clients = {
+            's3': FakeS3({ml_batch_prediction.MODEL_KEY: buffer.getvalue()}),
+            'sqs': FakeSQS(),
+            'lambda': self.lambda_client,
+            'api': mock.Mock(fetch=lambda after=None, limit=None: self.client.get(
+                '/api/suppliers/features/', {'after': after or '', 'limit': limit}, HTTP_X_API_KEY=raw_key,
+            ).json()),
+        }
+        for name, value in [('_model', None), ('PAGE_SIZE', 2), ('RETRY_DELAY', 0)]:
+            patcher = mock.patch.object(ml_batch_prediction, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_batch(self, event=None, remaining_ms=300000):
+        with mock.patch('builtins.print'):
+            result = ml_batch_prediction.run_batch(event or {}, FakeContext(remaining_ms), self.clients)
+        return json.loads(result['body'])
+
+    def test_pages_are_scored_and_published_in_batches(self):
+        body = self.run_batch()
+        self.assertEqual((body['scored'], body['published'], body['failed']), (5, 5, 0))
+        messages = self.clients['sqs'].messages
+        self.assertEqual(sorted(m['supplier_id'] for m in messages), [s.pk for s in self.suppliers])
+        _, X = load_feature_matrix(self.suppliers)
+        expected = self.forest.predict(X) == -1
+        self.assertEqual([m['is_hotspot'] for m in sorted(messages, key=lambda m: m['supplier_id'])], expected.tolist())
+        self.lambda_client.invoke.assert_not_called()
+
+    def test_failed_entries_are_retried(self):
+        first, second = (str(s.pk) for s in self.suppliers[:2])
+        self.clients['sqs'] = FakeSQS({first: False, second: True})
+        with mock.patch.object(ml_batch_prediction, 'PAGE_SIZE', 10):
+            body = self.run_batch()
+        self.assertEqual((body['published'], body['failed']), (4, 1))
+        # Only the retryable entry is sent again
+        self.assertEqual(self.clients['sqs'].calls[1], [first])
+
+    def test_hands_over_to_a_new_invocation_when_out_of_time(self):
+        body = self.run_batch(remaining_ms=1000)
+        self.assertEqual((body['scored'], body['next_cursor']), (2, self.suppliers[1].pk))
+        payload = json.loads(self.lambda_client.invoke.call_args.kwargs['Payload'])
+        self.assertEqual(payload, {'run_id': body['run_id'], 'cursor': self.suppliers[1].pk})
+
+        body = self.run_batch(payload)
+        self.assertEqual((body['scored'], body['next_cursor']), (3, None))
+        self.assertEqual(len(self.clients['sqs'].messages), 5)
+
+
+class HotspotFeatureTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.steel = Supplier.objects.create(
+            name='Steel Co', supplier_code='SUP-0', contact_email='s0@example.com', region='EU',
+            annual_spend=Decimal('1000.00'), emission_factor=Decimal('0.4500'),
+        )
+        cls.idle = Supplier.objects.create(name='Idle Co', supplier_code='SUP-1', contact_email='s1@example.com')
+        cls.glass = Supplier.objects.create(name='Glass Co', supplier_code='SUP-2', contact_email='s2@example.com')
+        for days, amount in [(1, '10.00'), (2, '20.00'), (3, '30.00'), (4, '100.00')]:
+            EmissionEntry.objects.create(supplier=cls.steel, date_reported=now - timedelta(days=days), scope3_emissions=Decimal(amount))
+        EmissionEntry.objects.create(supplier=cls.glass, date_reported=now, scope3_emissions=Decimal('5.00'))
+
+    def test_one_query_builds_features_for_all_suppliers(self):
+        with self.assertNumQueries(1):
+            ids, X = build_feature_matrix(Supplier.objects.all())
+        self.assertEqual(ids.tolist(), [self.steel.pk, self.glass.pk])
+        # avg, total, count, avg of the three most recent, spend, emission factor, has region
+        np.testing.assert_allclose(X, [
+            [40.0, 160.0, 4, 20.0, 1000.0, 0.45, 1],
+            [5.0, 5.0, 1, 5.0, 0.0, 0.0, 0],
+        ])
+        self.assertEqual(build_feature_matrix([self.idle.pk])[1].shape, (0, len(FEATURE_NAMES)))
+
+    def assertStoreCurrent(self):
+        ids, X = load_feature_matrix()
+        expected_ids, expected_X = build_feature_matrix()
+        self.assertEqual(ids.tolist(), expected_ids.tolist())
+        np.testing.assert_allclose(X, expected_X)
+
+    def test_store_follows_entry_changes(self):
+        self.assertStoreCurrent()
+        self.assertEqual(SupplierFeatures.objects.get(pk=self.steel.pk).feature_version, FEATURE_VERSION)
+
+        entry = EmissionEntry.objects.create(supplier=self.idle, date_reported=timezone.now(), scope3_emissions=Decimal('7.00'))
+        self.assertStoreCurrent()
+        # Moving an entry refreshes both suppliers
+        entry.supplier = self.glass
+        entry.save()
+        self.assertFalse(SupplierFeatures.objects.filter(pk=self.idle.pk).exists())
+        self.assertEqual(SupplierFeatures.objects.get(pk=self.glass.pk).entry_count, 2)
+        entry.delete()
+        self.assertStoreCurrent()
+
+        self.steel.region = ''
+        self.steel.save()
+        self.assertStoreCurrent()
+        self.assertFalse(SupplierFeatures.objects.get(pk=self.steel.pk).has_region)
+
+    def test_moving_loaded_entry_needs_no_lookup(self):
+        entry = EmissionEntry.objects.get(supplier=self.glass)
+        entry.supplier = self.idle
+        with CaptureQueriesContext(connection) as queries:
+            entry.save()
+        # Only the feature refresh reads; the previous supplier was known from loading
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('SELECT')]), 1)
+        self.assertFalse(SupplierFeatures.objects.filter(pk=self.glass.pk).exists())
+        # The next move starts from the supplier just saved
+        entry.supplier = self.steel
+        entry.save()
+        self.assertStoreCurrent()
+
+    def test_migration_backfills_store(self):
+        migration = importlib.import_module('ml_services.migrations.0003_backfill_supplier_features')
+        SupplierFeatures.objects.all().delete()
+        migration.backfill_supplier_features(apps, None)
+        self.assertStoreCurrent()
+        self.assertEqual(migration.FEATURE_VERSION, FEATURE_VERSION)
+
+    def test_bulk_writes_refresh_store(self):
+        entry = EmissionEntry.objects.filter(supplier=self.glass).get()
+        result = bulk_upsert_emission_entries([
+            {'supplier': self.idle.pk, 'date_reported': timezone.now().isoformat(), 'scope3_emissions': '3.00'},
+            {'id': entry.pk, 'supplier': self.steel.pk},
+        ], tenant=None)
+        self.assertFalse(result.has_errors(), result.as_dict())
+        self.assertStoreCurrent()
+        self.assertFalse(SupplierFeatures.objects.filter(pk=self.glass.pk).exists())
+
+    def test_training_reads_store(self):
+        SupplierFeatures.objects.filter(pk=self.glass.pk).delete()
+        with mock.patch.object(HotspotPredictor, 'MIN_TRAINING_SUPPLIERS', 1), self.assertNumQueries(1):
+            _, training_size = HotspotPredictor.train()
+        self.assertEqual(training_size, 1)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class BatchScoringTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Acme', slug='acme')
+        cls.other_tenant = Tenant.objects.create(name='Other', slug='other')
+        cls.user = User.objects.create_user('analyst', password='secret')
+        TenantUser.objects.create(tenant=cls.tenant, user=cls.user, role='admin')
+        now = timezone.now()
+        for tenant, prefix in [(cls.tenant, 'SUP'), (cls.other_tenant, 'EXT')]:
+            for i in range(4):
+                supplier = Supplier.objects.create(
+                    name=f'{prefix} {i}', supplier_code=f'{prefix}-{i}', contact_email=f'{prefix}{i}@example.com',
+                    tenant=tenant, annual_spend=Decimal(1000 * (i + 1)),
+                )
+                # The last supplier has no emission data
+                for days in range(i if i < 3 else 0):
+                    EmissionEntry.objects.create(
+                        supplier=supplier, date_reported=now - timedelta(days=days),
+                        scope3_emissions=Decimal(10 ** (i + 1)),
+                    )
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        register_hotspot_model(directory.name, '1')
+        registry.clear()
+        self.addCleanup(registry.clear)
+
+    def test_batch_matches_one_at_a_time_scoring(self):
+        suppliers = Supplier.objects.filter(tenant=self.tenant).order_by('pk')
+        batch = {p.supplier_id: p for p in MLPredictionService.score_suppliers(suppliers)}
+        self.assertEqual(len(batch), 4)
+        for supplier in suppliers:
+            single = MLPredictionService.create_prediction(supplier)
+            single.refresh_from_db()
+            scored = batch[supplier.pk]
+            self.assertEqual(
+                (scored.is_hotspot, scored.confidence_score, scored.predicted_emissions, scored.input_features),
+                (single.is_hotspot, single.confidence_score, single.predicted_emissions, single.input_features),
+            )
+        self.assertEqual(MLPrediction.objects.filter(supplier__tenant=self.other_tenant).count(), 0)
+
+    def test_api_action_scores_the_tenant(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/suppliers/score_hotspots/')
+        self.assertEqual(response.status_code, 202, response.content)
+        job = Job.objects.get(pk=response.json()['job_id'])
+        self.assertEqual((job.status, job.result['scored']), ('succeeded', 4), job.error)
+        self.assertEqual(set(MLPrediction.objects.values_list('supplier__tenant', flat=True)), {self.tenant.pk})
+
+    def test_command_scores_each_tenant(self):
+        Supplier.objects.create(name='Legacy', supplier_code='OLD-0', contact_email='old@example.com')
+        out = StringIO()
+        call_command('score_hotspots', stdout=out)
+        self.assertIn('Acme: 4 suppliers scored', out.getvalue())
+        self.assertIn('Other: 4 suppliers scored', out.getvalue())
+        self.assertIn('Suppliers without a tenant: 1 suppliers scored', out.getvalue())
+        self.assertEqual(MLPrediction.objects.count(), 9)
+
+        call_command('score_hotspots', '--tenant', 'acme', stdout=out)
+        self.assertEqual(MLPrediction.objects.count(), 13)
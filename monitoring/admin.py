@@ -0,0 +1,58 @@
+from django.contrib import admin
+from django.http import Http404, HttpResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from .models import ProfilingRule, RequestProfile
+from .profiling import render_call_tree
+
+
+@admin.register(ProfilingRule)
+class ProfilingRuleAdmin(admin.ModelAdmin):
+    list_display = ['name', 'path_pattern', 'sample_percent', 'remaining', 'is_active', 'expires_at', 'created_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'path_pattern']
+    readonly_fields = ['created_by', 'created_at']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'endpoint', 'status_code', 'duration_ms', 'sample_count', 'trigger', 'user']
+    list_filter = ['trigger', 'method', 'endpoint']
+    search_fields = ['path', 'endpoint']
+    exclude = ['stacks']
+    readonly_fields = [
+        'method', 'path', 'query_string', 'endpoint', 'status_code', 'user', 'trigger', 'rule',
+        'duration_ms', 'sample_count', 'interval_ms', 'created_at', 'collapsed_stacks', 'call_tree',
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path('<int:pk>/stacks/', self.admin_site.admin_view(self.download_stacks), name='monitoring_requestprofile_stacks'),
+        ]
+        return urls + super().get_urls()
+
+    def download_stacks(self, request, pk):
+        profile = self.get_object(request, pk)
+        if profile is None:
+            raise Http404(f'No request profile {pk}')
+        response = HttpResponse(profile.stacks, content_type='text/plain')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.folded"'
+        return response
+
+    @admin.display(description='Collapsed stacks')
+    def collapsed_stacks(self, obj):
+        url = reverse('admin:monitoring_requestprofile_stacks', args=[obj.pk])
+        return format_html('<a href="{}">Download</a> (flamegraph.pl / speedscope input)', url)
+
+    @admin.display(description='Call tree')
+    def call_tree(self, obj):
+        return format_html('<pre style="font-size: 11px; overflow-x: auto">{}</pre>', render_call_tree(obj.stacks))
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class MonitoringConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'monitoring'
+    verbose_name = 'Monitoring'
+
+    def ready(self):
+        from .signals import connect_signals
+        connect_signals()
+        from . import collectors  # noqa: F401 (registers scrape-time metrics)
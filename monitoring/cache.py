@@ -0,0 +1,41 @@
+"""
+Cache backends that count hits and misses
+
+Lookups are counted in the cache_requests_total metric and, during a
+sampled request, in its timings.
+
+Drop-in replacements for Django's backends; point CACHES[...]['BACKEND'] at
+the class matching the backend in use.
+"""
+from django.core.cache.backends import locmem, redis
+
+from .metrics import cache_requests
+from .timing import record_cache_lookup
+
+_MISSING = object()
+
+
+def _record(hit):
+    cache_requests.inc('hit' if hit else 'miss')
+    record_cache_lookup(hit)
+
+
+class InstrumentedCacheMixin:
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version=version)
+        _record(value is not _MISSING)
+        return default if value is _MISSING else value
+
+
+class LocMemCache(InstrumentedCacheMixin, locmem.LocMemCache):
+    pass
+
+
+class RedisCache(InstrumentedCacheMixin, redis.RedisCache):
+    def get_many(self, keys, version=None):
+        # The Redis backend fetches many keys in one round trip, bypassing get()
+        keys = list(keys)
+        found = super().get_many(keys, version=version)
+        for key in keys:
+            _record(key in found)
+        return found
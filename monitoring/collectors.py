@@ -0,0 +1,15 @@
+"""
+Metrics computed when /metrics is scraped
+"""
+from django.db.models import Count
+
+from jobs.models import Job
+from .metrics import jobs_active, register_collector
+
+
+@register_collector
+def job_queue_depth():
+    counts = dict(
+        Job.objects.filter(status__in=Job.ACTIVE_STATUSES).values_list('status').annotate(count=Count('pk')).order_by()
+    )
+    return [(jobs_active, {(status,): counts.get(status, 0) for status in Job.ACTIVE_STATUSES})]
@@ -0,0 +1,147 @@
+"""
+Request timing and profiling middleware
+"""
+import logging
+import random
+from time import perf_counter
+
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.authentication import CachedTokenAuthentication
+from core.tasks import submit
+from .metrics import request_db_duration, request_db_queries, request_duration
+from .profiling import SamplingProfiler, match_rule, save_profile
+from .timing import collect
+
+logger = logging.getLogger('monitoring.requests')
+
+
+def get_endpoint(request):
+    """Label a request by its URL name, keeping histogram cardinality bounded"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match._func_path
+
+
+def server_timing(total, timings):
+    entries = [
+        f'total;dur={total * 1000:.1f}',
+        f'db;dur={timings.db_time * 1000:.1f};desc="{timings.db_queries} queries"',
+        f'cache;desc="{timings.cache_hits} hits, {timings.cache_misses} misses"',
+    ]
+    entries += [f'{name};dur={duration * 1000:.1f}' for name, duration in timings.spans.items()]
+    return ', '.join(entries)
+
+
+class RequestTimingMiddleware:
+    """Record wall time for every request and a detailed breakdown for a sample.
+
+    Every request's wall time goes into the per-endpoint latency histogram.
+    A REQUEST_TIMING_SAMPLE_RATE fraction of requests also records query
+    count and time, cache hits and misses and serializer time, reported in a
+    ``Server-Timing`` header and a log line on the ``monitoring.requests``
+    logger. Place it first so the other middleware is timed as well.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 1.0)
+        self.send_header = getattr(settings, 'REQUEST_TIMING_HEADER', True)
+
+    def __call__(self, request):
+        start = perf_counter()
+        if random.random() >= self.sample_rate:
+            response = self.get_response(request)
+            request_duration.observe(perf_counter() - start, request.method, get_endpoint(request))
+            return response
+
+        with collect() as timings:
+            response = self.get_response(request)
+        total = perf_counter() - start
+        endpoint = get_endpoint(request)
+        request_duration.observe(total, request.method, endpoint)
+        request_db_duration.observe(timings.db_time, request.method, endpoint)
+        request_db_queries.observe(timings.db_queries, request.method, endpoint)
+
+        if self.send_header:
+            header = server_timing(total, timings)
+            if response.has_header('Server-Timing'):
+                header = f"{response['Server-Timing']}, {header}"
+            response['Server-Timing'] = header
+        logger.info(
+            f"{request.method} {request.path} {response.status_code} endpoint={endpoint} "
+            f"total_ms={total * 1000:.1f} db_queries={timings.db_queries} db_ms={timings.db_time * 1000:.1f} "
+            f"cache_hits={timings.cache_hits} cache_misses={timings.cache_misses} "
+            + ' '.join(f"{name}_ms={duration * 1000:.1f}" for name, duration in timings.spans.items()),
+            extra={
+                'endpoint': endpoint,
+                'status_code': response.status_code,
+                'duration_ms': round(total * 1000, 1),
+                'db_queries': timings.db_queries,
+                'db_ms': round(timings.db_time * 1000, 1),
+                'cache_hits': timings.cache_hits,
+                'cache_misses': timings.cache_misses,
+                'spans_ms': {name: round(duration * 1000, 1) for name, duration in timings.spans.items()},
+            },
+        )
+        return response
+
+
+def is_staff_request(request):
+    """Whether the session user, or the user of the request's token, is staff"""
+    if getattr(request.user, 'is_staff', False):
+        return True
+    if 'Authorization' not in request.headers:
+        return False
+    # Token credentials are otherwise only checked once the DRF view runs
+    try:
+        authenticated = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+class ProfilingMiddleware:
+    """Profile requests selected by the profiling header or an active rule.
+
+    The PROFILING_HEADER header only starts the profiler for staff, signed
+    in by session or token. Profiles are written on the background worker
+    pool. Place it after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = getattr(settings, 'PROFILING_HEADER', 'X-Profile')
+
+    def __call__(self, request):
+        rule_id = None
+        if self.header in request.headers:
+            trigger = 'header'
+            if not is_staff_request(request):
+                return self.get_response(request)
+        else:
+            rule_id = match_rule(request.path)
+            if rule_id is None:
+                return self.get_response(request)
+            trigger = 'rule'
+
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+
+        # DRF copies the user it authenticated back onto the request
+        user = request.user
+        submit(
+            save_profile, rule_id=rule_id, trigger=trigger,
+            method=request.method, path=request.path, query_string=request.META.get('QUERY_STRING', ''),
+            endpoint=get_endpoint(request), status_code=response.status_code,
+            user_id=user.pk if getattr(user, 'is_authenticated', False) else None,
+            duration_ms=profiler.duration * 1000, sample_count=sum(profiler.samples.values()),
+            interval_ms=profiler.interval * 1000, stacks=profiler.collapsed(),
+        )
+        return response
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfilingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('path_pattern', models.CharField(help_text='Regular expression matched against the request path', max_length=255)),
+                ('sample_percent', models.FloatField(default=100, help_text='Percentage of matching requests to profile')),
+                ('remaining', models.PositiveIntegerField(blank=True, help_text='Stop after this many profiles (leave empty for no limit)', null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=2048)),
+                ('query_string', models.TextField(blank=True)),
+                ('endpoint', models.CharField(blank=True, help_text='URL name of the view', max_length=255)),
+                ('status_code', models.PositiveSmallIntegerField(null=True)),
+                ('trigger', models.CharField(choices=[('header', 'Request header'), ('rule', 'Profiling rule')], max_length=10)),
+                ('duration_ms', models.FloatField()),
+                ('sample_count', models.PositiveIntegerField()),
+                ('interval_ms', models.FloatField()),
+                ('stacks', models.TextField(help_text='Collapsed stacks (frame;frame;frame count), the flamegraph input format')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('rule', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='profiles', to='monitoring.profilingrule')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
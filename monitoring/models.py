@@ -0,0 +1,61 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import models
+
+
+class ProfilingRule(models.Model):
+    """Profile a percentage of the requests whose path matches a pattern"""
+    name = models.CharField(max_length=100)
+    path_pattern = models.CharField(max_length=255, help_text="Regular expression matched against the request path")
+    sample_percent = models.FloatField(default=100, help_text="Percentage of matching requests to profile")
+    remaining = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Stop after this many profiles (leave empty for no limit)",
+    )
+    is_active = models.BooleanField(default=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.name} ({self.path_pattern}, {self.sample_percent:g}%)"
+
+    def clean(self):
+        try:
+            re.compile(self.path_pattern)
+        except re.error as e:
+            raise ValidationError({'path_pattern': f"Invalid regular expression: {e}"})
+        if not 0 < self.sample_percent <= 100:
+            raise ValidationError({'sample_percent': "Must be greater than 0 and at most 100"})
+
+
+class RequestProfile(models.Model):
+    """Sampled call stacks captured while handling one request"""
+    TRIGGER_CHOICES = [
+        ('header', 'Request header'),
+        ('rule', 'Profiling rule'),
+    ]
+
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2048)
+    query_string = models.TextField(blank=True)
+    endpoint = models.CharField(max_length=255, blank=True, help_text="URL name of the view")
+    status_code = models.PositiveSmallIntegerField(null=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    rule = models.ForeignKey(ProfilingRule, on_delete=models.SET_NULL, null=True, blank=True, related_name='profiles')
+    duration_ms = models.FloatField()
+    sample_count = models.PositiveIntegerField()
+    interval_ms = models.FloatField()
+    stacks = models.TextField(help_text="Collapsed stacks (frame;frame;frame count), the flamegraph input format")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
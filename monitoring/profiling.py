@@ -0,0 +1,186 @@
+"""
+Sampling profiler for individual requests
+
+While a profiled request runs, a helper thread snapshots the request
+thread's stack every PROFILING_INTERVAL seconds via ``sys._current_frames``
+and counts identical stacks. The request itself is not instrumented, so a
+profile costs a few percent of one request and nothing for the others.
+Results are stored as collapsed stacks (the input format of flamegraph.pl
+and speedscope) and rendered as a call tree in the admin.
+
+Profiling is triggered per request by the PROFILING_HEADER header (honoured
+for staff users only) or by active ``ProfilingRule`` rows, which are cached
+per process for PROFILING_RULES_REFRESH seconds.
+"""
+import logging
+import random
+import re
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ProfilingRule, RequestProfile
+
+logger = logging.getLogger(__name__)
+
+MAX_DEPTH = 200
+
+_rules_lock = threading.Lock()
+_rules = []
+_rules_loaded_at = None
+_frame_labels = {}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _path_prefixes():
+    paths = {str(settings.BASE_DIR)} | set(sysconfig.get_paths().values()) | {p for p in sys.path if p}
+    return sorted(paths, key=len, reverse=True)
+
+
+def _frame_label(code, prefixes):
+    label = _frame_labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        for prefix in prefixes:
+            if filename.startswith(prefix):
+                filename = filename[len(prefix):].lstrip('/\\')
+                break
+        # Semicolons separate frames in the collapsed format
+        label = f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(';', ':')
+        _frame_labels[code] = label
+    return label
+
+
+class SamplingProfiler:
+    """Sample one thread's call stack at a fixed interval"""
+
+    def __init__(self, thread_id=None, interval=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval or _setting('PROFILING_INTERVAL', 0.005)
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self.started_at = self.duration = None
+
+    def _run(self):
+        prefixes = _path_prefixes()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(_frame_label(frame.f_code, prefixes))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def collapsed(self):
+        """Return the samples as collapsed stacks, most frequent first"""
+        return '\n'.join(f"{';'.join(stack)} {count}" for stack, count in self.samples.most_common())
+
+
+def render_call_tree(stacks, min_percent=1.0):
+    """Render collapsed stacks as an indented call tree with inclusive sample percentages"""
+    tree = {}
+    total = 0
+    for line in stacks.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if not stack:
+            continue
+        count = int(count)
+        total += count
+        node = tree
+        for frame in stack.split(';'):
+            entry = node.setdefault(frame, [0, {}])
+            entry[0] += count
+            node = entry[1]
+    if not total:
+        return ''
+
+    lines = []
+
+    def walk(node, depth):
+        for frame, (count, children) in sorted(node.items(), key=lambda item: -item[1][0]):
+            percent = 100 * count / total
+            if percent < min_percent:
+                continue
+            lines.append(f"{percent:5.1f}% {count:>6}  {'  ' * depth}{frame}")
+            walk(children, depth + 1)
+
+    walk(tree, 0)
+    return '\n'.join(lines)
+
+
+def _active_rules():
+    global _rules, _rules_loaded_at
+    now = time.monotonic()
+    with _rules_lock:
+        if _rules_loaded_at is not None and now - _rules_loaded_at < _setting('PROFILING_RULES_REFRESH', 10):
+            return _rules
+        _rules_loaded_at = now
+    try:
+        rules = [
+            (pk, re.compile(pattern), percent, expires_at)
+            for pk, pattern, percent, expires_at in ProfilingRule.objects.filter(is_active=True).values_list(
+                'pk', 'path_pattern', 'sample_percent', 'expires_at',
+            )
+        ]
+    except Exception as e:
+        logger.warning(f"Could not load profiling rules: {e}")
+        rules = []
+    with _rules_lock:
+        _rules = rules
+    return rules
+
+
+def match_rule(path):
+    """Return the id of a rule selecting this request for profiling, or None"""
+    now = None
+    for rule_id, pattern, percent, expires_at in _active_rules():
+        if not pattern.search(path) or random.random() * 100 >= percent:
+            continue
+        if expires_at is not None:
+            now = now or timezone.now()
+            if expires_at <= now:
+                continue
+        return rule_id
+    return None
+
+
+def clear_rules():
+    """Reload rules on the next request in this process"""
+    global _rules_loaded_at
+    with _rules_lock:
+        _rules_loaded_at = None
+
+
+def save_profile(rule_id=None, **fields):
+    """Store a profile; rules with a remaining count give up one profile each"""
+    if rule_id is not None:
+        rules = ProfilingRule.objects.filter(pk=rule_id, is_active=True)
+        limited = rules.filter(remaining__isnull=False)
+        if limited.exists():
+            if not limited.filter(remaining__gt=0).update(remaining=F('remaining') - 1):
+                # Another process used up the rule first
+                return None
+            if limited.filter(remaining=0).update(is_active=False):
+                clear_rules()
+    return RequestProfile.objects.create(rule_id=rule_id, **fields)
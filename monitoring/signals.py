@@ -0,0 +1,17 @@
+"""
+Signal handlers for monitoring
+"""
+from django.db.models.signals import post_delete, post_save
+
+from .models import ProfilingRule
+from .profiling import clear_rules
+
+
+def reload_profiling_rules(sender, instance, **kwargs):
+    # Other processes pick the change up within PROFILING_RULES_REFRESH seconds
+    clear_rules()
+
+
+def connect_signals():
+    post_save.connect(reload_profiling_rules, sender=ProfilingRule, dispatch_uid='reload_profiling_rules_save')
+    post_delete.connect(reload_profiling_rules, sender=ProfilingRule, dispatch_uid='reload_profiling_rules_delete')
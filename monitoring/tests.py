@@ -0,0 +1,196 @@
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api.tests import QueryBudgetTestCase
+
+from core.models import Supplier
+from monitoring import profiling
+from monitoring.metrics import (
+    REQUEST_HISTOGRAMS, background_tasks_pending, clear_snapshots, collect, iot_readings_ingested, request_db_queries,
+    request_duration,
+)
+from monitoring.models import ProfilingRule, RequestProfile
+from saas.auth import get_cached_user
+from saas.models import Tenant, TenantUser
+
+
+class RequestTimingTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Acme', slug='acme')
+        cls.user = User.objects.create_user('analyst', password='secret', is_staff=True)
+        TenantUser.objects.create(tenant=cls.tenant, user=cls.user, role='admin')
+        Supplier.objects.create(name='Steel Co', supplier_code='SUP-0', contact_email='s0@example.com', tenant=cls.tenant)
+
+    def setUp(self):
+        super().setUp()
+        for histogram in REQUEST_HISTOGRAMS:
+            histogram.clear()
+
+    def test_sampled_request_reports_server_timing_and_logs(self):
+        self.authenticate()
+        get_cached_user(self.user.pk)
+        with self.assertLogs('monitoring.requests', 'INFO') as logs:
+            response = self.client.get('/api/suppliers/')
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="2 queries", cache;desc="\d+ hits, \d+ misses"')
+        self.assertIn('serialize;dur=', timing)
+        self.assertEqual(logs.records[0].endpoint, 'supplier-list')
+        self.assertEqual(logs.records[0].db_queries, 2)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_requests_only_record_latency(self):
+        self.authenticate()
+        response = self.client.get('/api/suppliers/')
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(request_duration.snapshot()[('GET', 'supplier-list')][1], 1)
+        self.assertEqual(request_db_queries.snapshot(), {})
+
+    def test_metrics_endpoint_reports_per_endpoint_histograms(self):
+        self.authenticate()
+        for _ in range(3):
+            self.client.get('/api/suppliers/')
+        self.client.force_authenticate(user=None)
+        self.client.force_login(self.user)
+        series = self.client.get('/monitoring/requests/').json()['http_request_duration_seconds']['series']
+        supplier_list = next(row for row in series if row['endpoint'] == 'supplier-list')
+        self.assertEqual(supplier_list['count'], 3)
+        self.assertEqual(supplier_list['buckets']['+Inf'], 3)
+        self.assertIsNotNone(supplier_list['p95'])
+
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get('/monitoring/requests/').status_code, 302)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ProfilingTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Acme', slug='acme')
+        cls.staff = User.objects.create_user('ops', password='secret', is_staff=True)
+        cls.analyst = User.objects.create_user('analyst', password='secret')
+        for user in (cls.staff, cls.analyst):
+            TenantUser.objects.create(tenant=cls.tenant, user=user, role='admin')
+
+    def setUp(self):
+        cache.clear()
+        profiling.clear_rules()
+        self.addCleanup(profiling.clear_rules)
+
+    def test_header_profiles_staff_requests_only(self):
+        self.client.force_login(self.analyst)
+        self.client.get('/api/suppliers/', HTTP_X_PROFILE='1')
+        self.assertFalse(RequestProfile.objects.exists())
+
+        self.client.force_login(self.staff)
+        self.client.get('/api/suppliers/?page=1', HTTP_X_PROFILE='1')
+        profile = RequestProfile.objects.get()
+        self.assertEqual((profile.trigger, profile.endpoint, profile.user), ('header', 'supplier-list', self.staff))
+        self.assertEqual((profile.status_code, profile.query_string), (200, 'page=1'))
+
+    def test_header_checks_token_user_before_profiling(self):
+        analyst_token = Token.objects.create(user=self.analyst)
+        with mock.patch.object(profiling.SamplingProfiler, 'start') as start:
+            response = self.client.get(
+                '/api/suppliers/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Token {analyst_token.key}',
+            )
+            self.client.get('/api/suppliers/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION='Token invalid')
+        self.assertEqual(response.status_code, 200)
+        start.assert_not_called()
+
+        staff_token = Token.objects.create(user=self.staff)
+        self.client.get('/api/suppliers/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Token {staff_token.key}')
+        self.assertEqual(RequestProfile.objects.get().user, self.staff)
+
+    def test_admin_downloads_collapsed_stacks(self):
+        self.client.force_login(self.staff)
+        self.client.get('/api/suppliers/', HTTP_X_PROFILE='1')
+        profile = RequestProfile.objects.get()
+        admin = User.objects.create_superuser('admin', password='secret')
+        self.client.force_login(admin)
+        response = self.client.get(f'/admin/monitoring/requestprofile/{profile.pk}/stacks/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode(), profile.stacks)
+        self.assertEqual(self.client.get(f'/admin/monitoring/requestprofile/{profile.pk + 1}/stacks/').status_code, 404)
+
+    def test_rule_with_remaining_count_profiles_once(self):
+        rule = ProfilingRule.objects.create(name='Suppliers', path_pattern=r'^/api/suppliers/', remaining=1)
+        self.client.force_login(self.analyst)
+        self.client.get('/api/suppliers/')
+        self.client.get('/api/suppliers/')
+        self.client.get('/api/emissions/')
+        self.assertEqual(RequestProfile.objects.get().rule, rule)
+        rule.refresh_from_db()
+        self.assertEqual((rule.remaining, rule.is_active), (0, False))
+
+    def test_sampler_collapses_stacks_into_a_call_tree(self):
+        def busy_wait():
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        profiler = profiling.SamplingProfiler(interval=0.001)
+        profiler.start()
+        busy_wait()
+        profiler.stop()
+        stacks = profiler.collapsed()
+        self.assertIn('busy_wait (monitoring/tests.py:', stacks)
+        tree = profiling.render_call_tree(stacks)
+        self.assertRegex(tree, r'\d+\.\d% +\d+ +.*busy_wait')
+        self.assertEqual(profiling.render_call_tree('a;b 3\na;c 1'), '100.0%      4  a\n 75.0%      3    b\n 25.0%      1    c')
+
+
+class PrometheusMetricsTests(APITestCase):
+    def setUp(self):
+        for metric in (iot_readings_ingested, background_tasks_pending):
+            metric.clear()
+            self.addCleanup(metric.clear)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_exposition_requires_the_scrape_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        iot_readings_ingested.inc('device')
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('iot_readings_ingested_total{source="device"} 1', body)
+        self.assertIn('jobs_active{status="queued"} 0', body)
+        self.assertRegex(body, r'http_request_duration_seconds_bucket\{method="GET",endpoint="prometheus_metrics",le="\+Inf"\} \d+')
+
+    def test_snapshots_from_other_workers_are_merged(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_MULTIPROCESS_DIR=directory):
+            live, dead = os.getppid(), 4194305
+            for pid, readings, pending in [(live, 5, 2), (dead, 7, 9)]:
+                Path(directory, f'metrics-{pid}.json').write_text(json.dumps({
+                    'iot_readings_ingested_total': [[['device'], readings]],
+                    'background_tasks_pending': [[[], pending]],
+                }))
+            iot_readings_ingested.inc('device')
+            background_tasks_pending.inc()
+            collected = {metric.name: series for metric, series in collect()}
+        # Counters keep exited workers' totals; gauges only count live processes
+        self.assertEqual(collected['iot_readings_ingested_total'], {('device',): 13})
+        self.assertEqual(collected['background_tasks_pending'], {(): 3})
+
+    def test_snapshots_are_cleared_on_start(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_MULTIPROCESS_DIR=directory):
+            Path(directory, 'metrics-4194305.json').write_text(json.dumps({
+                'iot_readings_ingested_total': [[['device'], 7]],
+            }))
+            Path(directory, 'other.txt').write_text('kept')
+            clear_snapshots()
+            self.assertEqual(os.listdir(directory), ['other.txt'])
@@ -0,0 +1,87 @@
+"""
+Per-request timing collection
+
+A ``RequestTimings`` is bound to the current context while a sampled request
+runs. It is installed as a database execute wrapper to count queries and
+their time, and instrumented code reports cache lookups and named spans
+(such as serialization) to it. Outside a sampled request every hook is a
+single context variable lookup.
+"""
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.db import connections
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Counters and span durations (in seconds) for one request"""
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.spans = {}
+        self._open = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - start
+            self.db_queries += 1
+
+    @contextmanager
+    def span(self, name):
+        """Time a block under ``name``; nested blocks of the same name count once"""
+        depth = self._open.get(name, 0)
+        self._open[name] = depth + 1
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._open[name] = depth
+            if not depth:
+                self.spans[name] = self.spans.get(name, 0.0) + perf_counter() - start
+
+
+def get_current():
+    """Return the timings of the sampled request being handled, or None"""
+    return _current.get()
+
+
+@contextmanager
+def span(name):
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    with timings.span(name):
+        yield
+
+
+def record_cache_lookup(hit):
+    timings = _current.get()
+    if timings is not None:
+        if hit:
+            timings.cache_hits += 1
+        else:
+            timings.cache_misses += 1
+
+
+@contextmanager
+def collect():
+    """Collect timings for the code run inside the block"""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings))
+            yield timings
+    finally:
+        _current.reset(token)
@@ -0,0 +1,9 @@
+"""
+Monitoring URLs
+"""
+from django.urls import path
+from .views import request_metrics
+
+urlpatterns = [
+    path('requests/', request_metrics, name='request_metrics'),
+]
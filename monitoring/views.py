@@ -0,0 +1,45 @@
+"""
+Monitoring views
+"""
+import hmac
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
+
+from .metrics import REQUEST_HISTOGRAMS, collect, cumulative, estimate_quantile, exposition
+
+
+@staff_member_required
+def request_metrics(request):
+    """Per-endpoint request histograms across all workers, with estimated percentiles"""
+    collected = {metric.name: series for metric, series in collect()}
+    data = {}
+    for histogram in REQUEST_HISTOGRAMS:
+        series = []
+        for labels, values in sorted(collected[histogram.name].items()):
+            counts, count, total = cumulative(values)
+            series.append({
+                **dict(zip(histogram.labels, labels)),
+                'count': count,
+                'sum': total,
+                'p50': estimate_quantile(histogram.buckets, counts, 0.5),
+                'p95': estimate_quantile(histogram.buckets, counts, 0.95),
+                'p99': estimate_quantile(histogram.buckets, counts, 0.99),
+                'buckets': dict(zip([str(bound) for bound in histogram.buckets] + ['+Inf'], counts)),
+            })
+        data[histogram.name] = {'description': histogram.description, 'series': series}
+    return JsonResponse(data)
+
+
+def prometheus_metrics(request):
+    """Prometheus exposition; scrapers authenticate with METRICS_TOKEN as a bearer token"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    authorized = (
+        (token and hmac.compare_digest(authorization, f'Bearer {token}'))
+        or (request.user.is_authenticated and request.user.is_staff)
+    )
+    if not authorized:
+        return HttpResponse(status=401 if token else 403)
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,4 +1,4 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import Tenant, TenantUser, APIKey, Subscription
 
 
@@ -18,10 +18,19 @@ class TenantUserAdmin(admin.ModelAdmin):
 
 @admin.register(APIKey)
 class APIKeyAdmin(admin.ModelAdmin):
-    list_display = ['name', 'tenant', 'is_active', 'created_at', 'last_used', 'expires_at']
+    list_display = ['name', 'tenant', 'key_prefix', 'is_active', 'created_at', 'last_used', 'expires_at']
     list_filter = ['is_active', 'created_at']
-    search_fields = ['name', 'key', 'tenant__name']
-    readonly_fields = ['key', 'created_at']
+    search_fields = ['name', 'key_prefix', 'tenant__name']
+    readonly_fields = ['key_prefix', 'created_at', 'last_used']
+    exclude = ['key_hash']
+    
+    def save_model(self, request, obj, form, change):
+        if not change:
+            # Only the hash is stored, so this is the one chance to show the key
+            key = APIKey.generate_key()
+            obj.set_key(key)
+            messages.warning(request, f"API key for {obj.name}: {key} (copy it now, it will not be shown again)")
+        super().save_model(request, obj, form, change)
 
 
 @admin.register(Subscription)
@@ -0,0 +1,117 @@
+"""
+API key verification with an in-process cache and batched last_used writes
+
+Verified keys are cached per process for API_KEY_CACHE_TTL seconds, keyed
+by the key hash, together with the revocation generation they were verified
+under. Saving or deleting an APIKey increments that generation in the
+shared cache, and every request compares it with the cached key's, so a
+key revoked by any process stops working everywhere on the next request
+(one cache read, no query). ``last_used`` timestamps are collected
+in memory and written in one bulk update every
+API_KEY_LAST_USED_FLUSH_INTERVAL seconds (and at interpreter exit).
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from saas.models import APIKey
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'api-key-generation'
+
+_lock = threading.Lock()
+_verified = {}
+_pending_last_used = {}
+_last_flush = time.monotonic()
+
+
+class CachedAPIKey:
+    """Immutable snapshot of a verified key"""
+    __slots__ = ('id', 'tenant', 'expires_at', 'cached_until', 'generation')
+
+    def __init__(self, api_key, cached_until, generation):
+        self.id = api_key.pk
+        self.tenant = api_key.tenant
+        self.expires_at = api_key.expires_at
+        self.cached_until = cached_until
+        self.generation = generation
+
+    def is_expired(self):
+        return self.expires_at is not None and timezone.now() > self.expires_at
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_api_key(raw_key):
+    """Return the CachedAPIKey for an active key, or None if it is unknown or revoked"""
+    key_hash = APIKey.hash_key(raw_key)
+    now = time.monotonic()
+    # Read before the database, so a revocation racing the lookup is seen next time
+    generation = cache.get(GENERATION_KEY)
+    with _lock:
+        cached = _verified.get(key_hash)
+    if cached is not None and cached.cached_until > now and cached.generation == generation:
+        return cached
+
+    api_key = APIKey.objects.select_related('tenant').filter(key_hash=key_hash, is_active=True).first()
+    if api_key is None:
+        with _lock:
+            _verified.pop(key_hash, None)
+        return None
+    cached = CachedAPIKey(api_key, now + _setting('API_KEY_CACHE_TTL', 60), generation)
+    with _lock:
+        _verified[key_hash] = cached
+    return cached
+
+
+def invalidate_api_key(key_hash):
+    """Evict a key here and make every process re-verify its cached keys"""
+    with _lock:
+        _verified.pop(key_hash, None)
+    cache.add(GENERATION_KEY, 0, timeout=None)
+    cache.incr(GENERATION_KEY)
+
+
+def record_use(api_key):
+    """Note that a key was used; the write happens in the next periodic flush"""
+    with _lock:
+        _pending_last_used[api_key.id] = timezone.now()
+        due = time.monotonic() - _last_flush >= _setting('API_KEY_LAST_USED_FLUSH_INTERVAL', 60)
+    if due:
+        flush_last_used()
+
+
+def flush_last_used():
+    """Write buffered last_used timestamps in a single bulk update"""
+    global _pending_last_used, _last_flush
+    with _lock:
+        pending, _pending_last_used = _pending_last_used, {}
+        _last_flush = time.monotonic()
+    if not pending:
+        return 0
+    try:
+        APIKey.objects.bulk_update(
+            [APIKey(pk=key_id, last_used=last_used) for key_id, last_used in pending.items()], ['last_used'],
+        )
+    except Exception as e:
+        logger.warning(f"Could not flush API key last_used timestamps: {e}")
+        return 0
+    return len(pending)
+
+
+def clear_cache():
+    """Forget all cached keys and pending timestamps (used by tests)"""
+    with _lock:
+        _verified.clear()
+        _pending_last_used.clear()
+
+
+atexit.register(flush_last_used)
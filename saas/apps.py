@@ -6,5 +6,9 @@ class SaasConfig(AppConfig):
     name = 'saas'
     verbose_name = 'SaaS Management'
 
+    def ready(self):
+        from .signals import connect_signals
+        connect_signals()
+
 
 
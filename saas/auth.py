@@ -0,0 +1,89 @@
+"""
+Cached user and tenant resolution for session, token and API key requests
+
+Users are cached together with their tenant membership and tenant (loaded
+with one joined query), so resolving ``request.user`` and
+``request.tenant`` for a returning session or token costs cache reads only.
+Entries are evicted by signals when a user, membership, tenant or token
+changes, and expire after AUTH_CACHE_TIMEOUT seconds regardless. Evictions
+only reach other workers through a shared cache, which is why production
+settings require Redis.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from saas.models import TenantUser
+
+
+def _timeout():
+    return getattr(settings, 'AUTH_CACHE_TIMEOUT', 300)
+
+
+def _user_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def _token_key(key):
+    return f'auth-token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def get_cached_user(user_id):
+    """Return the user with membership and tenant preloaded, or None"""
+    key = _user_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.select_related('tenant_membership__tenant').filter(pk=user_id).first()
+        if user is None:
+            return None
+        cache.set(key, user, _timeout())
+    return user
+
+
+def invalidate_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+def get_cached_token(key, token_model):
+    """Return the token for a key (without its user), or None"""
+    cache_key = _token_key(key)
+    token = cache.get(cache_key)
+    if token is None:
+        token = token_model.objects.filter(key=key).first()
+        if token is None:
+            return None
+        cache.set(cache_key, token, _timeout())
+    return token
+
+
+def invalidate_token(key):
+    cache.delete(_token_key(key))
+
+
+def get_user_tenant(user):
+    """Return the tenant a request's user acts for, or None.
+
+    API key users carry their tenant directly; real users are resolved
+    through their (cached) tenant membership.
+    """
+    if user is None or not user.is_authenticated:
+        return None
+    if not isinstance(user, User):
+        return getattr(user, 'tenant', None)
+    if not User.tenant_membership.is_cached(user):
+        user = get_cached_user(user.pk) or user
+    try:
+        return user.tenant_membership.tenant
+    except TenantUser.DoesNotExist:
+        return None
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose per-request user lookup is served from the cache"""
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
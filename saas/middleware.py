@@ -0,0 +1,19 @@
+"""
+Request tenant resolution
+"""
+from saas.auth import get_user_tenant
+
+
+class TenantMiddleware:
+    """Set ``request.tenant`` for session-authenticated requests.
+
+    API views re-resolve it after DRF authentication, so token and API key
+    requests see their own tenant.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.tenant = get_user_tenant(request.user)
+        return self.get_response(request)
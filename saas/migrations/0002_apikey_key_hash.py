@@ -0,0 +1,43 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_existing_keys(apps, schema_editor):
+    APIKey = apps.get_model('saas', 'APIKey')
+    for api_key in APIKey.objects.all():
+        api_key.key_prefix = api_key.key[:8]
+        api_key.key_hash = hashlib.sha256(api_key.key.encode()).hexdigest()
+        api_key.save(update_fields=['key_prefix', 'key_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('saas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikey',
+            name='key_prefix',
+            field=models.CharField(db_index=True, default='', help_text='First characters of the key, for identification', max_length=12),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='key_hash',
+            field=models.CharField(help_text='SHA-256 of the API key; the key itself is never stored', max_length=64, null=True),
+        ),
+        # Plaintext keys cannot be restored, so this migration is irreversible
+        migrations.RunPython(hash_existing_keys),
+        migrations.AlterField(
+            model_name='apikey',
+            name='key_hash',
+            field=models.CharField(help_text='SHA-256 of the API key; the key itself is never stored', max_length=64, unique=True),
+        ),
+        migrations.RemoveField(
+            model_name='apikey',
+            name='key',
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
+import hashlib
 import secrets
 
 
@@ -71,7 +72,8 @@ class APIKey(models.Model):
     """API keys for programmatic access"""
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='api_keys')
     name = models.CharField(max_length=255, help_text="Descriptive name for the key")
-    key = models.CharField(max_length=64, unique=True, help_text="API key")
+    key_prefix = models.CharField(max_length=12, db_index=True, help_text="First characters of the key, for identification")
+    key_hash = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the API key; the key itself is never stored")
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     last_used = models.DateTimeField(null=True, blank=True)
@@ -88,6 +90,24 @@ class APIKey(models.Model):
         """Generate a secure API key"""
         return secrets.token_urlsafe(48)
     
+    @staticmethod
+    def hash_key(key):
+        """Keys are random 384-bit tokens, so a fast unsalted hash is sufficient"""
+        return hashlib.sha256(key.encode()).hexdigest()
+    
+    def set_key(self, key):
+        self.key_prefix = key[:8]
+        self.key_hash = self.hash_key(key)
+    
+    @classmethod
+    def create_key(cls, tenant, name, expires_at=None):
+        """Create a key and return (api_key, plaintext key); the plaintext is not recoverable later"""
+        key = cls.generate_key()
+        api_key = cls(tenant=tenant, name=name, expires_at=expires_at)
+        api_key.set_key(key)
+        api_key.save()
+        return api_key, key
+    
     def is_expired(self):
         """Check if API key is expired"""
         if self.expires_at:
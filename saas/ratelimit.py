@@ -0,0 +1,137 @@
+"""
+Token-bucket rate limiting per tenant and per device, sized by subscription tier
+
+Buckets live in the shared cache so limits hold across worker processes.
+Each process leases a slice of a bucket's tokens at a time and spends them
+from memory, so most decisions touch neither the cache nor the database.
+Leases are short-lived; once one expires, its leftover tokens are
+normally forfeited in favour of a fresh lease, which errs on the side of
+throttling rather than exceeding the limit. When a bucket's lock stays
+contended, requests are served from tokens this process already leased,
+expired or not, since the bucket was debited for them when they were
+leased, and are throttled otherwise; nothing is granted that the bucket
+was not debited for. The limits only hold across workers
+because the cache is shared (production settings require Redis).
+
+Limits come from settings.RATE_LIMITS[tier][scope] as "<count>/<period>"
+strings (period: sec, min, hour, day); a tenant's ``features`` may override
+them under a "rate_limits" key. The bucket capacity is one period's worth
+of tokens.
+"""
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'sec': 1, 'min': 60, 'hour': 3600, 'day': 86400}
+LEASE_FRACTION = 0.1
+LEASE_SECONDS = 1.0
+LOCK_ATTEMPTS = 3
+
+_lock = threading.Lock()
+_leases = {}
+
+
+class BucketBusy(Exception):
+    """The bucket's lock could not be taken within LOCK_ATTEMPTS tries"""
+
+
+def parse_rate(rate):
+    """Return (tokens per second, capacity) for a "<count>/<period>" string"""
+    count, period = rate.split('/')
+    count = int(count)
+    return count / PERIODS[period], count
+
+
+def get_limit(tenant, scope):
+    """Return the rate string for a tenant and scope, or None if unlimited"""
+    overrides = (tenant.features or {}).get('rate_limits', {})
+    if scope in overrides:
+        return overrides[scope]
+    return getattr(settings, 'RATE_LIMITS', {}).get(tenant.subscription_tier, {}).get(scope)
+
+
+def _lease(key, refill_rate, capacity, want):
+    """Take up to ``want`` tokens from the shared bucket; returns (granted, retry_after)"""
+    lock_key = f'ratelimit-lock:{key}'
+    for _ in range(LOCK_ATTEMPTS):
+        if cache.add(lock_key, 1, timeout=1):
+            break
+        time.sleep(0.001)
+    else:
+        raise BucketBusy(key)
+
+    try:
+        now = time.time()
+        state = cache.get(f'ratelimit:{key}')
+        if state is None:
+            tokens = capacity
+        else:
+            tokens, updated = state
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+        granted = min(want, int(tokens))
+        tokens -= granted
+        cache.set(f'ratelimit:{key}', (tokens, now), timeout=int(capacity / refill_rate) + 60)
+    finally:
+        cache.delete(lock_key)
+
+    retry_after = 0 if granted else (1 - tokens) / refill_rate
+    return granted, retry_after
+
+
+def consume(key, rate):
+    """Spend one token from the bucket ``key``; returns seconds to wait, or 0 if allowed"""
+    refill_rate, capacity = parse_rate(rate)
+    now = time.monotonic()
+    with _lock:
+        lease = _leases.get(key)
+        if lease and lease[0] >= 1 and lease[1] > now:
+            lease[0] -= 1
+            return 0
+
+    want = max(1, int(capacity * LEASE_FRACTION))
+    try:
+        granted, retry_after = _lease(key, refill_rate, capacity, want)
+    except BucketBusy:
+        with _lock:
+            # Tokens left in an expired lease were already taken from the bucket
+            lease = _leases.get(key)
+            if lease and lease[0] >= 1:
+                lease[0] -= 1
+                return 0
+        return 1
+    except Exception as e:
+        # The limiter must never take the API down with the shared store
+        logger.warning(f"Rate limiter store unavailable, allowing request: {e}")
+        return 0
+    if not granted:
+        return math.ceil(retry_after)
+
+    with _lock:
+        _leases[key] = [granted - 1, now + LEASE_SECONDS]
+    return 0
+
+
+def check_rate_limit(tenant, scope, key=None):
+    """Return seconds to wait before retrying, or 0 if the request may proceed.
+
+    ``key`` identifies the bucket within the scope (the tenant by default,
+    a device for per-device limits). Requests without a tenant are not limited.
+    """
+    if tenant is None:
+        return 0
+    rate = get_limit(tenant, scope)
+    if not rate:
+        return 0
+    return consume(f'{scope}:{key if key is not None else tenant.pk}', rate)
+
+
+def reset():
+    """Forget local leases (used by tests together with cache.clear())"""
+    with _lock:
+        _leases.clear()
@@ -0,0 +1,70 @@
+"""
+Signal handlers keeping tenant data versions and authentication caches current
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from rest_framework.authtoken.models import Token
+
+from core.models import Supplier, EmissionEntry
+from iot.models import IoTDevice
+from ml_services.models import MLPrediction, SpendBasedEstimate
+from scenarios.models import Scenario, ScenarioSupplier
+from saas.api_keys import invalidate_api_key
+from saas.auth import invalidate_token, invalidate_user
+from saas.models import APIKey, Tenant, TenantUser
+from saas.versioning import bump_data_version
+
+# Models whose rows appear in tenant-scoped API responses. IoTReading is left
+# out on purpose: readings arrive continuously and are not cached.
+TENANT_MODELS = [Supplier, Scenario]
+SUPPLIER_MODELS = [EmissionEntry, IoTDevice, MLPrediction, SpendBasedEstimate, ScenarioSupplier]
+
+
+def bump_tenant_version(sender, instance, **kwargs):
+    bump_data_version(instance.tenant_id)
+
+
+def bump_supplier_tenant_version(sender, instance, **kwargs):
+    try:
+        tenant_id = instance.supplier.tenant_id
+    except Supplier.DoesNotExist:
+        # Supplier already deleted (cascade); its own signal bumped the version
+        tenant_id = None
+    bump_data_version(tenant_id)
+
+
+def evict_api_key(sender, instance, **kwargs):
+    # Deactivation, expiry changes and deletion must not wait for the cache TTL
+    invalidate_api_key(instance.key_hash)
+
+
+def evict_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+def evict_member(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+def evict_tenant_members(sender, instance, **kwargs):
+    # Cached users carry their tenant, so tenant changes evict its members
+    for user_id in TenantUser.objects.filter(tenant=instance).values_list('user_id', flat=True):
+        invalidate_user(user_id)
+
+
+def evict_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+def connect_signals():
+    for model in TENANT_MODELS:
+        post_save.connect(bump_tenant_version, sender=model, dispatch_uid=f'bump_version_{model.__name__}_save')
+        post_delete.connect(bump_tenant_version, sender=model, dispatch_uid=f'bump_version_{model.__name__}_delete')
+    for model in SUPPLIER_MODELS:
+        post_save.connect(bump_supplier_tenant_version, sender=model, dispatch_uid=f'bump_version_{model.__name__}_save')
+        post_delete.connect(bump_supplier_tenant_version, sender=model, dispatch_uid=f'bump_version_{model.__name__}_delete')
+    post_save.connect(evict_api_key, sender=APIKey, dispatch_uid='evict_api_key_save')
+    post_delete.connect(evict_api_key, sender=APIKey, dispatch_uid='evict_api_key_delete')
+    for model, handler in [(User, evict_user), (TenantUser, evict_member), (Tenant, evict_tenant_members), (Token, evict_token)]:
+        post_save.connect(handler, sender=model, dispatch_uid=f'evict_auth_{model.__name__}_save')
+        post_delete.connect(handler, sender=model, dispatch_uid=f'evict_auth_{model.__name__}_delete')
@@ -0,0 +1,220 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from api.authentication import APIKeyAuthentication
+from api.tests import QueryBudgetTestCase
+
+from core.models import Supplier
+from iot.models import IoTDevice, IoTReading
+from saas import api_keys, ratelimit
+from saas.models import APIKey, Tenant, TenantUser
+
+
+class APIKeyAuthenticationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Acme', slug='acme')
+
+    def setUp(self):
+        api_keys.clear_cache()
+        self.addCleanup(api_keys.clear_cache)
+        self.api_key, self.raw_key = APIKey.create_key(self.tenant, 'ERP sync')
+
+    def authenticate(self, key=None):
+        request = APIRequestFactory().get('/api/suppliers/', HTTP_X_API_KEY=key or self.raw_key)
+        return APIKeyAuthentication().authenticate(request)
+
+    def test_only_the_hash_is_stored(self):
+        self.assertEqual(self.api_key.key_hash, APIKey.hash_key(self.raw_key))
+        self.assertEqual(self.api_key.key_prefix, self.raw_key[:8])
+        self.assertFalse(APIKey.objects.filter(key_hash=self.raw_key).exists())
+
+    def test_hot_key_costs_no_queries(self):
+        self.assertEqual(self.authenticate()[0].tenant, self.tenant)
+        with self.assertNumQueries(0):
+            user, key = self.authenticate()
+        self.assertEqual((user.tenant, key.id), (self.tenant, self.api_key.pk))
+
+    def test_last_used_is_flushed_in_batches(self):
+        self.authenticate()
+        self.assertIsNone(APIKey.objects.get(pk=self.api_key.pk).last_used)
+        with self.assertNumQueries(1):
+            self.assertEqual(api_keys.flush_last_used(), 1)
+        self.assertIsNotNone(APIKey.objects.get(pk=self.api_key.pk).last_used)
+
+    def test_revocation_and_expiry_bypass_the_cache(self):
+        self.authenticate()
+        self.api_key.expires_at = timezone.now() - timedelta(minutes=1)
+        self.api_key.save()
+        with self.assertRaisesMessage(AuthenticationFailed, 'expired'):
+            self.authenticate()
+        self.api_key.is_active = False
+        self.api_key.save()
+        with self.assertRaisesMessage(AuthenticationFailed, 'Invalid'):
+            self.authenticate()
+
+    def test_revocation_in_another_process_drops_cached_keys(self):
+        self.authenticate()
+        # Another worker, with its own cached keys and cache client, revokes the key
+        with mock.patch('saas.api_keys.cache', caches.create_connection('default')), \
+                mock.patch('saas.api_keys._verified', {}):
+            self.api_key.is_active = False
+            self.api_key.save()
+        # Checked on the very next request, not after an interval
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_unknown_key_is_rejected(self):
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate('not-a-key')
+
+
+class CachedAuthenticationTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='Acme', slug='acme')
+        cls.other_tenant = Tenant.objects.create(name='Other', slug='other')
+        cls.user = User.objects.create_user('analyst', password='secret')
+        cls.membership = TenantUser.objects.create(tenant=cls.tenant, user=cls.user, role='admin')
+        for tenant, code in [(cls.tenant, 'SUP-0'), (cls.other_tenant, 'EXT-0')]:
+            Supplier.objects.create(name=code, supplier_code=code, contact_email=f'{code}@example.com', tenant=tenant)
+
+    def setUp(self):
+        super().setUp()
+        api_keys.clear_cache()
+        self.addCleanup(api_keys.clear_cache)
+
+    def supplier_codes(self, **headers):
+        response = self.client.get('/api/suppliers/?format=json', **headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['supplier_code'] for row in response.json()['results']]
+
+    def test_token_requests_resolve_user_and_tenant_from_cache(self):
+        token = Token.objects.create(user=self.user)
+        headers = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+        self.assertEqual(self.supplier_codes(**headers), ['SUP-0'])
+        Supplier.objects.create(name='New', supplier_code='SUP-1', contact_email='n@example.com', tenant=self.tenant)
+        with CaptureQueriesContext(connection) as context:
+            self.supplier_codes(**headers)
+        # Only the page count and rows; no token, user, membership or tenant queries
+        self.assertEqual(len(context.captured_queries), 2)
+
+        token.delete()
+        # 403 rather than 401: SessionAuthentication, listed first, sends no WWW-Authenticate
+        self.assertEqual(self.client.get('/api/suppliers/', **headers).status_code, 403)
+
+    def test_api_key_requests_are_scoped_to_the_key_tenant(self):
+        _, raw_key = APIKey.create_key(self.other_tenant, 'ERP sync')
+        self.assertEqual(self.supplier_codes(HTTP_X_API_KEY=raw_key), ['EXT-0'])
+
+    def test_session_requests_use_the_cached_user(self):
+        self.client.login(username='analyst', password='secret')
+        self.assertEqual(self.supplier_codes(), ['SUP-0'])
+        Supplier.objects.create(name='New', supplier_code='SUP-1', contact_email='n@example.com', tenant=self.tenant)
+        with CaptureQueriesContext(connection) as context:
+            self.supplier_codes()
+        self.assertEqual(len(context.captured_queries), 2)
+
+    def test_membership_change_invalidates_cached_tenant(self):
+        self.client.login(username='analyst', password='secret')
+        self.assertEqual(self.supplier_codes(), ['SUP-0'])
+        self.membership.tenant = self.other_tenant
+        self.membership.save()
+        self.assertEqual(self.supplier_codes(), ['EXT-0'])
+        self.membership.delete()
+        self.assertEqual(sorted(self.supplier_codes()), ['EXT-0', 'SUP-0'])
+
+    def test_eviction_by_another_worker_is_seen(self):
+        self.client.login(username='analyst', password='secret')
+        self.assertEqual(self.supplier_codes(), ['SUP-0'])
+        # Another worker has its own cache client on the shared store
+        other_worker_cache = caches.create_connection('default')
+        self.assertIsNot(other_worker_cache, caches['default'])
+        with mock.patch('saas.auth.cache', other_worker_cache):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/api/suppliers/').status_code, 403)
+
+
+class RateLimitTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(
+            name='Acme', slug='acme', features={'rate_limits': {'api': '3/min', 'device': '2/min', 'ingest': '3/min'}},
+        )
+        cls.user = User.objects.create_user('analyst', password='secret')
+        TenantUser.objects.create(tenant=cls.tenant, user=cls.user, role='admin')
+        cls.supplier = Supplier.objects.create(
+            name='Steel Co', supplier_code='SUP-0', contact_email='s0@example.com', tenant=cls.tenant,
+        )
+        cls.devices = [
+            IoTDevice.objects.create(
+                device_id=f'dev-{i}', supplier=cls.supplier, device_name=f'Meter {i}',
+                device_type='Smart Meter', api_key=f'key-{i}',
+            )
+            for i in range(2)
+        ]
+
+    def ingest(self, device):
+        return self.client.post(
+            '/iot/ingest/', {'device_id': device.device_id, 'api_key': device.api_key, 'energy_kwh': 1},
+            format='json',
+        )
+
+    def test_tenant_limit_returns_429_with_retry_after(self):
+        self.authenticate()
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/suppliers/').status_code, 200)
+        response = self.client.get('/api/suppliers/')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+    def test_limits_follow_the_subscription_tier(self):
+        tenant = Tenant.objects.create(name='Big', slug='big', subscription_tier='enterprise')
+        with override_settings(RATE_LIMITS={'free': {'api': '1/min'}, 'enterprise': {'api': '100/min'}}):
+            self.assertEqual(ratelimit.get_limit(tenant, 'api'), '100/min')
+            self.assertEqual(ratelimit.get_limit(self.tenant, 'api'), '3/min')
+            self.assertIsNone(ratelimit.get_limit(tenant, 'ingest'))
+
+    def test_device_limit_is_separate_per_device(self):
+        first, second = self.devices
+        self.assertEqual([self.ingest(first).status_code for _ in range(3)], [200, 200, 429])
+        # The other device has its own bucket but shares the tenant's ingest quota
+        self.assertEqual(self.ingest(second).status_code, 200)
+        response = self.ingest(second)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(IoTReading.objects.count(), 3)
+
+    def test_decisions_run_no_queries(self):
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                ratelimit.check_rate_limit(self.tenant, 'api')
+
+    def test_contended_bucket_grants_no_unpaid_tokens(self):
+        ratelimit.check_rate_limit(self.tenant, 'api')
+        key = f'api:{self.tenant.pk}'
+        cache.add(f'ratelimit-lock:{key}', 1, timeout=60)
+        # The local lease (3/min leases one token) is spent, so the request waits
+        self.assertEqual(ratelimit.check_rate_limit(self.tenant, 'api'), 1)
+
+        # Tokens already leased are still served, even once the lease expired
+        ratelimit._leases[key] = [2, 0]
+        self.assertEqual([ratelimit.check_rate_limit(self.tenant, 'api') for _ in range(3)], [0, 0, 1])
+        cache.delete(f'ratelimit-lock:{key}')
+        self.assertEqual(cache.get(f'ratelimit:{key}')[0], 2)
+
+    def test_store_failure_fails_open(self):
+        with mock.patch('saas.ratelimit.cache.add', side_effect=ConnectionError('down')), \
+                self.assertLogs('saas.ratelimit', 'WARNING'):
+            self.assertEqual(ratelimit.check_rate_limit(self.tenant, 'device', key='x'), 0)
@@ -0,0 +1,36 @@
+"""
+Per-tenant data version counters
+
+Every write to tenant-visible data bumps the tenant's counter (and the
+global one used by users without a tenant). Caches and ETags include the
+version, so stale entries are simply never looked up again.
+"""
+import time
+
+from django.core.cache import cache
+
+GLOBAL_SCOPE = 'global'
+
+
+def _version_key(tenant_id):
+    return f'tenant-data-version:{tenant_id or GLOBAL_SCOPE}'
+
+
+def get_data_version(tenant_id=None):
+    """Return the current data version for a tenant (None for the global scope)"""
+    key = _version_key(tenant_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a flushed cache never reissues an old version
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(tenant_id=None):
+    """Invalidate everything cached for a tenant, and for the global scope"""
+    for key in {_version_key(tenant_id), _version_key(None)}:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
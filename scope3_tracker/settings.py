@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,6 +40,8 @@ INSTALLED_APPS = [
     'blockchain',
     'scenarios',
     'saas',
+    'jobs',  # Background jobs for long-running actions
+    'monitoring',  # Request timing and metrics
     'api',  # REST API app
     
     # Third-party apps
@@ -56,12 +59,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'saas.middleware.TenantMiddleware',
+    'monitoring.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -102,6 +108,13 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/'
 
 
+# The user lookup behind every session request is served from the cache
+AUTHENTICATION_BACKENDS = ['saas.auth.CachedModelBackend']
+
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -147,16 +160,80 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         'api.authentication.APIKeyAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TenantRateThrottle',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
 
+# Token-bucket limits per subscription tier: "api" covers REST requests per
+# tenant, "ingest" IoT readings per tenant and "device" readings per device.
+# A tenant's features may override them under "rate_limits".
+RATE_LIMITS = {
+    'free': {'api': '120/min', 'ingest': '120/min', 'device': '12/min'},
+    'starter': {'api': '600/min', 'ingest': '1200/min', 'device': '60/min'},
+    'professional': {'api': '3000/min', 'ingest': '6000/min', 'device': '120/min'},
+    'enterprise': {'api': '12000/min', 'ingest': '30000/min', 'device': '600/min'},
+}
+
+# Caching (per-process, for development and tests only). Data versions,
+# cached responses, auth entries, API key revocations and rate-limit
+# buckets must be shared by all workers, so settings_prod requires Redis
+CACHES = {
+    'default': {
+        # Reports cache hits and misses to request timing (monitoring.cache.RedisCache for Redis)
+        'BACKEND': 'monitoring.cache.LocMemCache',
+        # The default of 300 entries makes responses, sessions, auth entries
+        # and rate-limit buckets evict each other
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Seconds a rendered API list response stays cached for a given tenant data version
+API_RESPONSE_CACHE_TIMEOUT = 300
+
+# Maximum number of items accepted by a single bulk upsert request
+API_BULK_MAX_ITEMS = 5000
+
+# Users (with tenant membership and tenant) and tokens are cached for this
+# many seconds; signals evict them earlier when they change
+AUTH_CACHE_TIMEOUT = 300
+
+# API key authentication: seconds a verified key stays cached per process
+# (revocations are checked in the shared cache on every request) and how
+# often buffered last_used timestamps are written
+API_KEY_CACHE_TTL = 60
+API_KEY_LAST_USED_FLUSH_INTERVAL = 60
+
+# Request timing: fraction of requests that record query, cache and
+# serializer timings (keep around 0.01 in production) and whether those
+# requests get a Server-Timing header
+REQUEST_TIMING_SAMPLE_RATE = 1.0
+REQUEST_TIMING_HEADER = True
+
+# On-demand profiling: staff send this header to profile a request, or add
+# profiling rules in the admin. Stacks are sampled every PROFILING_INTERVAL
+# seconds; rules are reloaded every PROFILING_RULES_REFRESH seconds.
+PROFILING_HEADER = 'X-Profile'
+PROFILING_INTERVAL = 0.005
+PROFILING_RULES_REFRESH = 10
+
+# Prometheus metrics at /metrics. Scrapers send METRICS_TOKEN as a bearer
+# token (staff sessions are accepted too). With several worker processes,
+# point METRICS_MULTIPROCESS_DIR at a directory shared by the workers of one
+# host (gunicorn.conf.py sets it and empties it on start); each writes its
+# values there every METRICS_FLUSH_INTERVAL seconds.
+METRICS_TOKEN = ''
+METRICS_MULTIPROCESS_DIR = os.environ.get('METRICS_MULTIPROCESS_DIR') or None
+METRICS_FLUSH_INTERVAL = 5
+
 # CORS settings for API access
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -167,9 +244,37 @@ CORS_ALLOWED_ORIGINS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Hash uploads while they stream in so evidence can be stored by content digest
+FILE_UPLOAD_HANDLERS = [
+    'core.storage.HashingMemoryFileUploadHandler',
+    'core.storage.HashingTemporaryFileUploadHandler',
+]
+
+# Background worker pool (evidence processing and other out-of-request work)
+BACKGROUND_WORKERS = 2
+BACKGROUND_TASKS_EAGER = False  # Run tasks inline; useful for tests and debugging
+# Seconds without a progress report (running) or a worker (queued) after which a job counts as orphaned
+JOB_STALE_AFTER = 1800
+
+# Evidence processing
+EVIDENCE_THUMBNAIL_SIZE = (320, 320)
+EVIDENCE_TEXT_MAX_CHARS = 200000
+# Seconds after which a document still 'processing' is assumed abandoned and retried
+EVIDENCE_PROCESSING_TIMEOUT = 600
+
 # ML Model settings
 ML_MODELS_DIR = BASE_DIR / 'ml_models'
 ML_MODELS_DIR.mkdir(exist_ok=True)
+# Seconds between checks for a newly activated model in each process
+ML_MODEL_REFRESH_INTERVAL = 5
+# Artifacts are memory-mapped read-only so processes share their arrays;
+# None loads private copies
+ML_MODEL_MMAP_MODE = 'r'
+# Inactive versions of each model type kept after training; older ones lose
+# their artifact, and their row unless predictions refer to it
+ML_MODEL_RETENTION = 3
+# Seconds forecasts are cached; new data or a new model version expires them sooner
+FORECAST_CACHE_TIMEOUT = 86400
 
 # Blockchain settings
 BLOCKCHAIN_NETWORK = 'ethereum'  # or 'polygon', 'bsc', etc.
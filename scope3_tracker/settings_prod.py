@@ -4,6 +4,9 @@ Import this in production by setting DJANGO_SETTINGS_MODULE=scope3_tracker.setti
 """
 import os
 from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+
 from .settings import *
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -47,6 +50,27 @@ SECURE_HSTS_SECONDS = 31536000
 SECURE_HSTS_INCLUDE_SUBDOMAINS = True
 SECURE_HSTS_PRELOAD = True
 
+# Cache - must be shared by all workers: a per-process cache would keep
+# serving responses, users, API keys and rate limits another worker has
+# already invalidated
+if not os.environ.get('REDIS_URL'):
+    raise ImproperlyConfigured('REDIS_URL must point at the shared Redis cache in production')
+CACHES = {
+    'default': {
+        # Django's Redis backend, also counting hits and misses
+        'BACKEND': 'monitoring.cache.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL'),
+    }
+}
+
+# Request timing: sample a small share of requests and keep query and
+# cache timings out of response headers
+REQUEST_TIMING_SAMPLE_RATE = float(os.environ.get('REQUEST_TIMING_SAMPLE_RATE', '0.01'))
+REQUEST_TIMING_HEADER = False
+
+# Bearer token for Prometheus scrapers; without it /metrics is staff-only
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 # Static files
 STATIC_URL = '/static/'
 STATIC_ROOT = os.environ.get('STATIC_ROOT', BASE_DIR / 'staticfiles')
@@ -17,6 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 from django.urls import path, include
+from monitoring.views import prometheus_metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -24,4 +25,6 @@ urlpatterns = [
     path('', include('core.urls')),
     path('api/', include('api.urls')),
     path('iot/', include('iot.urls')),
+    path('monitoring/', include('monitoring.urls')),
+    path('metrics', prometheus_metrics, name='prometheus_metrics'),
 ]